@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+# Manager analytics derived from the parsed schedules and the engine's free blocks:
+# utilization per therapist and day or week, unsold capacity in whole sessions,
+# and peak-hour heatmaps. Intervals are handled as epoch-minute arrays; shifts and
+# appointments are combined in one sorted sweep with cumulative sums, and every
+# metric is a grouped reduction over its result, so the cost grows with the number
+# of rows rather than with the length of the horizon.
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# value -> description, for the heatmap selector
+HEATMAP_VALUES = {
+    'utilization': "Booked share of scheduled time",
+    'booked': "Therapists booked (average)",
+    'scheduled': "Therapists on shift (average)",
+}
+
+PERIODS = ('day', 'week')
+
+UTILIZATION_COLUMNS = ['therapist', 'period', 'scheduled_minutes', 'booked_minutes', 'idle_minutes', 'utilization']
+
+
+def _minutes(values):
+    """Converts datetimes (a Series or a list of Timestamps) to an int64 array of epoch minutes."""
+    return pd.to_datetime(pd.Series(values)).to_numpy().astype('datetime64[m]').astype(np.int64)
+
+def _day_start(minutes):
+    return minutes - minutes % 1440
+
+def booked_segments(availability_df, obligations_df):
+    """
+    Splits every shift into on-shift segments flagged as booked or idle.
+
+    Shift and appointment boundaries of all therapists are sorted into one event
+    stream; running sums of the +1/-1 events give, between two consecutive events,
+    whether the therapist is on shift and whether any appointment is running.
+    Appointments outside the shifts and overlapping appointments are therefore
+    counted once and only where the therapist is scheduled.
+    Returns a DataFrame of (therapist, start, end, booked) with epoch-minute bounds.
+    """
+    therapists = pd.concat([availability_df['therapist'], obligations_df['therapist']], ignore_index=True)
+    codes, names = pd.factorize(therapists)
+    shift_codes, obligation_codes = codes[:len(availability_df)], codes[len(availability_df):]
+
+    times = np.concatenate([
+        _minutes(availability_df['start_datetime']), _minutes(availability_df['end_datetime']),
+        _minutes(obligations_df['start_datetime']), _minutes(obligations_df['end_datetime']),
+    ])
+    owners = np.concatenate([shift_codes, shift_codes, obligation_codes, obligation_codes])
+    shift_rows, obligation_rows = len(availability_df), len(obligations_df)
+    on_shift_delta = np.concatenate([
+        np.ones(shift_rows, np.int64), -np.ones(shift_rows, np.int64), np.zeros(2 * obligation_rows, np.int64)
+    ])
+    busy_delta = np.concatenate([
+        np.zeros(2 * shift_rows, np.int64), np.ones(obligation_rows, np.int64), -np.ones(obligation_rows, np.int64)
+    ])
+
+    order = np.lexsort((times, owners))
+    times, owners = times[order], owners[order]
+    # Each therapist's events sum to zero, so one global running sum stays per therapist
+    on_shift = np.cumsum(on_shift_delta[order]) > 0
+    busy = np.cumsum(busy_delta[order]) > 0
+
+    keep = (owners[:-1] == owners[1:]) & on_shift[:-1] & (times[1:] > times[:-1])
+    return pd.DataFrame({
+        'therapist': names[owners[:-1][keep]],
+        'start': times[:-1][keep],
+        'end': times[1:][keep],
+        'booked': busy[:-1][keep],
+    })
+
+def utilization(availability_df, obligations_df, period='day'):
+    """
+    Booked minutes divided by scheduled minutes per therapist and `period`
+    ('day', or 'week' starting on Monday). Returns a DataFrame with
+    UTILIZATION_COLUMNS, where 'period' is the date of the day or of the week's Monday.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period '{period}'. Choose one of: {', '.join(PERIODS)}.")
+    segments = booked_segments(availability_df, obligations_df)
+    if segments.empty:
+        return pd.DataFrame(columns=UTILIZATION_COLUMNS)
+
+    day = _day_start(segments['start'].to_numpy())
+    if period == 'week':
+        # Epoch day 0 was a Thursday
+        day = day - ((day // 1440 + 3) % 7) * 1440
+    lengths = (segments['end'] - segments['start']).to_numpy()
+    grouped = pd.DataFrame({
+        'therapist': segments['therapist'].to_numpy(),
+        'period': day,
+        'scheduled_minutes': lengths,
+        'booked_minutes': np.where(segments['booked'].to_numpy(), lengths, 0),
+    }).groupby(['therapist', 'period'], sort=True, as_index=False).sum()
+
+    grouped['idle_minutes'] = grouped['scheduled_minutes'] - grouped['booked_minutes']
+    grouped['utilization'] = grouped['booked_minutes'] / grouped['scheduled_minutes']
+    grouped['period'] = grouped['period'].to_numpy().astype('datetime64[m]').astype('datetime64[D]')
+    return grouped[UTILIZATION_COLUMNS]
+
+def unsold_sessions(continuous_blocks, session_durations):
+    """
+    Whole sessions of each length that still fit into the free blocks, per therapist
+    and day. `continuous_blocks` is the first result of calculate_availability.
+    Returns a DataFrame of (therapist, date, free_minutes, <minutes>_min ...) with one
+    session-count column per entry of `session_durations`.
+    """
+    columns = ['therapist', 'date', 'free_minutes'] + [f"{minutes}_min" for minutes in session_durations]
+    if not continuous_blocks:
+        return pd.DataFrame(columns=columns)
+
+    starts = _minutes([block['start'] for block in continuous_blocks])
+    lengths = _minutes([block['end'] for block in continuous_blocks]) - starts
+    blocks = pd.DataFrame({
+        'therapist': [block['therapist'] for block in continuous_blocks],
+        'date': _day_start(starts),
+        'free_minutes': lengths,
+    })
+    for minutes in session_durations:
+        blocks[f"{minutes}_min"] = lengths // minutes
+
+    grouped = blocks.groupby(['therapist', 'date'], sort=True, as_index=False).sum()
+    grouped['date'] = grouped['date'].to_numpy().astype('datetime64[m]').astype('datetime64[D]')
+    return grouped[columns]
+
+def _covered_minutes(starts, ends, edges):
+    """
+    Total minutes covered by the intervals inside each [edges[i], edges[i+1]) bin.
+
+    The number of intervals running at any time is a step function built from the
+    sorted +1/-1 events; its running integral is evaluated at the bin edges with
+    searchsorted, so the cost is independent of how many bins an interval spans.
+    """
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([np.ones(len(starts), np.int64), -np.ones(len(ends), np.int64)])
+    order = np.argsort(times, kind='stable')
+    times, running = times[order], np.cumsum(deltas[order])
+    integral = np.concatenate([[0], np.cumsum(running[:-1] * np.diff(times))])
+
+    last = np.searchsorted(times, edges, side='right') - 1
+    inside = last >= 0
+    at_edges = np.zeros(len(edges), dtype=np.int64)
+    at_edges[inside] = integral[last[inside]] + running[last[inside]] * (edges[inside] - times[last[inside]])
+    return np.diff(at_edges)
+
+def peak_hour_heatmap(availability_df, obligations_df, bin_minutes=60, value='utilization'):
+    """
+    Weekday x time-of-day heatmap over the whole horizon.
+
+    Booked and scheduled therapist-minutes are bucketed into `bin_minutes` bins with
+    _covered_minutes, then summed per weekday and time of day. `value` is one of
+    HEATMAP_VALUES: the booked share of scheduled time, or the average number of
+    therapists booked or on shift in that bin over the days of that weekday.
+    Returns a DataFrame indexed by weekday with one column per bin start ('9:00 am'),
+    limited to the weekdays and hours that have shifts.
+    """
+    if value not in HEATMAP_VALUES:
+        raise ValueError(f"Unknown heatmap value '{value}'. Choose one of: {', '.join(HEATMAP_VALUES)}.")
+    if 1440 % bin_minutes:
+        raise ValueError("The bin size must divide a day evenly.")
+    segments = booked_segments(availability_df, obligations_df)
+    if segments.empty:
+        return pd.DataFrame()
+
+    starts = segments['start'].to_numpy()
+    ends = segments['end'].to_numpy()
+    booked = segments['booked'].to_numpy()
+    first_day = _day_start(starts.min())
+    edges = np.arange(first_day, _day_start(ends.max() - 1) + 1440 + 1, bin_minutes)
+    bins = pd.DataFrame({
+        'bin_start': edges[:-1],
+        'scheduled': _covered_minutes(starts, ends, edges),
+        'booked': _covered_minutes(starts[booked], ends[booked], edges),
+    })
+
+    bins['weekday'] = (bins['bin_start'] // 1440 + 3) % 7
+    bins['slot'] = bins['bin_start'] % 1440
+    bins['date'] = bins['bin_start'] // 1440
+    # Days of each weekday in the horizon that have any shift, to average over
+    worked_days = bins.loc[bins['scheduled'] > 0].groupby('weekday')['date'].nunique()
+    totals = bins.groupby(['weekday', 'slot'])[['scheduled', 'booked']].sum()
+    totals = totals.loc[totals.index.get_level_values('weekday').isin(worked_days.index)]
+
+    if value == 'utilization':
+        cells = totals['booked'] / totals['scheduled'].where(totals['scheduled'] > 0)
+    else:
+        days = worked_days.reindex(totals.index.get_level_values('weekday')).to_numpy()
+        cells = totals[value] / (days * bin_minutes)
+    heatmap = cells.unstack('slot')
+
+    # Keep the hours between the earliest and latest bin with anyone on shift
+    open_slots = totals.index.get_level_values('slot')[totals['scheduled'].to_numpy() > 0]
+    heatmap = heatmap.loc[:, open_slots.min():open_slots.max()]
+    heatmap.index = [WEEKDAYS[day] for day in heatmap.index]
+    heatmap.columns = [
+        pd.Timestamp(0).replace(hour=slot // 60, minute=slot % 60).strftime('%I:%M %p').lstrip('0').lower()
+        for slot in heatmap.columns
+    ]
+    return heatmap
@@ -1,59 +1,316 @@
+import contextlib
+import copy
+import itertools
 import os
+import sqlite3
 import sys
+import altair as alt
 import pandas as pd
 import streamlit as st
-import configparser
 import settings_manager
+from analytics import HEATMAP_VALUES, peak_hour_heatmap, unsold_sessions, utilization
+from booking_simulator import BookingSimulator
+from data_quality import FIX_MODES, clean_inputs, summarize_issues, validate_inputs
+from exporters import EXPORT_FORMATS, export_to_buffer, iter_preview_pages, render_preview_page
+from history_store import HistoryStore
+from job_queue import GenerationQueue, estimate_job_bytes
+from multi_site import CONFLICTS, calculate_site_availability
+from pdf_fonts import available_font_families
+from preflight import preflight_reports
+from profiling import ProfileSession, ProfilerBusyError, profile_stage
+from shared_store import SharedResultStore, content_key, metrics_text
 from logic import (
-    load_and_clean_schedule,
-    load_and_parse_availability,
-    calculate_availability,
-    find_couples_slots,
+    compute_report_slots,
+    report_run_key,
     generate_pdf_report,
     extract_date_range_from_filename,
+    display_name_for,
+    iter_report_sections,
     FileProcessingError,
-    format_therapist_name  # <-- Import the translator function
+    format_therapist_name,  # <-- Import the translator function
+    PLACEMENT_STRATEGIES
 )
 
 
-def load_app_config():
-    """Loads operational application settings (tolerances, durations) from config.ini."""
-    config = configparser.ConfigParser()
-    # Use a simple relative path, Streamlit runs from the repo root
-    config.read('config.ini')
-    settings = config['settings']
+# --- Shared Result Store Wrappers for Logic Functions ---
+# Parsed frames, computed slots and rendered PDFs are kept once per server process
+# in SharedResultStores keyed by content hash. Unlike st.cache_data, a hit hands
+# every session the same frozen (read-only) objects instead of a fresh copy.
+# Each store is bounded by the entry, TTL and byte limits in config.ini [cache].
+
+@st.cache_resource
+def get_result_stores():
+    """The process-wide result stores, as {'parsed'|'slots'|'pdf': SharedResultStore}."""
     return {
-        'session_duration_minutes': settings.getint('session_duration_minutes', 75),
-        'tolerance_minutes': settings.getint('tolerance_minutes', 30),
-        'min_gap_hours': settings.getint('min_gap_hours', 1)
+        name: SharedResultStore(name=name, **limits)
+        for name, limits in settings_manager.load_app_config()['caches'].items()
     }
 
-# --- Caching Wrappers for Logic Functions ---
-# These functions wrap the core logic from logic.py in Streamlit's cache
-# to prevent re-parsing the same file on every UI interaction.
+@st.cache_resource
+def get_history_store():
+    """The report history database from config.ini [history], or None when it is switched off."""
+    return HistoryStore(config['history_database']) if config['history_database'] else None
 
-@st.cache_data(show_spinner="Parsing Trainer Availability file...")
-def get_availability_data(uploaded_file):
-    """Cached wrapper for load_and_parse_availability."""
+def record_history(run_key, label, availability_df, obligations_df, continuous_blocks, individual_slots, couples_slots, session_durations, placement_strategy):
+    """Saves freshly computed slots to the history database; a failed write only shows a warning."""
     try:
-        # Pass file-like object directly to logic function
-        availability_df, name_map = load_and_parse_availability(uploaded_file)
-        return availability_df, name_map, None
-    except FileProcessingError as e:
-        return None, None, str(e)
-    except Exception as e:
-        return None, None, f"An unexpected error occurred reading the availability file: {e}"
+        history = get_history_store()
+        if history is not None:
+            history.save_run(
+                availability_df, obligations_df, continuous_blocks, individual_slots, couples_slots,
+                session_durations, placement_strategy=placement_strategy, label=label, run_key=run_key
+            )
+    except sqlite3.Error as e:
+        st.warning(f"The report could not be saved to the history database: {e}", icon="⚠️")
 
-@st.cache_data(show_spinner="Parsing ScheduleAtAGlance file...")
-def get_schedule_data(uploaded_file):
-    """Cached wrapper for load_and_clean_schedule."""
+def get_availability_data(uploaded_file, adapter, profiler=None):
+    """
+    Shared-store wrapper for the availability adapter chosen by the preflight check.
+    A profiled run parses afresh inside the profiler's stage instead.
+    """
+    def parse():
+        try:
+            with st.spinner("Parsing Trainer Availability file..."):
+                # Pass file-like object directly to logic function
+                availability_df, name_map = adapter.load(uploaded_file, workers=config['parse_workers'])
+            return availability_df, name_map, None
+        except FileProcessingError as e:
+            return None, None, str(e)
+        except Exception as e:
+            return None, None, f"An unexpected error occurred reading the availability file: {e}"
+    if profiler is not None:
+        with profiler.stage('parse_availability'):
+            return parse()
+    key = content_key('availability', adapter.name, uploaded_file.getvalue())
+    return get_result_stores()['parsed'].get_or_compute(key, parse)
+
+def get_schedule_data(uploaded_file, adapter, profiler=None):
+    """
+    Shared-store wrapper for the schedule adapter chosen by the preflight check.
+    A profiled run parses afresh inside the profiler's stage instead.
+    """
+    def parse():
+        try:
+            with st.spinner("Parsing ScheduleAtAGlance file..."):
+                obligations_df, elite_therapists = adapter.load(uploaded_file)
+            return obligations_df, elite_therapists, None
+        except FileProcessingError as e:
+            return None, None, str(e)
+        except Exception as e:
+            return None, None, f"An unexpected error occurred reading the schedule file: {e}"
+    if profiler is not None:
+        with profiler.stage('parse_schedule'):
+            return parse()
+    key = content_key('schedule', adapter.name, uploaded_file.getvalue())
+    return get_result_stores()['parsed'].get_or_compute(key, parse)
+
+def run_preflight(uploaded_availability, uploaded_schedule):
+    """Classifies an upload pair from its first bytes; returns (preflight_result, error_message)."""
+    if not (uploaded_availability and uploaded_schedule):
+        return None, None
     try:
-        obligations_df, elite_therapists = load_and_clean_schedule(uploaded_file)
-        return obligations_df, elite_therapists, None
+        return preflight_reports(uploaded_availability, uploaded_schedule), None
     except FileProcessingError as e:
-        return None, None, str(e)
-    except Exception as e:
-        return None, None, f"An unexpected error occurred reading the schedule file: {e}"
+        return None, str(e)
+
+def report_slots_key(uploaded_availability, uploaded_schedule, session_durations, placement_strategy, data_fixes):
+    """Content key of the computed slots: both files plus every option that changes them."""
+    return report_run_key(
+        uploaded_availability.getvalue(),
+        uploaded_schedule.getvalue(),
+        session_durations,
+        placement_strategy,
+        data_fixes,
+        config
+    )
+
+def get_report_slots(uploaded_availability, uploaded_schedule, availability_df, obligations_df, session_durations, placement_strategy, data_fixes, profiler=None):
+    """
+    Shared-store wrapper for the availability, couples and room-capacity calculations.
+    The frames are expected already cleaned with `data_fixes`, which is part of the key.
+    Returns (slots_key, individual_slots, couples_slots, continuous_blocks); several session
+    lengths share one pass and return {minutes: slots} mappings. A profiled run computes afresh.
+    Every computation is also saved to the history database under the same key.
+    """
+    key = report_slots_key(uploaded_availability, uploaded_schedule, session_durations, placement_strategy, data_fixes)
+
+    def compute():
+        continuous_blocks, individual_slots, couples_slots = compute_report_slots(
+            availability_df,
+            obligations_df,
+            session_durations,
+            placement_strategy=placement_strategy,
+            alignment_minutes=config['slot_alignment_minutes'],
+            tolerance_minutes=config['tolerance_minutes'],
+            room_counts=config['room_counts']
+        )
+        record_history(
+            key, uploaded_availability.name, availability_df, obligations_df, continuous_blocks,
+            individual_slots, couples_slots, session_durations, placement_strategy
+        )
+        return individual_slots, couples_slots, continuous_blocks
+
+    if profiler is not None:
+        with profiler.stage('engine'):
+            individual_slots, couples_slots, continuous_blocks = compute()
+        return key, individual_slots, couples_slots, continuous_blocks
+    individual_slots, couples_slots, continuous_blocks = get_result_stores()['slots'].get_or_compute(key, compute)
+    return key, individual_slots, couples_slots, continuous_blocks
+
+def report_pdf_key(slots_key, name_map, settings, sort_order):
+    """Content key of a rendered PDF: the slots plus the names, styles and order it is laid out with."""
+    return content_key('pdf', slots_key, sorted(name_map.items()), settings, sort_order)
+
+def get_report_pdf(report_data, profiler=None):
+    """
+    Shared-store wrapper for generate_pdf_report. Sessions keep only the slot data and
+    layout options; the PDF is only laid out when it is downloaded (or profiled) and
+    rebuilt if the cache has evicted it. A profiled run renders afresh.
+    """
+    def render():
+        return generate_pdf_report(
+            report_data['individual_slots'],
+            report_data['couples_slots'],
+            report_data['name_map'],
+            report_data['settings'],
+            report_data['sort_order']
+        ).getvalue()
+
+    if profiler is not None:
+        with profiler.stage('render_pdf'):
+            return render()
+    key = report_pdf_key(
+        report_data['slots_key'],
+        report_data['name_map'],
+        report_data['settings'],
+        report_data['sort_order']
+    )
+    return get_result_stores()['pdf'].get_or_compute(key, render)
+
+def build_report_pdf(report_data):
+    """Lays out a report's PDF through the generation queue, so PDF rendering counts against its limits."""
+    queue_status = st.empty()
+    key = report_pdf_key(report_data['slots_key'], report_data['name_map'], report_data['settings'], report_data['sort_order'])
+    # The PDF has one line per offered slot, so its layout scales with the slot counts
+    sections = list(iter_report_sections(report_data['individual_slots'], report_data['couples_slots']))
+    get_generation_queue().run(
+        key,
+        estimate_job_bytes(
+            sum(len(individual) for _, individual, _ in sections),
+            sum(len(couples) for _, _, couples in sections)
+        ),
+        lambda: get_report_pdf(report_data),
+        on_wait=lambda position, eta: show_queue_position(queue_status, position, eta)
+    )
+    queue_status.empty()
+
+def get_report_analytics(report_data, period, bin_minutes, heatmap_value):
+    """
+    Shared-store wrapper for the utilization, unsold-capacity and heatmap analytics of a
+    generated report. Returns (utilization_df, unsold_df, heatmap_df).
+    """
+    def compute():
+        availability_df, obligations_df = report_data['availability_df'], report_data['obligations_df']
+        return (
+            utilization(availability_df, obligations_df, period),
+            unsold_sessions(report_data['continuous_blocks'], report_data['session_durations']),
+            peak_hour_heatmap(availability_df, obligations_df, bin_minutes, heatmap_value)
+        )
+    key = content_key('analytics', report_data['slots_key'], period, bin_minutes, heatmap_value)
+    return get_result_stores()['slots'].get_or_compute(key, compute)
+
+def get_site_reports(site_uploads):
+    """
+    Parses, cleans and computes several locations' report pairs together (see multi_site.py),
+    through the shared stores and the generation queue. `site_uploads` is a list of
+    (site_name, uploaded_availability, uploaded_schedule). Returns ({site_name: report_data},
+    conflicts), with report_data dicts as kept by the report panel.
+    """
+    sites = {}
+    name_maps = {}
+    files = []
+    for site, uploaded_availability, uploaded_schedule in site_uploads:
+        preflight, preflight_error = run_preflight(uploaded_availability, uploaded_schedule)
+        if preflight_error:
+            raise FileProcessingError(f"{site}: {preflight_error}")
+        if preflight['swapped']:
+            uploaded_availability, uploaded_schedule = uploaded_schedule, uploaded_availability
+        availability_df, map_id_to_acronym, avail_err = get_availability_data(uploaded_availability, preflight['availability_adapter'])
+        obligations_df, elite_therapists, sched_err = get_schedule_data(uploaded_schedule, preflight['schedule_adapter'])
+        if avail_err or sched_err:
+            raise FileProcessingError(f"{site}: {avail_err or sched_err}")
+        sites[site] = clean_inputs(availability_df, obligations_df, config['data_fixes'])
+        # Same display names the name editor starts from
+        name_maps[site] = {
+            id_key: format_therapist_name(acronym, elite_therapists=elite_therapists)
+            for id_key, acronym in map_id_to_acronym.items()
+            if id_key in set(sites[site][0]['therapist'])
+        }
+        files.append((site, uploaded_availability.getvalue(), uploaded_schedule.getvalue()))
+
+    session_durations = config['session_durations']
+    durations_arg = session_durations if len(session_durations) > 1 else session_durations[0]
+    key = content_key(
+        'site_slots',
+        *files,
+        tuple(session_durations),
+        config['placement_strategy'],
+        config['data_fixes'],
+        config['tolerance_minutes'],
+        config['slot_alignment_minutes'],
+        sorted(config['room_counts'].items())
+    )
+
+    def compute():
+        return calculate_site_availability(
+            sites,
+            session_duration_minutes=durations_arg,
+            placement_strategy=config['placement_strategy'],
+            alignment_minutes=config['slot_alignment_minutes'],
+            tolerance_minutes=config['tolerance_minutes'],
+            room_counts=config['room_counts']
+        )
+
+    queue_status = st.empty()
+    results, conflicts = get_generation_queue().run(
+        key,
+        estimate_job_bytes(
+            sum(len(shifts) for shifts, _ in sites.values()),
+            sum(len(obligations) for _, obligations in sites.values()),
+            len(session_durations)
+        ),
+        lambda: get_result_stores()['slots'].get_or_compute(key, compute),
+        on_wait=lambda position, eta: show_queue_position(queue_status, position, eta)
+    )
+    queue_status.empty()
+
+    settings = copy.deepcopy(st.session_state.pdf_settings)
+    reports = {
+        site: {
+            'slots_key': content_key('site_report', key, site),
+            'individual_slots': results[site]['individual_slots'],
+            'couples_slots': results[site]['couples_slots'],
+            'name_map': name_maps[site],
+            'settings': settings,
+            'sort_order': "Alphabetical"
+        }
+        for site in sites
+    }
+    return reports, conflicts
+
+
+@st.cache_resource
+def get_generation_queue():
+    """The process-wide report generation queue, limited by the [queue] section of config.ini."""
+    return GenerationQueue(**settings_manager.load_app_config()['queue'])
+
+def show_queue_position(placeholder, position, eta_seconds):
+    """Renders a queued job's position and estimated wait into `placeholder`."""
+    eta = "" if eta_seconds is None else f" (about {max(1, round(eta_seconds))} s)"
+    if position:
+        placeholder.info(f"Other reports are being generated. Your report is number {position} in the queue{eta}.", icon="⏳")
+    else:
+        placeholder.info(f"An identical report is already being generated; sharing its result{eta}.", icon="⏳")
 
 
 # --- UI Configuration ---
@@ -65,7 +322,7 @@ st.set_page_config(
 )
 
 # Load operational configuration and persistent PDF settings
-config = load_app_config()
+config = settings_manager.load_app_config()
 if 'pdf_settings' not in st.session_state:
     # Load the default styles once per session
     st.session_state.pdf_settings = settings_manager.get_initial_settings() # <-- Use new function
@@ -73,8 +330,6 @@ if 'pdf_settings' not in st.session_state:
 # --- Initialize Session State Keys ---
 if 'show_guide_toggle' not in st.session_state:
     st.session_state.show_guide_toggle = True
-if 'expand_styles' not in st.session_state:
-    st.session_state.expand_styles = False
 # State keys for the multi-stage therapist name mapping logic
 if 'map_id_to_acronym_ACTIVE' not in st.session_state:
     st.session_state.map_id_to_acronym_ACTIVE = None # Stores {id: acronym_name} FOR ACTIVE THERAPISTS ONLY (e.g., {'jane': 'Jane (3) Hss'})
@@ -85,276 +340,234 @@ if 'editable_editor_map' not in st.session_state:
 if 'processed_files_tuple' not in st.session_state:
     st.session_state.processed_files_tuple = None    # Tracks (avail_id, sched_id) to know when to re-parse names
 
-# --- Callback to trigger the style editor expander ---
-def open_style_editor():
-    """Callback function to expand the PDF style editor in the sidebar."""
-    st.session_state.expand_styles = True
+# --- Shared Helpers ---
+def build_final_name_map():
+    """
+    Creates the FINAL composite map passed to the report generators.
+    This translates the internal {ID -> Final_Display_Name}, e.g. {'jane': 'Jane Doe (Light)'}.
+    Returns None when the name maps have not been built yet.
+    """
+    map_id_to_acronym = st.session_state.get('map_id_to_acronym_ACTIVE') # {id: acronym}
+    map_acronym_to_final = st.session_state.get('editable_editor_map') # {acronym: final_edited_name}
+    if not map_id_to_acronym or not map_acronym_to_final:
+        return None
+    # Find the final edited name from the editor map
+    return {
+        id_key: map_acronym_to_final.get(acronym_val, acronym_val)
+        for id_key, acronym_val in map_id_to_acronym.items()
+    }
 
 
-st.title("Wellness Center - Weekly Availability Generator")
-st.caption("This tool processes 'Staff Schedule' and 'Schedule at a Glance' reports to find and format therapist availability.")
+# --- UI Fragments ---
+# Each panel is a Streamlit fragment: interacting with its widgets reruns only that
+# panel instead of the whole script (file-id checks, parser cache lookups, layout).
+# Computed slot data is kept in st.session_state.report_data, outside the rerun path;
+# it references the shared (read-only) slots, so sessions hold no copies of their own.
 
-# --- Sidebar ---
-with st.sidebar:
-    # CSS Injection to style sidebar expanders for a cleaner look
-    st.markdown("""
-    <style>
-        [data-testid="stSidebar"] [data-testid="stExpander"] summary {
-            background-color: #d0e0c1;
-            border-radius: 5px;
-            margin-bottom: 5px;
-        }
-        [data-testid="stSidebar"] [data-testid="stExpander"] summary p {
-            color: #38565c;
-            font-weight: 600;
-        }
-        [data-testid="stSidebar"] [data-testid="stExpander"] summary svg {
-            color: #38565c;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+def reset_styles():
+    """Callback restoring the default PDF styles and the widgets bound to them."""
+    st.session_state.pdf_settings = settings_manager.get_default_settings()
+    # Drop the widget values so the controls pick up the defaults again
+    for style_key in st.session_state.pdf_settings:
+        for suffix in ('font', 'size', 'color', 'bold', 'italic'):
+            st.session_state.pop(f"{style_key}_{suffix}", None)
 
-    st.header("📄 Guide & Settings")
+def reset_names():
+    """Callback resetting the editable map back to the original auto-formatted {acronym_name: friendly_name} map."""
+    st.session_state.editable_editor_map = st.session_state.original_editor_map.copy()
 
-    # Logic to control PDF Style Expander state (so it closes after opening via button)
-    expand_style_now = st.session_state.get("expand_styles", False)
-    
-    with st.expander("Customize PDF Styles", expanded=expand_style_now):
-        if expand_style_now:
-            # Reset the trigger so it doesn't stay open on reruns
-            st.session_state.expand_styles = False
-        
-        st.markdown("Changes are saved automatically. Previews appear below.")
-        
-        # Helper function to create a row of style controls
-        def style_editor(label, key):
-            st.subheader(label)
-            settings = st.session_state.pdf_settings[key]
-            c1, c2, c3 = st.columns(3)
-            settings['font_size'] = c1.number_input("Size", min_value=6, max_value=36, value=settings['font_size'], key=f"{key}_size")
-            settings['color_hex'] = c2.color_picker("Color", value=settings['color_hex'], key=f"{key}_color")
-            settings['bold'] = c3.checkbox("Bold", value=settings['bold'], key=f"{key}_bold")
-            settings['italic'] = c3.checkbox("Italic", value=settings['italic'], key=f"{key}_italic")
-            
-            # --- Live Style Preview ---
-            # Show the user the immediate effect of their style changes
-            st.markdown("**Preview:**")
-            style_str = (
-                f"font-family:Helvetica; "
-                f"font-size:{settings['font_size']}px; "
-                f"color:{settings['color_hex']}; "
-                f"font-weight:{'bold' if settings['bold'] else 'normal'}; "
-                f"font-style:{'italic' if settings['italic'] else 'normal'};"
-            )
-            preview_html = f'''
-                <div style="padding: 10px; border-radius: 5px; background-color: var(--streamlit-theme-backgroundColor);">
-                    <span style="{style_str}">{label} Preview Text</span>
-                </div>
-            '''
-            st.markdown(preview_html, unsafe_allow_html=True)
-            # --- End Preview ---
-            
-            st.divider()
-
-        # Create the UI for each styleable PDF element
-        style_editor("Report Title", 'title')
-        style_editor("Couples Section Header", 'couples_header')
-        style_editor("Couples Section Body", 'couples_body')
-        style_editor("Day of the Week", 'day_of_week')
-        style_editor("Therapist Name", 'therapist')
-        style_editor("Availability Times", 'times')
-        if st.button("Reset Styles to Default"):
-            st.session_state.pdf_settings = settings_manager.get_default_settings()
-            settings_manager.save_settings(st.session_state.pdf_settings)
-            st.rerun()
+def turn_preview_page(step):
+    """Callback moving the report preview `step` pages forward or back."""
+    st.session_state.preview_page = max(0, st.session_state.get('preview_page', 0) + step)
 
-    # --- FULL GUIDE & FAQ CONTENT ---
-    # Guide Expander controlled by main page toggle
-    with st.expander("View Guide & FAQ", expanded=st.session_state.show_guide_toggle):
-        st.markdown("""
-        **1. Go to Reports → Staff Schedule**
-        * Select your start and end date (e.g., Monday-Friday or Thursday-Sunday).
-        * Change "Late cancel - no charge" to "ALL" in the drop-down menu.
-        * Export to excel.
-            * Save the file as is (don't change the default file name).
-        """)
-        
-        image_path_trainer_avail = "assets/trainierAvailguideimg.png"
-        if os.path.exists(image_path_trainer_avail):
-            st.image(image_path_trainer_avail)
+def clear_result_stores():
+    """Callback dropping every result held by the shared stores."""
+    for store in get_result_stores().values():
+        store.clear()
 
-        st.markdown("""
-        **2. Go to Reports → Schedule at a Glance**
-        * Select the same start and end dates as in the previous report.
-        * Filters → Staff:
-            * Deselect Waitlist.
-            * Deselect Late cancel - no charge.
-        * Export to excel.
-            * Save the file as is (don't change the default file name).
-        """)
+def clear_report():
+    """Drops the previous report's per-session state once the uploaded files change."""
+    for key in ('report_generated', 'report_data', 'report_name_map', 'booking_simulator', 'preview_page'):
+        st.session_state.pop(key, None)
 
-        image_path_schedule = "assets/ScheduleAtAGlance.png"
-        if os.path.exists(image_path_schedule):
-            st.image(image_path_schedule)
+def clear_site_reports():
+    """Drops the previous multi-location result once any location's files or names change."""
+    st.session_state.pop('site_reports', None)
 
-        st.markdown("""
-        **3. Generate the Report in This App**
-        * Upload the 'Staff Schedule' and 'Schedule at a Glance' files into the main window.
-        * Click the 'Generate Report' button.
-        * Click 'Download PDF Report'.
+
+def style_controls():
+    """PDF style controls with a sample of each element, bound to st.session_state.pdf_settings."""
+    st.markdown("Changes are saved automatically. Previews appear below.")
+    # Core PDF fonts plus any custom families found in the fonts folder
+    font_families = available_font_families()
+    
+    # Helper function to create a row of style controls
+    def style_editor(label, key):
+        st.subheader(label)
+        settings = st.session_state.pdf_settings[key]
+        families = font_families if settings['font_family'] in font_families else font_families + [settings['font_family']]
+        settings['font_family'] = st.selectbox("Font", families, index=families.index(settings['font_family']), key=f"{key}_font")
+        c1, c2, c3 = st.columns(3)
+        settings['font_size'] = c1.number_input("Size", min_value=6, max_value=36, value=settings['font_size'], key=f"{key}_size")
+        settings['color_hex'] = c2.color_picker("Color", value=settings['color_hex'], key=f"{key}_color")
+        settings['bold'] = c3.checkbox("Bold", value=settings['bold'], key=f"{key}_bold")
+        settings['italic'] = c3.checkbox("Italic", value=settings['italic'], key=f"{key}_italic")
         
-        ---
-        ### FAQ
+        # --- Live Style Preview ---
+        # Show the user the immediate effect of their style changes
+        st.markdown("**Preview:**")
+        style_str = (
+            f"font-family:'{settings['font_family']}', Helvetica, sans-serif; "
+            f"font-size:{settings['font_size']}px; "
+            f"color:{settings['color_hex']}; "
+            f"font-weight:{'bold' if settings['bold'] else 'normal'}; "
+            f"font-style:{'italic' if settings['italic'] else 'normal'};"
+        )
+        preview_html = f'''
+            <div style="padding: 10px; border-radius: 5px; background-color: var(--streamlit-theme-backgroundColor);">
+                <span style="{style_str}">{label} Preview Text</span>
+            </div>
+        '''
+        st.markdown(preview_html, unsafe_allow_html=True)
+        # --- End Preview ---
+        
+        st.divider()
 
-        **Why does "Waitlist" or "Late Cancel" appear as a therapist on my final report?**
-        * This happens when 'Waitlist' or 'Late cancel - no charge' are left selected when generating the 'Schedule at a Glance' report. The program sees them as valid schedule items.
-        * **How to fix it:** Follow Step 2 in the guide *exactly*. Re-download the 'Schedule at a Glance' report, making sure to de-select those two items from the Staff filter.
+    # Create the UI for each styleable PDF element
+    style_editor("Report Title", 'title')
+    style_editor("Couples Section Header", 'couples_header')
+    style_editor("Couples Section Body", 'couples_body')
+    style_editor("Day of the Week", 'day_of_week')
+    style_editor("Therapist Name", 'therapist')
+    style_editor("Availability Times", 'times')
+    st.button("Reset Styles to Default", on_click=reset_styles)
 
-        **Error: "Please upload both files to generate the report."**
-        * **What it means:** You clicked "Generate Report" before two files were successfully uploaded.
-        * **How to fix it:** Simply upload both required Excel files into their designated boxes.
+def name_controls():
+    """Therapist display-name editor, bound to st.session_state.editable_editor_map."""
+    st.markdown("""
+        This panel lists **active therapists** found in the file. Use the 'Display_Name' column to set the exact name you want printed on the final PDF.
 
-        **Error: "The date ranges in the filenames do not match..."**
-        * **What it means:** The program checks the filenames to ensure you are comparing matching reports. This error means the dates (e.g., "01-01-2024 to 01-07-2024") found in the two filenames are different.
-        * **How to fix it:** Check the files you downloaded. Ensure you exported both reports using the exact same date range. Do not change the filenames manually.
+        The application automatically formats the original names to be more client-friendly based on indicators found in the 'Staff Schedule' report:
+        * A **"3"** in the name is translated to `(Light to Medium)`.
+        * A **"3+"** in the name is translated to `(Light to Medium+)`.
+        * A **"4"** in the name is translated to `(Medium to Deep)`.
+        * Therapists associated with "Elite Level" services in the 'Schedule at a Glance' report will also receive an `Elite Therapist` tag in their name.
 
-        **Error: "The 'Trainer Availability' file... no schedules were found inside" OR "no valid schedule blocks were found."**
-        * **What it means:** The application successfully opened the file but could not find any recognizable staff schedules (i.e., rows marked "Appointments"). This is almost always caused by generating the 'Staff Schedule' report with the wrong filter settings.
-        * **How to fix it:** Go back to your scheduling software. [cite_start]Re-download the **Staff Schedule** report, ensuring you follow Step 1 and set the status filter dropdown to **"ALL"**[cite: 2].
+        You can modify these automatically generated names in the table below to whatever you prefer for the final report.
+    """)
+    
+    # This editor only activates after the Trainer Availability file is uploaded and parsed
+    if 'editable_editor_map' not in st.session_state or st.session_state.editable_editor_map is None:
+        st.caption("Upload a 'Trainer Availability' file above to activate the name editor.")
+    else:
+        st.info("Edit the names in the **Display_Name** column. This is what will appear on the report.", icon="✏️")
+        
+        try:
+            # Build DataFrame from the {acronym_name: friendly_name} map
+            map_df = pd.DataFrame.from_dict(
+                st.session_state.editable_editor_map,
+                orient='index',
+                columns=['Display_Name']
+            )
+            map_df.index.name = "Original_Name (from file)" # This is the key, e.g., "Jane (3) Hss"
+            
+            # Create the data editor, bound to this dataframe
+            edited_df = st.data_editor(
+                map_df,
+                width='stretch',
+                disabled=["Original_Name (from file)"] # Lock the "key" column so only values are editable
+            )
+            
+            # On any edit, save the resulting dataframe (as a dict) back to the session state variable
+            if edited_df is not None:
+                # The new map is {acronym_name: final_edited_name}
+                st.session_state.editable_editor_map = edited_df['Display_Name'].to_dict()
 
-        **Error: "The 'ScheduleAtAGlance' file... missing a required column..." OR "Could not parse some dates or times..."**
-        * **What it means:** The 'ScheduleAtAGlance' report is in an unexpected format. This can mean a required column (like 'Date', 'Start time', or 'Staff') is missing, or the data inside (like the 'Start time') is in a format the program cannot read.
-        * **How to fix it:** Re-download the correct 'Schedule at a Glance' report. Ensure no columns have been manually deleted or altered. Verify you are uploading the correct file to the second input box.
+            st.button("Reset Names to Friendly Default", on_click=reset_names)
 
-        **Error: "Name maps not found in session. Please re-upload files..."**
-        * **What it means:** This technical error usually means the 'Trainer Availability' file was parsed but contained **zero active therapists** for the selected date range (e.g., you ran a report for a weekend when no one is working). Without any therapists, the name editor and report generator cannot start.
-        * **How to fix it:** Verify that the 'Trainer Availability' file you uploaded actually contains "SCHEDULE FOR" sections for therapists who are working that week. If it doesn't, run the report for the correct week.
+        except Exception as e:
+            st.error(f"Could not display name editor: {e}")
 
-        **Error: "An unexpected system error occurred..." OR an error mentioning "lxml" or "parsing".**
-        * **What it means:** This is a general error that can happen for several reasons, typically meaning the program couldn't even read a file, or one of the files is fundamentally wrong.
-        * **How to fix it:**
-            * **1. Check if Files are Open:** Make sure the Excel files are not open in Microsoft Excel or another program. Excel "locks" files when they are open, preventing this tool from reading them. Close the file and try again.
-            * **2. Check for Correct Files:** Did you accidentally upload the wrong file (like a PDF) or the same file into both slots?
-            * **3. Check for a Permanent Report Format Change (Developer Fix Required)** This error can occur if your scheduling software provider updates the structure, format, or file type of their exported reports. Think of this application as a custom-made key designed to fit the specific format of those reports—if the provider changes the "lock," the key no longer works. This means the application can no longer recognize or process the updated files without a code update. Common signs include renamed columns, a different layout, or a new file type. If you suspect this is the case, please contact the developer and include a sample of the updated report.
 
-        **My PDF style settings (colors, fonts) reset every time I close the app. Why?**
-        * This is the expected behavior for this type of web application. Your custom styles are stored only for your current browser session. Because the app runs in a cloud environment with a temporary file system, it cannot save settings permanently. When you close the browser tab, the session ends, and the custom styles are cleared.
-        * **How to fix it:** You will need to re-apply your desired style customizations at the beginning of each new session. The app will always load with the default styles.
+@st.fragment
+def upload_panel():
+    """
+    File uploaders, therapist name-map building and filename date verification.
+    A new file pair or date result triggers a full rerun so the other panels refresh.
+    """
+    # Initialize upload variables
+    uploaded_availability = None
+    uploaded_schedule = None
 
-                    
-        ### Contact & Support
-        Have a feature request or encounter a persistent issue? Please contact the developer at: alexanderseniw.5.pro@gmail.com
-        """)
-    # --- END FULL GUIDE CONTENT ---
-
-    # --- Advanced Name Map Editor ---
-    with st.expander("Advanced: Edit Therapist Names"):
-        st.markdown("""
-            This panel lists **active therapists** found in the file. Use the 'Display_Name' column to set the exact name you want printed on the final PDF.
-
-            The application automatically formats the original names to be more client-friendly based on indicators found in the 'Staff Schedule' report:
-            * A **"3"** in the name is translated to `(Light to Medium)`.
-            * A **"3+"** in the name is translated to `(Light to Medium+)`.
-            * A **"4"** in the name is translated to `(Medium to Deep)`.
-            * Therapists associated with "Elite Level" services in the 'Schedule at a Glance' report will also receive an `Elite Therapist` tag in their name.
-
-            You can modify these automatically generated names in the table below to whatever you prefer for the final report.
-        """)
+    # This logic displays either the detailed step-by-step guide or the compact "expert" view
+    if st.session_state.show_guide_toggle:
+        # --- Step-by-Step Guided Flow ---
+        st.subheader("Step 1: Get Your Files")
+        st.markdown("Open the **'📄 Guide & Settings'** in the sidebar (it should already be open). Follow the instructions in **'View Guide & FAQ'** *exactly* to download your two reports.")
+        st.warning("You must follow the guide's instructions (like setting the filter to 'ALL') and use the reference images, or the report will fail.", icon="❗")
+        with st.container(border=True):
+            st.subheader("Step 2: Upload 'Trainer Availability'")
+            uploaded_availability = st.file_uploader(
+                "Upload Staff Schedule (.xls)", type=['xls', 'xlsx'], key="guide_uploader_avail",
+                help="Upload the 'Staff Schedule' Excel file (.xls) downloaded from your system per Step 1 in the guide. Do not change the filename."
+            )
+        with st.container(border=True):
+            st.subheader("Step 3: Upload 'ScheduleAtAGlance'")
+            uploaded_schedule = st.file_uploader(
+                "Upload Schedule at a Glance (.xlsx)", type=['xls', 'xlsx'], key="guide_uploader_sched",
+                help="Upload the 'Schedule at a Glance' Excel file (.xlsx) downloaded from your system per Step 2 in the guide. Do not change the filename."
+            )
+        st.subheader("Step 4: (Optional) Customize Styles & Names")
+        st.markdown("You can customize PDF fonts and edit therapist names under **Customize & Preview** at the bottom of the page. Once a report is generated, its pages are previewed there as you edit.")
         
-        # This editor only activates after the Trainer Availability file is uploaded and parsed
-        if 'editable_editor_map' not in st.session_state or st.session_state.editable_editor_map is None:
-            st.caption("Upload a 'Trainer Availability' file in the main window to activate the name editor.")
-        else:
-            st.info("Edit the names in the **Display_Name** column. This is what will appear on the report.", icon="✏️")
-            
-            try:
-                # Build DataFrame from the {acronym_name: friendly_name} map
-                map_df = pd.DataFrame.from_dict(
-                    st.session_state.editable_editor_map,
-                    orient='index',
-                    columns=['Display_Name']
-                )
-                map_df.index.name = "Original_Name (from file)" # This is the key, e.g., "Jane (3) Hss"
-                
-                # Create the data editor, bound to this dataframe
-                edited_df = st.data_editor(
-                    map_df,
-                    width='stretch',
-                    disabled=["Original_Name (from file)"] # Lock the "key" column so only values are editable
-                )
-                
-                # On any edit, save the resulting dataframe (as a dict) back to the session state variable
-                if edited_df is not None:
-                    # The new map is {acronym_name: final_edited_name}
-                    st.session_state.editable_editor_map = edited_df['Display_Name'].to_dict()
-
-                if st.button("Reset Names to Friendly Default"):
-                    # Reset editable map back to the original auto-formatted {acronym_name: friendly_name} map
-                    st.session_state.editable_editor_map = st.session_state.original_editor_map.copy()
-                    st.rerun()
-
-            except Exception as e:
-                st.error(f"Could not display name editor: {e}")
-    # --- End Name Editor ---
-
-# --- Welcome Message & Guided Flow Toggle ---
-st.info("👋 **Welcome!** This tool generates a client-facing PDF of weekly therapist availability based on two reports from your scheduling system.", icon="📄")
+        st.subheader("Step 5: Generate Report")
+        st.markdown("Once both files are uploaded, verify the dates below and click **'Generate Report'**.")
+    else:
+        # --- Compact "Expert" Flow ---
+        st.markdown("Please upload the two weekly Excel files to generate the client-facing availability report.")
+        col1, col2 = st.columns(2)
+        with col1:
+            uploaded_availability = st.file_uploader(
+                "1. Trainer Availability (.xls)", type=['xls', 'xlsx'], key="expert_uploader_avail",
+                help="Upload the 'Staff Schedule' Excel file (.xls). Do not change the filename."
+            )
+        with col2:
+            uploaded_schedule = st.file_uploader(
+                "2. ScheduleAtAGlance (.xlsx)", type=['xls', 'xlsx'], key="expert_uploader_sched",
+                help="Upload the 'Schedule at a Glance' Excel file (.xlsx). Do not change the filename."
+            )
 
-st.toggle(
-    "Show step-by-step guide (for first-time users)", 
-    key="show_guide_toggle",
-    help="If you are a returning user, toggle this off to use the faster compact upload view."
-)
-st.divider()
+    st.divider()
 
-# Initialize upload variables
-uploaded_availability = None
-uploaded_schedule = None
+    # Share the current uploads with the report panel; a changed pair reruns the full app
+    uploads_key = (
+        uploaded_availability.file_id if uploaded_availability else None,
+        uploaded_schedule.file_id if uploaded_schedule else None
+    )
+    if uploads_key != st.session_state.get('uploads_key'):
+        st.session_state.uploads_key = uploads_key
+        st.session_state.verified_dates = None
+        # Classify the new pair once, from the first few KB, before anything is parsed
+        st.session_state.preflight = run_preflight(uploaded_availability, uploaded_schedule)
+        clear_report()
+        st.rerun()
 
-# This logic displays either the detailed step-by-step guide or the compact "expert" view
-if st.session_state.show_guide_toggle:
-    # --- Step-by-Step Guided Flow ---
-    st.subheader("Step 1: Get Your Files")
-    st.markdown("Open the **'📄 Guide & Settings'** in the sidebar (it should already be open). Follow the instructions in **'View Guide & FAQ'** *exactly* to download your two reports.")
-    st.warning("You must follow the guide's instructions (like setting the filter to 'ALL') and use the reference images, or the report will fail.", icon="❗")
-    with st.container(border=True):
-        st.subheader("Step 2: Upload 'Trainer Availability'")
-        uploaded_availability = st.file_uploader(
-            "Upload Staff Schedule (.xls)", type=['xls'], key="guide_uploader_avail",
-            help="Upload the 'Staff Schedule' Excel file (.xls) downloaded from your system per Step 1 in the guide. Do not change the filename."
-        )
-    with st.container(border=True):
-        st.subheader("Step 3: Upload 'ScheduleAtAGlance'")
-        uploaded_schedule = st.file_uploader(
-            "Upload Schedule at a Glance (.xlsx)", type=['xlsx'], key="guide_uploader_sched",
-            help="Upload the 'Schedule at a Glance' Excel file (.xlsx) downloaded from your system per Step 2 in the guide. Do not change the filename."
-        )
-    st.subheader("Step 4: (Optional) Customize Styles & Names")
-    st.markdown("You can customize PDF fonts in the sidebar. Advanced users can also edit therapist names (see the 'Advanced' panel in the sidebar).")
-    st.button("Open PDF Style Editor ➡️", on_click=open_style_editor, help="This will open the 'Customize PDF Styles' panel in the sidebar.")
-    
-    st.subheader("Step 5: Generate Report")
-    st.markdown("Once both files are uploaded, verify the dates below and click **'Generate Report'**.")
-else:
-    # --- Compact "Expert" Flow ---
-    st.markdown("Please upload the two weekly Excel files to generate the client-facing availability report.")
-    col1, col2 = st.columns(2)
-    with col1:
-        uploaded_availability = st.file_uploader(
-            "1. Trainer Availability (.xls)", type=['xls'], key="expert_uploader_avail",
-            help="Upload the 'Staff Schedule' Excel file (.xls). Do not change the filename."
-        )
-    with col2:
-        uploaded_schedule = st.file_uploader(
-            "2. ScheduleAtAGlance (.xlsx)", type=['xlsx'], key="expert_uploader_sched",
-            help="Upload the 'Schedule at a Glance' Excel file (.xlsx). Do not change the filename."
-        )
+    preflight, preflight_error = st.session_state.get('preflight', (None, None))
+    if preflight and preflight['swapped']:
+        uploaded_availability, uploaded_schedule = uploaded_schedule, uploaded_availability
+    st.session_state.uploaded_files = (uploaded_availability, uploaded_schedule)
 
-st.divider()
+    # --- Main Processing Logic ---
+    # This block runs only after BOTH files have been uploaded.
+    if not (uploaded_availability and uploaded_schedule):
+        return
+    if preflight_error:
+        st.error(f"❌ {preflight_error}")
+        return
+    if preflight['swapped']:
+        st.info("The two files were uploaded into each other's boxes, so they have been swapped automatically.", icon="🔄")
+    st.session_state.report_adapters = (preflight['availability_adapter'], preflight['schedule_adapter'])
 
-# --- Main Processing Logic ---
-# This block runs only after BOTH files have been uploaded.
-if uploaded_availability and uploaded_schedule:
     avail_name = uploaded_availability.name
     sched_name = uploaded_schedule.name
 
@@ -366,10 +579,10 @@ if uploaded_availability and uploaded_schedule:
         # A new file or combination of files has been uploaded. Re-parse and build all name maps.
         
         # 1. Parse schedule file to get the list of elite therapists
-        _, elite_therapists, sched_parse_error = get_schedule_data(uploaded_schedule)
+        obligations_df, elite_therapists, sched_parse_error = get_schedule_data(uploaded_schedule, preflight['schedule_adapter'])
         
         # 2. Parse availability file
-        availability_df, map_id_to_acronym_FULL, avail_parse_error = get_availability_data(uploaded_availability)
+        availability_df, map_id_to_acronym_FULL, avail_parse_error = get_availability_data(uploaded_availability, preflight['availability_adapter'])
         
         # 3. Handle any parsing errors
         if avail_parse_error or sched_parse_error:
@@ -379,6 +592,7 @@ if uploaded_availability and uploaded_schedule:
             st.session_state.map_id_to_acronym_ACTIVE = None
             st.session_state.original_editor_map = None
             st.session_state.editable_editor_map = None
+            st.session_state.data_quality_issues = None
             st.session_state.processed_files_tuple = None # Mark as not processed so it tries again
         elif map_id_to_acronym_FULL and availability_df is not None and not availability_df.empty:
             
@@ -401,6 +615,8 @@ if uploaded_availability and uploaded_schedule:
             st.session_state.map_id_to_acronym_ACTIVE = active_map_id_to_acronym # {id: acronym}
             st.session_state.original_editor_map = editor_map_acronym_to_friendly # {acronym: friendly} (for reset)
             st.session_state.editable_editor_map = editor_map_acronym_to_friendly.copy() # {acronym: friendly_or_edited} (for editor)
+            # 7. Check the parsed rows for problems the engines would silently absorb
+            st.session_state.data_quality_issues = validate_inputs(availability_df, obligations_df)
             st.session_state.processed_files_tuple = current_files_tuple
             st.rerun() # Rerun to make the sidebar editor populate with the new data
         elif availability_df is not None and availability_df.empty:
@@ -409,6 +625,15 @@ if uploaded_availability and uploaded_schedule:
              st.session_state.processed_files_tuple = current_files_tuple # Mark as processed to avoid loops
 
 
+    # --- Data quality report ---
+    issues = st.session_state.get('data_quality_issues')
+    if issues is not None and not issues.empty:
+        with st.expander(f"⚠️ Data check: {len(issues)} problem row(s) found in the uploaded files"):
+            st.dataframe(summarize_issues(issues), hide_index=True, width='stretch')
+            st.dataframe(issues, hide_index=True, width='stretch')
+            st.caption("Choose under **Problem rows** below whether these rows are repaired, dropped or used as they are. "
+                       "Appointments outside every shift are always kept, because they still occupy a room.")
+
     # --- Date verification logic ---
     start_date_avail, end_date_avail = extract_date_range_from_filename(avail_name)
     start_date_sched, end_date_sched = extract_date_range_from_filename(sched_name)
@@ -429,8 +654,19 @@ if uploaded_availability and uploaded_schedule:
         else:
             st.error("❌ Date ranges in filenames do not match or could not be read.")
 
+    verified_dates = (start_date_avail, end_date_avail) if dates_valid else None
+    if verified_dates != st.session_state.get('verified_dates'):
+        st.session_state.verified_dates = verified_dates
+        st.rerun()
 
-    if dates_valid:
+
+@st.fragment
+def report_panel():
+    """Report options, generation and downloads. Option changes rerun only this panel."""
+    uploaded_availability, uploaded_schedule = st.session_state.get('uploaded_files', (None, None))
+    verified_dates = st.session_state.get('verified_dates')
+    if uploaded_availability and uploaded_schedule and verified_dates:
+        start_date_avail, end_date_avail = verified_dates
         pdf_filename = f"Availability {start_date_avail} to {end_date_avail}.pdf"
         sort_order = st.radio(
             "**Sort therapists by:**",
@@ -438,66 +674,147 @@ if uploaded_availability and uploaded_schedule:
             horizontal=True,
             help="Choose how to order therapists for each day in the PDF report."
         )
+        placement_labels = {
+            'left': "Start of each free block",
+            'right': "End of each free block",
+            'adjacent': "Next to existing appointments",
+            'optimized': "Optimized (most sessions & couples alignment)"
+        }
+        session_durations = sorted(st.multiselect(
+            "**Session lengths (minutes):**",
+            sorted(set([60, 75, 90, 120] + config['session_durations'])),
+            default=config['session_durations'],
+            help="Select several lengths to include a section for each one in the same report."
+        ))
+        placement_options = list(PLACEMENT_STRATEGIES)
+        placement_strategy = st.selectbox(
+            "**Slot placement:**",
+            placement_options,
+            index=placement_options.index(config['placement_strategy']) if config['placement_strategy'] in placement_options else 0,
+            format_func=lambda key: placement_labels.get(key, key),
+            help="Choose where appointment times are placed inside each therapist's free time."
+        )
+        fix_options = list(FIX_MODES)
+        data_fixes = st.selectbox(
+            "**Problem rows:**",
+            fix_options,
+            index=fix_options.index(config['data_fixes']) if config['data_fixes'] in fix_options else 0,
+            format_func=lambda key: FIX_MODES[key],
+            help="How rows flagged by the data check (overlapping shifts, reversed times, waitlist entries) are handled."
+        )
 
         if st.button("Generate Report", type="primary"):
             # --- Report Generation Workflow ---
             # This logic runs when the user clicks the generate button
             with st.spinner("Processing schedules and generating report..."):
                 try:
-                    # 1. Get base data from cache (or re-run if files changed)
-                    availability_df, _, avail_err = get_availability_data(uploaded_availability)
-                    obligations_df, _, sched_err = get_schedule_data(uploaded_schedule)
+                    profiler = ProfileSession(label=pdf_filename) if st.session_state.get('profile_report') else None
+                    with profiler.capture() if profiler else contextlib.nullcontext():
+                        # 1. Get base data from cache (or re-run if files changed)
+                        availability_adapter, schedule_adapter = st.session_state.report_adapters
+                        availability_df, _, avail_err = get_availability_data(uploaded_availability, availability_adapter, profiler)
+                        obligations_df, _, sched_err = get_schedule_data(uploaded_schedule, schedule_adapter, profiler)
 
-                    if avail_err or sched_err:
-                        if avail_err: st.error(f"Availability File Error: {avail_err}", icon="️⚠️")
-                        if sched_err: st.error(f"Schedule File Error: {sched_err}", icon="️⚠️")
-                        raise FileProcessingError("Could not process one or both files.")
+                        if avail_err or sched_err:
+                            if avail_err: st.error(f"Availability File Error: {avail_err}", icon="️⚠️")
+                            if sched_err: st.error(f"Schedule File Error: {sched_err}", icon="️⚠️")
+                            raise FileProcessingError("Could not process one or both files.")
 
-                    if availability_df is None or obligations_df is None:
-                         raise FileProcessingError("One or both data files returned empty.")
+                        if availability_df is None or obligations_df is None:
+                             raise FileProcessingError("One or both data files returned empty.")
+                        with profile_stage(profiler, 'validate'):
+                            availability_df, obligations_df = clean_inputs(availability_df, obligations_df, data_fixes)
                          
-                    # 2. Get the required name maps from session state (which were built above)
-                    map_id_to_acronym = st.session_state.get('map_id_to_acronym_ACTIVE') # {id: acronym}
-                    map_acronym_to_final = st.session_state.get('editable_editor_map') # {acronym: final_edited_name}
-
-                    if not map_id_to_acronym or not map_acronym_to_final:
-                        raise FileProcessingError("Name maps not found in session. Please re-upload files or ensure the availability file contains active schedules.")
-
-                    # 3. Create the FINAL composite map to pass to the PDF generator.
-                    # This translates the internal {ID -> Final_Display_Name}
-                    # e.g., {'jane': 'Jane Doe (Light)'}
-                    final_map_for_pdf = {}
-                    for id_key, acronym_val in map_id_to_acronym.items():
-                        # Find the final edited name from the editor map
-                        final_display_name = map_acronym_to_final.get(acronym_val, acronym_val)
-                        final_map_for_pdf[id_key] = final_display_name
+                        # 2. Create the FINAL composite map to pass to the PDF generator from the
+                        # name maps in session state (which were built by the upload panel).
+                        final_map_for_pdf = build_final_name_map()
+                        if not final_map_for_pdf:
+                            raise FileProcessingError("Name maps not found in session. Please re-upload files or ensure the availability file contains active schedules.")
                          
-                    # 4. Run calculations using the core logic functions
-                    continuous_blocks, individual_slots = calculate_availability(
-                        availability_df,
-                        obligations_df,
-                        session_duration_minutes=config['session_duration_minutes']
-                    )
-                    
-                    couples_slots = find_couples_slots(
-                        continuous_blocks,
-                        obligations_df,
-                        tolerance_minutes=config['tolerance_minutes'],
-                        session_duration_minutes=config['session_duration_minutes']
-                    )
-                    
-                    # 5. Pass the FINAL composite map to the PDF generator
-                    pdf_buffer = generate_pdf_report(
-                        individual_slots, 
-                        couples_slots,
-                        final_map_for_pdf,  # <-- Pass the final, user-edited map
-                        st.session_state.pdf_settings, 
-                        sort_order
-                    )
+                        # 3. Run calculations through the generation queue, which limits concurrent jobs
+                        # and lets identical requests share one computation. Several session lengths
+                        # share one pass and return {minutes: slots} mappings. The PDF itself is laid
+                        # out only when it is downloaded, except in a profiled run.
+                        if not session_durations:
+                            raise FileProcessingError("Please select at least one session length.")
+                        slots_key = report_slots_key(uploaded_availability, uploaded_schedule, session_durations, placement_strategy, data_fixes)
+                        pdf_settings = copy.deepcopy(st.session_state.pdf_settings)
+
+                        def generate():
+                            _, individual_slots, couples_slots, continuous_blocks = get_report_slots(
+                                uploaded_availability,
+                                uploaded_schedule,
+                                availability_df,
+                                obligations_df,
+                                session_durations,
+                                placement_strategy,
+                                data_fixes,
+                                profiler
+                            )
+                            if profiler is not None:
+                                get_report_pdf({
+                                    'slots_key': slots_key,
+                                    'individual_slots': individual_slots,
+                                    'couples_slots': couples_slots,
+                                    'name_map': final_map_for_pdf,
+                                    'settings': pdf_settings,
+                                    'sort_order': sort_order
+                                }, profiler)
+                            return individual_slots, couples_slots, continuous_blocks
+
+                        queue_status = st.empty()
+                        # A profiled job must run here, not be shared with an identical job elsewhere
+                        queue_key = slots_key
+                        if profiler is not None:
+                            queue_key += ':profile'
+                        individual_slots, couples_slots, continuous_blocks = get_generation_queue().run(
+                            queue_key,
+                            estimate_job_bytes(len(availability_df), len(obligations_df), len(session_durations)),
+                            generate,
+                            on_wait=lambda position, eta: show_queue_position(queue_status, position, eta)
+                        )
+                        queue_status.empty()
+
+                        # 4. Keep the slots and layout options (with the FINAL composite, user-edited
+                        # name map) so downloads, exports and re-layouts can reuse them, and the
+                        # cleaned frames and free blocks the analytics tab is computed from.
+                        report_data = {
+                            'slots_key': slots_key,
+                            'individual_slots': individual_slots,
+                            'couples_slots': couples_slots,
+                            'name_map': final_map_for_pdf,
+                            'settings': pdf_settings,
+                            'sort_order': sort_order,
+                            'continuous_blocks': continuous_blocks,
+                            'session_durations': session_durations,
+                            'availability_df': availability_df,
+                            'obligations_df': obligations_df
+                        }
                     
-                    st.session_state.report_generated = True
-                    st.session_state.pdf_report = pdf_buffer
-                    st.session_state.pdf_filename = pdf_filename
+                        # 5. Build the what-if simulator from the same inputs for the booking panel
+                        st.session_state.booking_simulator = BookingSimulator(
+                            availability_df,
+                            obligations_df,
+                            session_duration_minutes=session_durations[0],
+                            tolerance_minutes=config['tolerance_minutes'],
+                            min_gap_hours=config['min_gap_hours'],
+                            room_counts=config['room_counts'],
+                            placement_strategy=placement_strategy,
+                            alignment_minutes=config['slot_alignment_minutes']
+                        )
+                        st.session_state.report_name_map = final_map_for_pdf
+
+                        st.session_state.report_generated = True
+                        st.session_state.pdf_filename = pdf_filename
+                        st.session_state.report_data = report_data
+
+                    if profiler is not None:
+                        st.session_state.profile_artifact = {
+                            'data': profiler.artifact(),
+                            'file_name': os.path.splitext(pdf_filename)[0] + " profile.zip",
+                            'stages': [(name, seconds) for name, seconds, _, _, _ in profiler.stages],
+                            'wall_seconds': profiler.wall_seconds
+                        }
                     st.success("Report generated successfully! - Be sure upload it to google docs to preserve formatting.", icon="✅")
 
                 except FileProcessingError as e:
@@ -518,6 +835,10 @@ if uploaded_availability and uploaded_schedule:
                             st.code(error_str)
 
 
+                except ProfilerBusyError as e:
+                    st.session_state.report_generated = False
+                    st.warning(str(e), icon="⏳")
+
                 except Exception as e:
                     # General catch-all for any other unexpected system error
                     st.session_state.report_generated = False
@@ -525,12 +846,470 @@ if uploaded_availability and uploaded_schedule:
                     with st.expander("Show Technical Details"):
                         st.code(e)
 
+    # Download Button appears only after a report is successfully generated
+    if st.session_state.get('report_generated', False):
+        report_tab, analytics_tab = st.tabs(["Report", "Analytics"])
+        with report_tab:
+            export_format = st.selectbox(
+                "Download format",
+                list(EXPORT_FORMATS),
+                format_func=lambda key: EXPORT_FORMATS[key]['label'],
+                help="HTML, CSV, JSON and calendar feeds are built directly from the computed slots, without the PDF layout."
+            )
+            if export_format == 'pdf':
+                pdf_download(
+                    st.session_state.report_data, "Download PDF Report", st.session_state.pdf_filename,
+                    'report_pdf', name_map=build_final_name_map()
+                )
+            else:
+                report_data = st.session_state.report_data
+                export_buffer = export_to_buffer(
+                    export_format,
+                    report_data['individual_slots'],
+                    report_data['couples_slots'],
+                    build_final_name_map() or report_data['name_map'],
+                    report_data['sort_order'],
+                    st.session_state.pdf_settings
+                )
+                st.download_button(
+                    label=f"Download {EXPORT_FORMATS[export_format]['label']}",
+                    data=export_buffer,
+                    file_name=os.path.splitext(st.session_state.pdf_filename)[0] + EXPORT_FORMATS[export_format]['extension'],
+                    mime=EXPORT_FORMATS[export_format]['mime']
+                )
+
+            simulator_panel()
+        with analytics_tab:
+            analytics_panel()
+
+
+def profiling_panel():
+    """Opt-in profiling of report generation, with the last profile as a downloadable zip."""
+    st.toggle(
+        "Profile report generation",
+        key='profile_report',
+        help="Runs each generation without the shared caches under cProfile, a stack sampler and "
+             "tracemalloc. Generation is noticeably slower while this is on."
+    )
+    artifact = st.session_state.get('profile_artifact')
+    if artifact:
+        st.caption(
+            f"Last profile: {artifact['wall_seconds']:.2f} s - "
+            + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in artifact['stages'])
+        )
+        st.download_button(
+            label="Download Profile (.zip)",
+            data=artifact['data'],
+            file_name=artifact['file_name'],
+            mime="application/zip",
+            help="summary.txt, profile.pstats (snakeviz, pstats), stacks.collapsed (flamegraph.pl, "
+                 "speedscope) and a tracemalloc snapshot per stage."
+        )
+
+
+@st.fragment
+def server_status_panel():
+    """Generation queue load plus the counters and sizes of the shared result stores, for server admins."""
+    queue_stats = get_generation_queue().stats()
+    st.markdown(
+        f"**Generation queue:** {queue_stats['running']}/{queue_stats['max_concurrent']} running "
+        f"({queue_stats['running_mb']} MB est.), {queue_stats['waiting']} waiting, "
+        f"{queue_stats['completed']} completed, {queue_stats['failed']} failed, "
+        f"{queue_stats['deduplicated']} shared with an identical job"
+    )
+    stores = get_result_stores()
+    stats = pd.DataFrame([store.stats() for store in stores.values()]).set_index('cache')
+    stats['bytes'] = (stats['bytes'] / (1024 * 1024)).round(2)
+    stats['budget_bytes'] = (stats['budget_bytes'] / (1024 * 1024)).round(2)
+    st.dataframe(stats.rename(columns={'bytes': 'MB', 'budget_bytes': 'budget MB'}))
+    c1, c2, c3 = st.columns(3)
+    c1.button("Refresh", key="cache_refresh")
+    c2.download_button(
+        "Metrics", data=metrics_text(stores.values()), file_name="wellness_cache_metrics.prom",
+        mime="text/plain", help="Counters in the Prometheus text format."
+    )
+    c3.button("Clear Caches", on_click=clear_result_stores, help="Drops every shared result. Counters are kept.")
+
+
+@st.fragment
+def multi_site_panel():
+    """
+    Report pairs of several locations computed together, so a therapist booked at one
+    location is not offered at another. Produces one PDF per location and lists
+    therapists scheduled or booked at two locations at once.
+    """
+    st.markdown(
+        "Upload the two reports of every location. Therapists who work at several locations "
+        "(matched by name) are only offered where they are not booked at any other location."
+    )
+    site_count = st.number_input("Number of locations", min_value=2, max_value=8, value=2, on_change=clear_site_reports)
+    site_uploads = []
+    for index in range(site_count):
+        with st.container(border=True):
+            site = st.text_input("Location name", value=f"Location {index + 1}", key=f"site_name_{index}", on_change=clear_site_reports)
+            col1, col2 = st.columns(2)
+            with col1:
+                uploaded_availability = st.file_uploader(
+                    "Staff Schedule (.xls)", type=['xls', 'xlsx'], key=f"site_avail_{index}", on_change=clear_site_reports
+                )
+            with col2:
+                uploaded_schedule = st.file_uploader(
+                    "Schedule at a Glance (.xlsx)", type=['xls', 'xlsx'], key=f"site_sched_{index}", on_change=clear_site_reports
+                )
+            site_uploads.append((site.strip(), uploaded_availability, uploaded_schedule))
+
+    names = [site for site, _, _ in site_uploads]
+    ready = all(site and uploaded_availability and uploaded_schedule for site, uploaded_availability, uploaded_schedule in site_uploads)
+    if len(set(names)) < len(names):
+        st.error("❌ Every location needs a different name.")
+        ready = False
+
+    if st.button("Generate Location Reports", disabled=not ready):
+        with st.spinner("Processing all locations..."):
+            try:
+                st.session_state.site_reports = get_site_reports(site_uploads)
+            except FileProcessingError as e:
+                clear_site_reports()
+                st.error(f"**Processing Failed:** {e}", icon="️⚠️")
+            except Exception as e:
+                clear_site_reports()
+                st.error("An unexpected system error occurred. Please ensure the files are not open elsewhere and try again.", icon="🚨")
+                with st.expander("Show Technical Details"):
+                    st.code(e)
 
-# Download Button appears only after a report is successfully generated
-if st.session_state.get('report_generated', False):
+    if not st.session_state.get('site_reports'):
+        return
+    reports, conflicts = st.session_state.site_reports
+    uploads = {site: uploaded_availability for site, uploaded_availability, _ in site_uploads}
+    for site, report_data in reports.items():
+        start_date, end_date = extract_date_range_from_filename(uploads[site].name)
+        date_range = f" {start_date} to {end_date}" if start_date else ""
+        pdf_download(report_data, f"Download {site} PDF", f"{site} Availability{date_range}.pdf", f"site_pdf_{site}")
+    if conflicts.empty:
+        st.success("✅ No therapist is scheduled or booked at two locations at the same time.")
+    else:
+        st.warning(f"{len(conflicts)} cross-location conflict(s) found. Times in overlapping shifts may be offered at both locations.", icon="⚠️")
+        st.dataframe(
+            conflicts.assign(conflict=conflicts['conflict'].map(CONFLICTS)),
+            hide_index=True, width='stretch'
+        )
+
+
+def pdf_download(report_data, label, file_name, key, name_map=None):
+    """
+    Download of a computed report's PDF. FPDF only runs here: the PDF is laid out from the
+    stored slots with the current styles (and `name_map`, when given) once the user asks
+    for it, and the download button then serves it until the styles or names change.
+    """
+    name_map = name_map or report_data['name_map']
+    settings = st.session_state.pdf_settings
+    up_to_date = report_data['settings'] == settings and report_data['name_map'] == name_map
+    built = up_to_date and report_pdf_key(
+        report_data['slots_key'], report_data['name_map'], report_data['settings'], report_data['sort_order']
+    ) in get_result_stores()['pdf']
+
+    if not built:
+        build_label = "Prepare PDF Download" if up_to_date else "Prepare PDF with Current Styles & Names"
+        if not st.button(build_label, key=f"{key}_build", help="Lays out the PDF from the computed slots without recalculating availability."):
+            return
+        report_data['name_map'] = name_map
+        report_data['settings'] = copy.deepcopy(settings)
+        with st.spinner("Laying out the PDF..."):
+            build_report_pdf(report_data)
     st.download_button(
-        label="Download PDF Report",
-        data=st.session_state.pdf_report,
-        file_name=st.session_state.pdf_filename,
-        mime="application/pdf"
-    )
\ No newline at end of file
+        label=label,
+        data=get_report_pdf(report_data),
+        file_name=file_name,
+        mime="application/pdf",
+        key=f"{key}_download"
+    )
+
+
+@st.fragment
+def customize_panel():
+    """
+    PDF style and therapist name editors and, once a report is generated, a page-by-page
+    preview of its PDF layout beside them. The preview is rendered as HTML from the
+    computed slots; only the pages up to the one shown are laid out, and FPDF is not
+    involved. Editing and turning pages rerun only this panel, and the preview follows
+    every edit because it is drawn in the same run as the editors.
+    """
+    st.subheader("Customize & Preview")
+    report_data = st.session_state.get('report_data') if st.session_state.get('report_generated', False) else None
+    if report_data:
+        preview_column, editor_column = st.columns([3, 2])
+    else:
+        preview_column, editor_column = None, st.container()
+    # The editors run first so the pages are laid out with their current values
+    with editor_column:
+        with st.expander("Customize PDF Styles"):
+            style_controls()
+        with st.expander("Edit Therapist Names"):
+            name_controls()
+    if not report_data:
+        st.caption("Generate a report to preview its pages here.")
+        return
+
+    settings = st.session_state.pdf_settings
+    name_map = build_final_name_map() or report_data['name_map']
+    page_number = st.session_state.get('preview_page', 0)
+    # One page past the current one tells whether there is a next page
+    pages = list(itertools.islice(iter_preview_pages(
+        report_data['individual_slots'],
+        report_data['couples_slots'],
+        name_map,
+        report_data['sort_order'],
+        settings
+    ), page_number + 2))
+    page_number = min(page_number, len(pages) - 1)
+
+    with preview_column:
+        c1, c2, c3 = st.columns([1, 2, 1])
+        c1.button("◀ Previous", key="preview_previous", disabled=page_number == 0, on_click=turn_preview_page, args=(-1,))
+        c2.markdown(f"<div style='text-align:center;'>Page {page_number + 1}</div>", unsafe_allow_html=True)
+        c3.button("Next ▶", key="preview_next", disabled=page_number + 1 >= len(pages), on_click=turn_preview_page, args=(1,))
+        st.html(render_preview_page(pages[page_number], settings))
+
+
+@st.fragment
+def analytics_panel():
+    """
+    Utilization, unsold capacity and peak-hour heatmap of the generated report, for
+    managers. Computed once per option set in the shared store; changes rerun only this panel.
+    """
+    report_data = st.session_state.get('report_data')
+    if not report_data or 'continuous_blocks' not in report_data:
+        return
+    name_map = report_data['name_map']
+
+    c1, c2, c3 = st.columns(3)
+    period = c1.radio("Utilization per", ('day', 'week'), format_func=str.title, horizontal=True, key="analytics_period")
+    bin_minutes = c2.selectbox("Heatmap bins", (15, 30, 60), index=2, format_func=lambda m: f"{m} min", key="analytics_bins")
+    heatmap_value = c3.selectbox("Heatmap shows", list(HEATMAP_VALUES), format_func=HEATMAP_VALUES.get, key="analytics_value")
+    utilization_df, unsold_df, heatmap_df = get_report_analytics(report_data, period, bin_minutes, heatmap_value)
+    if utilization_df.empty:
+        st.caption("No scheduled shifts to analyze.")
+        return
+
+    scheduled = utilization_df['scheduled_minutes'].sum()
+    booked = utilization_df['booked_minutes'].sum()
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Utilization", f"{booked / scheduled:.0%}", help="Booked minutes divided by scheduled minutes.")
+    m2.metric("Scheduled hours", f"{scheduled / 60:,.0f}")
+    m3.metric("Idle hours", f"{(scheduled - booked) / 60:,.0f}")
+
+    st.markdown("**Peak hours**")
+    cells = heatmap_df.rename_axis('day').reset_index().melt('day', var_name='time', value_name='value').dropna()
+    st.altair_chart(
+        alt.Chart(cells).mark_rect().encode(
+            x=alt.X('time:O', sort=list(heatmap_df.columns), title=None),
+            y=alt.Y('day:O', sort=list(heatmap_df.index), title=None),
+            color=alt.Color('value:Q', title=None),
+            tooltip=['day', 'time', alt.Tooltip('value:Q', format='.2f')]
+        ),
+        use_container_width=True
+    )
+
+    st.markdown(f"**Utilization per therapist and {period}**")
+    table = utilization_df.assign(therapist=utilization_df['therapist'].map(lambda t: display_name_for(name_map, t)))
+    st.dataframe(
+        table, hide_index=True, width='stretch',
+        column_config={'utilization': st.column_config.ProgressColumn("utilization", format="percent", min_value=0, max_value=1)}
+    )
+
+    st.markdown("**Unsold capacity (whole sessions left in the free time)**")
+    st.dataframe(
+        unsold_df.assign(therapist=unsold_df['therapist'].map(lambda t: display_name_for(name_map, t))),
+        hide_index=True, width='stretch'
+    )
+
+
+@st.fragment
+def simulator_panel():
+    """
+    Lets front-desk staff tentatively place bookings and see what remains before
+    committing them in the booking system. Each edit only recomputes the affected day.
+    """
+    if not st.session_state.get('booking_simulator'):
+        return
+    simulator = st.session_state.booking_simulator
+    name_map = st.session_state.get('report_name_map', {})
+
+    def format_time(ts):
+        return ts.strftime('%I:%M %p').lstrip('0').lower()
+
+    with st.expander("What-if Booking Simulator"):
+        st.markdown("Tentatively place a booking to see how it affects individual and couples availability. Nothing here changes the downloaded report.")
+        therapist_ids = simulator.therapists()
+        sim_dates = simulator.dates()
+
+        c1, c2, c3 = st.columns(3)
+        sim_therapist = c1.selectbox("Therapist", therapist_ids, format_func=lambda t: name_map.get(t, t.title()), key="sim_therapist")
+        sim_date = c2.selectbox("Day", sim_dates, format_func=lambda d: d.strftime('%A, %b %d'), key="sim_date")
+        sim_time = c3.time_input("Start time", value=pd.Timestamp("14:00").time(), step=900, key="sim_time")
+        sim_partner = st.selectbox(
+            "Couples partner (optional)", [None] + [t for t in therapist_ids if t != sim_therapist],
+            format_func=lambda t: "None" if t is None else name_map.get(t, t.title()), key="sim_partner"
+        )
+
+        if st.button("Add Tentative Booking"):
+            start = pd.Timestamp.combine(sim_date, sim_time)
+            therapists = [sim_therapist] + ([sim_partner] if sim_partner else [])
+            simulator.add_booking(therapists, start)
+
+        for edit_id, booking in list(simulator.hypothetical.items()):
+            b1, b2 = st.columns([4, 1])
+            who = " & ".join(name_map.get(t, t.title()) for t in booking['therapists'])
+            b1.write(f"**{who}** — {booking['start'].strftime('%A')} {format_time(booking['start'])}")
+            b2.button("Remove", key=f"sim_remove_{edit_id}", on_click=simulator.remove_booking, args=(edit_id,))
+
+        if simulator.hypothetical:
+            st.button("Clear All Tentative Bookings", on_click=simulator.reset)
+
+        changes = simulator.day_changes(sim_date)
+        day_slots, day_couples = simulator.day_view(sim_date)
+        st.markdown(f"**Effect on {sim_date.strftime('%A, %B %d')}**")
+        m1, m2 = st.columns(2)
+        m1.metric("Individual slots left", len(day_slots), delta=len(changes['gained_slots']) - len(changes['lost_slots']))
+        m2.metric("Couples times left", len(day_couples), delta=len(changes['gained_couples']) - len(changes['lost_couples']))
+        if changes['lost_slots']:
+            st.write("No longer available: " + ", ".join(
+                f"{name_map.get(slot['therapist'], slot['therapist'].title())} {format_time(slot['start'])}" for slot in changes['lost_slots']
+            ))
+        if changes['lost_couples']:
+            st.write("Couples times lost: " + ", ".join(format_time(t) for t in changes['lost_couples']))
+        if day_couples:
+            st.caption("Remaining couples times: " + ", ".join(format_time(slot['start']) for slot in day_couples))
+
+
+st.title("Wellness Center - Weekly Availability Generator")
+st.caption("This tool processes 'Staff Schedule' and 'Schedule at a Glance' reports to find and format therapist availability.")
+
+# --- Sidebar ---
+with st.sidebar:
+    # CSS Injection to style sidebar expanders for a cleaner look
+    st.markdown("""
+    <style>
+        [data-testid="stSidebar"] [data-testid="stExpander"] summary {
+            background-color: #d0e0c1;
+            border-radius: 5px;
+            margin-bottom: 5px;
+        }
+        [data-testid="stSidebar"] [data-testid="stExpander"] summary p {
+            color: #38565c;
+            font-weight: 600;
+        }
+        [data-testid="stSidebar"] [data-testid="stExpander"] summary svg {
+            color: #38565c;
+        }
+    </style>
+    """, unsafe_allow_html=True)
+
+    st.header("📄 Guide & Settings")
+
+    # --- FULL GUIDE & FAQ CONTENT ---
+    # Guide Expander controlled by main page toggle
+    with st.expander("View Guide & FAQ", expanded=st.session_state.show_guide_toggle):
+        st.markdown("""
+        **1. Go to Reports → Staff Schedule**
+        * Select your start and end date (e.g., Monday-Friday or Thursday-Sunday).
+        * Change "Late cancel - no charge" to "ALL" in the drop-down menu.
+        * Export to excel.
+            * Save the file as is (don't change the default file name).
+        """)
+        
+        image_path_trainer_avail = "assets/trainierAvailguideimg.png"
+        if os.path.exists(image_path_trainer_avail):
+            st.image(image_path_trainer_avail)
+
+        st.markdown("""
+        **2. Go to Reports → Schedule at a Glance**
+        * Select the same start and end dates as in the previous report.
+        * Filters → Staff:
+            * Deselect Waitlist.
+            * Deselect Late cancel - no charge.
+        * Export to excel.
+            * Save the file as is (don't change the default file name).
+        """)
+
+        image_path_schedule = "assets/ScheduleAtAGlance.png"
+        if os.path.exists(image_path_schedule):
+            st.image(image_path_schedule)
+
+        st.markdown("""
+        **3. Generate the Report in This App**
+        * Upload the 'Staff Schedule' and 'Schedule at a Glance' files into the main window.
+        * Click the 'Generate Report' button.
+        * Click 'Download PDF Report'.
+        
+        ---
+        ### FAQ
+
+        **Why does "Waitlist" or "Late Cancel" appear as a therapist on my final report?**
+        * This happens when 'Waitlist' or 'Late cancel - no charge' are left selected when generating the 'Schedule at a Glance' report. The program sees them as valid schedule items.
+        * **How to fix it:** Follow Step 2 in the guide *exactly*. Re-download the 'Schedule at a Glance' report, making sure to de-select those two items from the Staff filter.
+
+        **Error: "Please upload both files to generate the report."**
+        * **What it means:** You clicked "Generate Report" before two files were successfully uploaded.
+        * **How to fix it:** Simply upload both required Excel files into their designated boxes.
+
+        **Error: "The date ranges in the filenames do not match..."**
+        * **What it means:** The program checks the filenames to ensure you are comparing matching reports. This error means the dates (e.g., "01-01-2024 to 01-07-2024") found in the two filenames are different.
+        * **How to fix it:** Check the files you downloaded. Ensure you exported both reports using the exact same date range. Do not change the filenames manually.
+
+        **Error: "The 'Trainer Availability' file... no schedules were found inside" OR "no valid schedule blocks were found."**
+        * **What it means:** The application successfully opened the file but could not find any recognizable staff schedules (i.e., rows marked "Appointments"). This is almost always caused by generating the 'Staff Schedule' report with the wrong filter settings.
+        * **How to fix it:** Go back to your scheduling software. [cite_start]Re-download the **Staff Schedule** report, ensuring you follow Step 1 and set the status filter dropdown to **"ALL"**[cite: 2].
+
+        **Error: "The 'ScheduleAtAGlance' file... missing a required column..." OR "Could not parse some dates or times..."**
+        * **What it means:** The 'ScheduleAtAGlance' report is in an unexpected format. This can mean a required column (like 'Date', 'Start time', or 'Staff') is missing, or the data inside (like the 'Start time') is in a format the program cannot read.
+        * **How to fix it:** Re-download the correct 'Schedule at a Glance' report. Ensure no columns have been manually deleted or altered. Verify you are uploading the correct file to the second input box.
+
+        **Error: "Name maps not found in session. Please re-upload files..."**
+        * **What it means:** This technical error usually means the 'Trainer Availability' file was parsed but contained **zero active therapists** for the selected date range (e.g., you ran a report for a weekend when no one is working). Without any therapists, the name editor and report generator cannot start.
+        * **How to fix it:** Verify that the 'Trainer Availability' file you uploaded actually contains "SCHEDULE FOR" sections for therapists who are working that week. If it doesn't, run the report for the correct week.
+
+        **Error: "An unexpected system error occurred..." OR an error mentioning "lxml" or "parsing".**
+        * **What it means:** This is a general error that can happen for several reasons, typically meaning the program couldn't even read a file, or one of the files is fundamentally wrong.
+        * **How to fix it:**
+            * **1. Check if Files are Open:** Make sure the Excel files are not open in Microsoft Excel or another program. Excel "locks" files when they are open, preventing this tool from reading them. Close the file and try again.
+            * **2. Check for Correct Files:** Did you accidentally upload the wrong file (like a PDF) or the same file into both slots?
+            * **3. Check for a Permanent Report Format Change (Developer Fix Required)** This error can occur if your scheduling software provider updates the structure, format, or file type of their exported reports. Think of this application as a custom-made key designed to fit the specific format of those reports—if the provider changes the "lock," the key no longer works. This means the application can no longer recognize or process the updated files without a code update. Common signs include renamed columns, a different layout, or a new file type. If you suspect this is the case, please contact the developer and include a sample of the updated report.
+
+        **My PDF style settings (colors, fonts) reset every time I close the app. Why?**
+        * This is the expected behavior for this type of web application. Your custom styles are stored only for your current browser session. Because the app runs in a cloud environment with a temporary file system, it cannot save settings permanently. When you close the browser tab, the session ends, and the custom styles are cleared.
+        * **How to fix it:** You will need to re-apply your desired style customizations at the beginning of each new session. The app will always load with the default styles.
+
+                    
+        ### Contact & Support
+        Have a feature request or encounter a persistent issue? Please contact the developer at: alexanderseniw.5.pro@gmail.com
+        """)
+    # --- END FULL GUIDE CONTENT ---
+
+    # --- Admin panels (config.ini [cache] admin_panel) ---
+    if config['admin_panel']:
+        with st.expander("Admin: Server Status"):
+            server_status_panel()
+
+        with st.expander("Admin: Profiling"):
+            profiling_panel()
+
+# --- Welcome Message & Guided Flow Toggle ---
+st.info("👋 **Welcome!** This tool generates a client-facing PDF of weekly therapist availability based on two reports from your scheduling system.", icon="📄")
+
+st.toggle(
+    "Show step-by-step guide (for first-time users)", 
+    key="show_guide_toggle",
+    help="If you are a returning user, toggle this off to use the faster compact upload view."
+)
+st.divider()
+
+upload_panel()
+report_panel()
+
+st.divider()
+customize_panel()
+
+st.divider()
+with st.expander("Multiple Locations"):
+    multi_site_panel()
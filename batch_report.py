@@ -0,0 +1,299 @@
+import argparse
+import contextlib
+import os
+import sqlite3
+import sys
+
+import settings_manager
+from data_quality import FIX_MODES, clean_inputs, summarize_issues, validate_inputs
+from exporters import EXPORT_FORMATS, write_export
+from history_store import HistoryStore
+from multi_site import CONFLICTS, calculate_site_availability
+from preflight import preflight_reports
+from profiling import ProfileSession, profile_stage
+from logic import (
+    compute_report_slots,
+    report_run_key,
+    generate_pdf_report,
+    extract_date_range_from_filename,
+    format_therapist_name,
+    FileProcessingError,
+    PLACEMENT_STRATEGIES,
+)
+
+# Headless counterpart of the Streamlit app: runs the same parse -> calculate ->
+# report pipeline on a pair of exported files and writes the chosen outputs.
+
+
+def load_report_pair(availability_path, schedule_path, config, data_fixes, profiler=None):
+    """
+    Parses, checks and cleans one pair of report files.
+    Returns a dict with the cleaned 'availability_df' and 'obligations_df', the
+    display 'name_map', the data-quality 'issues', and 'swapped' when the preflight
+    check found the two paths in reverse order.
+    """
+    with profile_stage(profiler, 'parse'), open(availability_path, 'rb') as availability_file, open(schedule_path, 'rb') as schedule_file:
+        preflight = preflight_reports(availability_file, schedule_file)
+        availability_df, map_id_to_acronym = preflight['availability_adapter'].load(
+            preflight['availability_file'], workers=config['parse_workers']
+        )
+        obligations_df, elite_therapists = preflight['schedule_adapter'].load(preflight['schedule_file'])
+    with profile_stage(profiler, 'validate'):
+        issues = validate_inputs(availability_df, obligations_df)
+        availability_df, obligations_df = clean_inputs(availability_df, obligations_df, data_fixes)
+
+    # Same display names the app builds before any manual edits
+    active_therapists = set(availability_df['therapist'].unique())
+    name_map = {
+        id_key: format_therapist_name(acronym, elite_therapists=elite_therapists)
+        for id_key, acronym in map_id_to_acronym.items()
+        if id_key in active_therapists
+    }
+    return {
+        'availability_df': availability_df,
+        'obligations_df': obligations_df,
+        'name_map': name_map,
+        'issues': issues,
+        'swapped': preflight['swapped'],
+    }
+
+
+def build_report_data(availability_path, schedule_path, config, session_durations=None, placement_strategy=None, data_fixes=None, profiler=None):
+    """
+    Runs the full availability pipeline for one pair of report files.
+    Returns the dict of load_report_pair() with the continuous blocks, slots and
+    couples opportunities and the options used added. A ProfileSession in
+    `profiler` records each stage.
+    """
+    session_durations = session_durations or config['session_durations']
+    placement_strategy = placement_strategy or config['placement_strategy']
+    data_fixes = data_fixes or config['data_fixes']
+
+    data = load_report_pair(availability_path, schedule_path, config, data_fixes, profiler)
+    with profile_stage(profiler, 'engine'):
+        continuous_blocks, individual_slots, couples_slots = compute_report_slots(
+            data['availability_df'],
+            data['obligations_df'],
+            session_durations,
+            placement_strategy=placement_strategy,
+            alignment_minutes=config['slot_alignment_minutes'],
+            tolerance_minutes=config['tolerance_minutes'],
+            room_counts=config['room_counts']
+        )
+
+    data.update({
+        'continuous_blocks': continuous_blocks,
+        'individual_slots': individual_slots,
+        'couples_slots': couples_slots,
+        'session_durations': session_durations,
+        'placement_strategy': placement_strategy,
+        'data_fixes': data_fixes,
+    })
+    return data
+
+
+def build_multi_site_data(site_paths, config, session_durations=None, placement_strategy=None, data_fixes=None, profiler=None):
+    """
+    Runs the availability pipeline for several locations at once.
+    `site_paths` is a list of (site_name, availability_path, schedule_path). Each site's
+    appointments are subtracted from every site's shifts (see multi_site.py).
+    Returns ({site_name: data}, conflicts), with the same data dicts as build_report_data.
+    """
+    session_durations = session_durations or config['session_durations']
+    placement_strategy = placement_strategy or config['placement_strategy']
+    data_fixes = data_fixes or config['data_fixes']
+    durations_arg = session_durations if len(session_durations) > 1 else session_durations[0]
+
+    sites = {
+        site: load_report_pair(availability_path, schedule_path, config, data_fixes, profiler)
+        for site, availability_path, schedule_path in site_paths
+    }
+    with profile_stage(profiler, 'engine'):
+        results, conflicts = calculate_site_availability(
+            {site: (data['availability_df'], data['obligations_df']) for site, data in sites.items()},
+            session_duration_minutes=durations_arg,
+            placement_strategy=placement_strategy,
+            alignment_minutes=config['slot_alignment_minutes'],
+            tolerance_minutes=config['tolerance_minutes'],
+            room_counts=config['room_counts']
+        )
+    for site, data in sites.items():
+        data.update(results[site])
+        data.update({
+            'session_durations': session_durations,
+            'placement_strategy': placement_strategy,
+            'data_fixes': data_fixes,
+        })
+    return sites, conflicts
+
+
+def save_history(data, availability_path, schedule_path, config):
+    """Adds a computed report to the history database; a failed write only prints a warning."""
+    with open(availability_path, 'rb') as availability_file, open(schedule_path, 'rb') as schedule_file:
+        # The key the app stores the same computed slots under, so a week generated
+        # in both is kept once
+        run_key = report_run_key(
+            availability_file.read(),
+            schedule_file.read(),
+            data['session_durations'],
+            data['placement_strategy'],
+            data['data_fixes'],
+            config
+        )
+    try:
+        HistoryStore(config['history_database']).save_run(
+            data['availability_df'], data['obligations_df'], data['continuous_blocks'],
+            data['individual_slots'], data['couples_slots'], data['session_durations'],
+            placement_strategy=data['placement_strategy'],
+            label=os.path.basename(availability_path),
+            run_key=run_key
+        )
+    except sqlite3.Error as e:
+        print(f"Warning: the report could not be saved to the history database: {e}", file=sys.stderr)
+
+
+def write_outputs(data, base_name, args, profiler=None):
+    """Writes the requested formats of one computed report to the output directory."""
+    os.makedirs(args.output_dir, exist_ok=True)
+    settings = settings_manager.get_initial_settings()
+
+    for fmt in args.formats or ['pdf']:
+        output_path = os.path.join(args.output_dir, base_name + EXPORT_FORMATS[fmt]['extension'])
+        with profile_stage(profiler, f"render_{fmt}"):
+            if fmt == 'pdf':
+                pdf_buffer = generate_pdf_report(
+                    data['individual_slots'], data['couples_slots'], data['name_map'], settings, args.sort_order
+                )
+                with open(output_path, 'wb') as handle:
+                    handle.write(pdf_buffer.getvalue())
+            else:
+                write_export(
+                    fmt, output_path, data['individual_slots'], data['couples_slots'],
+                    data['name_map'], args.sort_order, settings
+                )
+        print(f"Wrote {output_path}")
+
+
+def report_base_name(availability_path):
+    start_date, end_date = extract_date_range_from_filename(os.path.basename(availability_path))
+    return f"Availability {start_date} to {end_date}" if start_date else "Availability"
+
+
+def print_issues(data, label=None):
+    if not data['issues'].empty:
+        print(f"Data check found problem rows{f' ({label})' if label else ''}:", file=sys.stderr)
+        print(summarize_issues(data['issues']).to_string(index=False), file=sys.stderr)
+
+
+def run_batch(args, config, profiler=None):
+    """Builds the reports requested on the command line; returns the exit code."""
+    if args.sites:
+        return run_multi_site(args, config, profiler)
+    try:
+        data = build_report_data(
+            args.availability_file, args.schedule_file, config,
+            session_durations=sorted(args.durations) if args.durations else None,
+            placement_strategy=args.placement,
+            data_fixes=args.data_fixes,
+            profiler=profiler
+        )
+    except FileProcessingError as e:
+        print(f"Processing failed: {e}", file=sys.stderr)
+        return 1
+
+    print_issues(data)
+    availability_file, schedule_file = args.availability_file, args.schedule_file
+    if data['swapped']:
+        availability_file, schedule_file = schedule_file, availability_file
+        print("Note: the two input files were given in reverse order; they were swapped.", file=sys.stderr)
+    if config['history_database'] and not args.no_history:
+        save_history(data, availability_file, schedule_file, config)
+    write_outputs(data, report_base_name(availability_file), args, profiler)
+    return 0
+
+
+def run_multi_site(args, config, profiler=None):
+    """
+    Builds one report per --site from a shared computation across all sites and writes
+    the cross-site conflicts to a CSV. Multi-site runs are not saved to the history
+    database: their slots depend on every site's files, not on one pair.
+    """
+    try:
+        sites, conflicts = build_multi_site_data(
+            args.sites, config,
+            session_durations=sorted(args.durations) if args.durations else None,
+            placement_strategy=args.placement,
+            data_fixes=args.data_fixes,
+            profiler=profiler
+        )
+    except FileProcessingError as e:
+        print(f"Processing failed: {e}", file=sys.stderr)
+        return 1
+
+    for site, availability_path, schedule_path in args.sites:
+        data = sites[site]
+        print_issues(data, site)
+        if data['swapped']:
+            availability_path = schedule_path
+            print(f"Note: the two input files of {site} were given in reverse order; they were swapped.", file=sys.stderr)
+        write_outputs(data, f"{site} {report_base_name(availability_path)}", args, profiler)
+
+    if not conflicts.empty:
+        output_path = os.path.join(args.output_dir, "Cross-site conflicts.csv")
+        conflicts.to_csv(output_path, index=False)
+        counts = conflicts['conflict'].value_counts()
+        for conflict, rows in counts.items():
+            print(f"Warning: {rows} x {CONFLICTS[conflict].lower()}", file=sys.stderr)
+        print(f"Wrote {output_path}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate availability reports without the web interface.")
+    parser.add_argument('availability_file', nargs='?', help="Staff Schedule export (.xls)")
+    parser.add_argument('schedule_file', nargs='?', help="Schedule at a Glance export (.xlsx)")
+    parser.add_argument('--site', dest='sites', nargs=3, action='append',
+                        metavar=('NAME', 'STAFF_SCHEDULE', 'SCHEDULE_AT_A_GLANCE'),
+                        help="One location's report pair; repeat for each site to compute them together "
+                             "and keep therapists who work at several sites from being offered twice.")
+    parser.add_argument('--format', dest='formats', action='append', choices=list(EXPORT_FORMATS),
+                        help="Output format; repeat for several (default: pdf).")
+    parser.add_argument('--output-dir', default='.', help="Directory to write the reports to.")
+    parser.add_argument('--sort-order', default="Alphabetical", choices=["Alphabetical", "By First Availability"])
+    parser.add_argument('--duration', dest='durations', type=int, action='append',
+                        help="Session length in minutes; repeat for several (default: config.ini).")
+    parser.add_argument('--placement', choices=list(PLACEMENT_STRATEGIES),
+                        help="Slot placement strategy (default: config.ini).")
+    parser.add_argument('--data-fixes', choices=list(FIX_MODES),
+                        help="How problem rows found by the data check are handled (default: config.ini).")
+    parser.add_argument('--parse-workers', type=int,
+                        help="Processes used to parse the Staff Schedule export (default: config.ini).")
+    parser.add_argument('--no-history', action='store_true',
+                        help="Do not save this run to the history database from config.ini.")
+    parser.add_argument('--profile', metavar='ZIP',
+                        help="Profile the run and write the pstats, collapsed stacks and allocation snapshots to this zip.")
+    parser.add_argument('--config', default='config.ini', help="Path to config.ini.")
+    args = parser.parse_args(argv)
+    if args.sites and args.availability_file:
+        parser.error("give either one report pair or --site options, not both")
+    if not args.sites and not (args.availability_file and args.schedule_file):
+        parser.error("a Staff Schedule and a Schedule at a Glance file (or --site options) are required")
+    if args.sites and len({site for site, _, _ in args.sites}) < len(args.sites):
+        parser.error("site names must be unique")
+
+    config = settings_manager.load_app_config(args.config)
+    if args.parse_workers is not None:
+        config['parse_workers'] = args.parse_workers
+    label = os.path.basename(args.availability_file) if args.availability_file else ', '.join(site for site, _, _ in args.sites)
+    profiler = ProfileSession(label=label) if args.profile else None
+    with profiler.capture() if profiler else contextlib.nullcontext():
+        exit_code = run_batch(args, config, profiler)
+    if profiler:
+        with open(args.profile, 'wb') as handle:
+            handle.write(profiler.artifact())
+        print(f"Wrote profile {args.profile}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
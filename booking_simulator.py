@@ -0,0 +1,245 @@
+import itertools
+from bisect import bisect_left, insort
+from datetime import datetime, time, timedelta
+
+import pandas as pd
+
+from logic import (
+    calculate_shift_availability,
+    find_couples_slots,
+    apply_room_capacity,
+    optimize_slot_placement,
+)
+
+
+class BookingSimulator:
+    """
+    What-if sandbox for tentatively placing bookings before committing them.
+
+    Built once from the same inputs as `calculate_availability`, it keeps each
+    therapist's shifts and obligations in sorted interval lists and caches the
+    computed blocks, slots and couples opportunities per therapist-day. Adding
+    or removing a hypothetical obligation only recomputes the therapist-days it
+    touches and the couples candidates on those dates.
+    """
+
+    def __init__(self, availability_df, obligations_df, session_duration_minutes=75,
+                 tolerance_minutes=30, min_gap_hours=1, room_counts=None,
+                 placement_strategy='left', alignment_minutes=15):
+        self.session_duration_minutes = session_duration_minutes
+        self.placement_strategy = placement_strategy
+        self.alignment_minutes = alignment_minutes
+        self.tolerance_minutes = tolerance_minutes
+        self.min_gap_hours = min_gap_hours
+        self.room_counts = room_counts or {}
+        self._session_duration = timedelta(minutes=session_duration_minutes)
+
+        # therapist -> {date: [(start, end), ...]} in file order, as calculate_availability walks them
+        self._shifts = {}
+        for row in availability_df.itertuples(index=False):
+            days = self._shifts.setdefault(row.therapist, {})
+            days.setdefault(row.start_datetime.date(), []).append((row.start_datetime, row.end_datetime))
+
+        # therapist -> sorted [(start, end, room_type, edit_id)]; edit_id is 0 for real obligations
+        self._obligations = {}
+        self._longest_obligation = {}
+        has_room_type = 'room_type' in obligations_df.columns
+        for row in obligations_df.itertuples(index=False):
+            room_type = row.room_type if has_room_type else 'treatment'
+            self._insert(row.therapist, row.start_datetime, row.end_datetime, room_type, 0)
+
+        self._edit_ids = itertools.count(1)
+        self.hypothetical = {}  # edit_id -> dict describing the tentative booking
+
+        self._day_results = {}  # (therapist, date) -> (blocks, slots)
+        for therapist, days in self._shifts.items():
+            for date in days:
+                self._recompute_therapist_day(therapist, date)
+
+        self._couples_by_date = {}
+        self._slots_by_date = {}
+        for date in self.dates():
+            self._recompute_date(date)
+
+        # Snapshot of the committed schedule, used to report the effect of edits
+        self._baseline_slots = dict(self._slots_by_date)
+        self._baseline_couples = dict(self._couples_by_date)
+
+    # --- Sorted interval structure ---
+
+    def _insert(self, therapist, start, end, room_type, edit_id):
+        insort(self._obligations.setdefault(therapist, []), (start, end, room_type, edit_id))
+        duration = end - start
+        if duration > self._longest_obligation.get(therapist, timedelta(0)):
+            self._longest_obligation[therapist] = duration
+
+    def _overlapping_entries(self, therapist, window_start, window_end):
+        """Returns raw obligations overlapping [window_start, window_end) using a bisect on start times."""
+        obligations = self._obligations.get(therapist, [])
+        if not obligations:
+            return []
+        earliest = window_start - self._longest_obligation[therapist]
+        lo = bisect_left(obligations, (earliest,))
+        hi = bisect_left(obligations, (window_end,))
+        return [obs for obs in obligations[lo:hi] if obs[1] > window_start]
+
+    def _overlapping(self, therapist, day_start, day_end):
+        return [
+            {'start_datetime': start, 'end_datetime': end}
+            for start, end, _, _ in self._overlapping_entries(therapist, day_start, day_end)
+        ]
+
+    # --- Incremental recomputation ---
+
+    def _recompute_therapist_day(self, therapist, date):
+        blocks, slots = [], []
+        for day_start, day_end in self._shifts.get(therapist, {}).get(date, []):
+            day_obs = self._overlapping(therapist, day_start, day_end)
+            shift_blocks, shift_slots = calculate_shift_availability(
+                therapist, day_start, day_end, day_obs, self._session_duration, self.placement_strategy
+            )
+            blocks.extend(shift_blocks)
+            slots.extend(shift_slots)
+        self._day_results[(therapist, date)] = (blocks, slots)
+
+    def _recompute_date(self, date):
+        """Rebuilds the couples candidates (and room caps) for one calendar day."""
+        blocks, slots = [], []
+        for therapist in self._shifts:
+            day_blocks, day_slots = self._day_results.get((therapist, date), ([], []))
+            blocks.extend(day_blocks)
+            slots.extend(day_slots)
+        if self.placement_strategy == 'optimized':
+            shifts = [
+                (therapist, day_start, day_end)
+                for therapist, days in self._shifts.items()
+                for day_start, day_end in days.get(date, [])
+            ]
+            slots = optimize_slot_placement(blocks, shifts, self.session_duration_minutes, self.alignment_minutes)
+
+        couples = find_couples_slots(
+            blocks, None,
+            tolerance_minutes=self.tolerance_minutes,
+            session_duration_minutes=self.session_duration_minutes,
+            min_gap_hours=self.min_gap_hours
+        )
+        if self.room_counts:
+            slots, couples = apply_room_capacity(
+                slots, couples, self._obligations_frame(date), self.room_counts,
+                session_duration_minutes=self.session_duration_minutes
+            )
+        self._slots_by_date[date] = sorted(slots, key=lambda x: (x['therapist'], x['start']))
+        self._couples_by_date[date] = couples
+
+    def _obligations_frame(self, date):
+        day_start = datetime.combine(date, time.min)
+        day_end = day_start + timedelta(days=1)
+        rows = [
+            {'therapist': therapist, 'start_datetime': start, 'end_datetime': end, 'room_type': room_type}
+            for therapist in self._obligations
+            for start, end, room_type, _ in self._overlapping_entries(therapist, day_start, day_end)
+        ]
+        return pd.DataFrame(rows, columns=['therapist', 'start_datetime', 'end_datetime', 'room_type'])
+
+    def _affected_dates(self, therapist, start, end):
+        return [
+            date for date, shifts in self._shifts.get(therapist, {}).items()
+            if any(day_start < end and day_end > start for day_start, day_end in shifts)
+        ]
+
+    def _apply_edit(self, therapist, start, end):
+        dates = self._affected_dates(therapist, start, end)
+        for date in dates:
+            self._recompute_therapist_day(therapist, date)
+        # Room usage is shared, so couples and caps are rebuilt for every date the window touches
+        touched = set(dates)
+        if self.room_counts:
+            touched.update(date for date in self.dates() if start.date() <= date <= end.date())
+        for date in touched:
+            self._recompute_date(date)
+        return sorted(touched)
+
+    # --- Public simulation API ---
+
+    def add_booking(self, therapists, start, end=None, room_type=None):
+        """
+        Tentatively books one therapist (or two, for a couples booking) at `start`.
+
+        `therapists` is a therapist id or a list of ids. `end` defaults to one
+        session after `start`. Returns an edit id that can be passed to
+        `remove_booking`.
+        """
+        if isinstance(therapists, str):
+            therapists = [therapists]
+        end = end or start + self._session_duration
+        if room_type is None:
+            room_type = 'couples' if len(therapists) > 1 else 'treatment'
+        if end <= start:
+            raise ValueError("A booking must end after it starts.")
+
+        edit_id = next(self._edit_ids)
+        for therapist in therapists:
+            self._insert(therapist, start, end, room_type, edit_id)
+        dates = set()
+        for therapist in therapists:
+            dates.update(self._apply_edit(therapist, start, end))
+
+        self.hypothetical[edit_id] = {
+            'therapists': list(therapists), 'start': start, 'end': end,
+            'room_type': room_type, 'dates': sorted(dates)
+        }
+        return edit_id
+
+    def remove_booking(self, edit_id):
+        """Removes a tentative booking previously added with `add_booking`."""
+        booking = self.hypothetical.pop(edit_id)
+        for therapist in booking['therapists']:
+            self._obligations[therapist] = [
+                obs for obs in self._obligations[therapist] if obs[3] != edit_id
+            ]
+        for therapist in booking['therapists']:
+            self._apply_edit(therapist, booking['start'], booking['end'])
+
+    def reset(self):
+        """Discards every tentative booking."""
+        for edit_id in list(self.hypothetical):
+            self.remove_booking(edit_id)
+
+    def therapists(self):
+        return sorted(self._shifts)
+
+    def dates(self):
+        return sorted({date for days in self._shifts.values() for date in days})
+
+    def continuous_blocks(self):
+        return [block for blocks, _ in self._day_results.values() for block in blocks]
+
+    def individual_slots(self):
+        all_slots = [slot for slots in self._slots_by_date.values() for slot in slots]
+        return sorted(all_slots, key=lambda x: (x['therapist'], x['start']))
+
+    def couples_slots(self):
+        return [slot for date in sorted(self._couples_by_date) for slot in self._couples_by_date[date]]
+
+    def day_view(self, date):
+        """Returns the simulated (individual_slots, couples_slots) for one day."""
+        return self._slots_by_date.get(date, []), self._couples_by_date.get(date, [])
+
+    def day_changes(self, date):
+        """
+        Compares one day against the committed schedule. Returns a dict with the
+        individual and couples slots lost or gained by the tentative bookings.
+        """
+        def slot_key(slot):
+            return (slot['therapist'], slot['start'])
+
+        before = {slot_key(slot): slot for slot in self._baseline_slots.get(date, [])}
+        after = {slot_key(slot): slot for slot in self._slots_by_date.get(date, [])}
+        couples_before = {slot['start'] for slot in self._baseline_couples.get(date, [])}
+        couples_after = {slot['start'] for slot in self._couples_by_date.get(date, [])}
+        return {
+            'lost_slots': [before[key] for key in sorted(before.keys() - after.keys())],
+            'gained_slots': [after[key] for key in sorted(after.keys() - before.keys())],
+            'lost_couples': sorted(couples_before - couples_after),
+            'gained_couples': sorted(couples_after - couples_before),
+        }
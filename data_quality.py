@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+# Data-quality checks run right after parsing, before the availability engines.
+# Every check is a grouped or sorted array operation over the whole frame, so the
+# pass costs a few sorts even for large exports. validate_inputs() reports what it
+# finds; clean_inputs() drops or repairs the offending rows so the engines only
+# see clean data.
+
+# Placeholder "staff" the booking system lists next to real therapists, by their
+# normalized name (normalize_name keeps the first word: 'Late cancel' -> 'late').
+PSEUDO_STAFF = ('waitlist', 'late')
+
+# check -> (source, severity, description)
+CHECKS = {
+    'pseudo_staff': ('both', 'error', "Waitlist or late-cancel entry listed as a therapist"),
+    'zero_length': ('both', 'error', "Start and end time are the same"),
+    'reversed': ('both', 'error', "End time is before the start time"),
+    'overlapping_shift': ('availability', 'error', "Shift overlaps another shift of the same therapist"),
+    'outside_shift': ('schedule', 'warning', "Appointment is outside every shift of its therapist"),
+}
+
+FIX_MODES = {
+    'none': "Report only",
+    'drop': "Drop problem rows",
+    'repair': "Repair where possible, drop the rest",
+}
+
+ISSUE_COLUMNS = ['source', 'check', 'severity', 'therapist', 'start', 'end']
+
+
+def _issue_rows(df, mask, source, check):
+    flagged = df.loc[mask]
+    return pd.DataFrame({
+        'source': source,
+        'check': check,
+        'severity': CHECKS[check][1],
+        'therapist': flagged['therapist'].to_numpy(),
+        'start': flagged['start_datetime'].to_numpy(),
+        'end': flagged['end_datetime'].to_numpy(),
+    }, columns=ISSUE_COLUMNS)
+
+def _interval_masks(df):
+    """Returns (pseudo_staff, zero_length, reversed) boolean arrays for one frame."""
+    starts = df['start_datetime'].to_numpy()
+    ends = df['end_datetime'].to_numpy()
+    return df['therapist'].isin(PSEUDO_STAFF).to_numpy(), ends == starts, ends < starts
+
+def _sorted_by_shift(df):
+    return df.sort_values(['therapist', 'start_datetime'], kind='stable')
+
+def _overlapping_shifts(shifts):
+    """
+    Flags shifts that start before an earlier shift of the same therapist ends.
+    `shifts` must be sorted by therapist and start; returns a boolean array.
+    """
+    previous_end = shifts.groupby('therapist', sort=False)['end_datetime'].cummax()
+    previous_end = previous_end.groupby(shifts['therapist'], sort=False).shift()
+    return (shifts['start_datetime'] < previous_end).to_numpy()
+
+def _merged_shifts(shifts):
+    """
+    Collapses overlapping shifts of each therapist into their union.
+    `shifts` must be sorted by therapist and start.
+    """
+    block = np.cumsum(~_overlapping_shifts(shifts))
+    return shifts.groupby(block, sort=False).agg(
+        therapist=('therapist', 'first'),
+        start_datetime=('start_datetime', 'min'),
+        end_datetime=('end_datetime', 'max'),
+    ).reset_index(drop=True)
+
+def _outside_shifts(obligations, merged_shifts):
+    """
+    Flags obligations that overlap no shift of their therapist. Each obligation is
+    matched to the last merged shift starting before it ends; as merged shifts are
+    disjoint, it overlaps a shift exactly when that one ends after it starts.
+    """
+    if obligations.empty:
+        return np.zeros(0, dtype=bool)
+    left = obligations[['therapist', 'start_datetime', 'end_datetime']].reset_index(drop=True)
+    left['position'] = np.arange(len(left))
+    right = merged_shifts.rename(columns={'start_datetime': 'shift_start', 'end_datetime': 'shift_end'})
+    matched = pd.merge_asof(
+        left.sort_values('end_datetime'), right.sort_values('shift_start'),
+        left_on='end_datetime', right_on='shift_start', by='therapist',
+        allow_exact_matches=False, direction='backward'
+    ).sort_values('position')
+    return ~(matched['shift_end'] > matched['start_datetime']).to_numpy()
+
+def validate_inputs(availability_df, obligations_df):
+    """
+    Checks the parsed availability (shifts) and obligations (appointments).
+    Returns one issue per offending row as a DataFrame with ISSUE_COLUMNS; the
+    'check' column keys into CHECKS. An empty frame means the inputs are clean.
+    """
+    issues = []
+    valid = {}
+    for source, df in (('availability', availability_df), ('schedule', obligations_df)):
+        pseudo, zero, reversed_ = _interval_masks(df)
+        issues.append(_issue_rows(df, pseudo, source, 'pseudo_staff'))
+        issues.append(_issue_rows(df, zero & ~pseudo, source, 'zero_length'))
+        issues.append(_issue_rows(df, reversed_ & ~pseudo, source, 'reversed'))
+        valid[source] = df.loc[~(pseudo | zero | reversed_)]
+
+    shifts = _sorted_by_shift(valid['availability'])
+    issues.append(_issue_rows(shifts, _overlapping_shifts(shifts), 'availability', 'overlapping_shift'))
+    obligations = valid['schedule']
+    issues.append(_issue_rows(obligations, _outside_shifts(obligations, _merged_shifts(shifts)), 'schedule', 'outside_shift'))
+    return pd.concat(issues, ignore_index=True)
+
+def summarize_issues(issues):
+    """Counts issues per check, with the check's description, most frequent first."""
+    counts = issues.groupby(['source', 'check'], sort=False).size().rename('rows').reset_index()
+    counts['severity'] = counts['check'].map(lambda check: CHECKS[check][1])
+    counts['problem'] = counts['check'].map(lambda check: CHECKS[check][2])
+    return counts[['problem', 'source', 'severity', 'rows']].sort_values('rows', ascending=False, ignore_index=True)
+
+def clean_inputs(availability_df, obligations_df, mode='repair'):
+    """
+    Returns (availability_df, obligations_df) with the problem rows handled:
+      none   - unchanged
+      drop   - pseudo-staff, zero-length, reversed and overlapping rows removed
+      repair - reversed intervals swapped, overlapping shifts merged into the
+               earliest of them, the rest dropped
+    Appointments outside every shift are always kept: they still occupy a room.
+    Rows keep their original order, and a frame without problems is returned as is.
+    """
+    if mode not in FIX_MODES:
+        raise ValueError(f"Unknown data fix mode '{mode}'. Choose one of: {', '.join(FIX_MODES)}.")
+    if mode == 'none':
+        return availability_df, obligations_df
+
+    cleaned = []
+    for df in (availability_df, obligations_df):
+        pseudo, zero, reversed_ = _interval_masks(df)
+        if mode == 'repair' and reversed_.any():
+            starts = df['start_datetime'].to_numpy()
+            ends = df['end_datetime'].to_numpy()
+            df = df.assign(start_datetime=np.where(reversed_, ends, starts), end_datetime=np.where(reversed_, starts, ends))
+            reversed_ = np.zeros(len(df), dtype=bool)
+        drop = pseudo | zero | reversed_
+        cleaned.append(df.loc[~drop].reset_index(drop=True) if drop.any() else df)
+    shifts, obligations = cleaned
+
+    ordered = _sorted_by_shift(shifts)
+    overlapping = _overlapping_shifts(ordered)
+    if overlapping.any():
+        if mode == 'repair':
+            # The first shift of each overlapping run takes the run's latest end
+            run_end = ordered['end_datetime'].groupby(np.cumsum(~overlapping)).transform('max')
+            shifts = shifts.copy()
+            shifts.loc[ordered.index[~overlapping], 'end_datetime'] = run_end.to_numpy()[~overlapping]
+        shifts = shifts.drop(index=ordered.index[overlapping]).reset_index(drop=True)
+    return shifts, obligations
@@ -0,0 +1,453 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import logic
+import reference_engine
+import settings_manager
+from booking_simulator import BookingSimulator
+from synthetic_reports import build_reports
+
+# Equivalence and performance gate for the parsers and availability engines.
+# Randomly generated schedules (seeded, so every failure is reproducible) are run
+# through the frozen reference_engine and every registered engine, and the
+# blocks, slots and couples must match exactly. The benchmark stage then times
+# each engine stage on a fixed synthetic workload and fails when it is slower
+# than the stored baseline by more than the configured threshold. Timings are
+# only comparable on one machine, so the baseline is recorded locally (first run
+# or --update-baseline) and kept out of git.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(REPO_DIR, 'perf_baseline.json')
+DEFAULT_THRESHOLD_PERCENT = 25
+STAGES = ('parse_availability', 'parse_schedule', 'calculate_availability', 'find_couples_slots')
+DURATION_SETS = ([75], [60], [60, 90])
+# Tight enough that the random schedules' slots compete for rooms
+SIMULATOR_ROOM_COUNTS = ({'treatment': 1, 'couples': 1}, {'treatment': 2, 'couples': 0})
+BASE_DATE = datetime(2025, 1, 6)
+
+# Benchmark workload: one synthetic report pair, always generated the same way
+BENCHMARK_WORKLOAD = {'therapists': 40, 'days': 7, 'seed': 0, 'session_duration_minutes': 75, 'placement_strategy': 'left'}
+
+ENGINES = {}  # name -> {stage: callable}
+
+
+class EquivalenceError(Exception):
+    """An engine's output differs from the reference for a generated case."""
+    pass
+
+
+def register_engine(name, **stages):
+    """
+    Registers an engine to check against the reference. Stages not given are
+    skipped for that engine. Stage callables take the same arguments as the
+    logic.py function of the same name (parse_* wrap the two loaders).
+    """
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown engine stage(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(STAGES)}.")
+    ENGINES[name] = stages
+    return stages
+
+register_engine(
+    'current',
+    parse_availability=logic.load_and_parse_availability,
+    parse_schedule=logic.load_and_clean_schedule,
+    calculate_availability=logic.calculate_availability,
+    find_couples_slots=logic.find_couples_slots,
+)
+
+# --- Case generation ---
+
+def _minutes(rng, low, high, step=5):
+    return timedelta(minutes=step * rng.randint(low // step, high // step))
+
+def _shift_obligations(rng, shift_start, shift_end):
+    """Obligations for one shift, biased towards the edge cases engines get wrong."""
+    obligations = []
+    length = shift_end - shift_start
+    for _ in range(rng.randint(0, 4)):
+        kind = rng.choice(['inside', 'back_to_back', 'start_edge', 'end_edge', 'exact_gap', 'duplicate', 'outside'])
+        duration = _minutes(rng, 15, 120)
+        if kind == 'inside':
+            start = shift_start + _minutes(rng, 0, max(int(length.total_seconds() // 60) - 15, 0))
+        elif kind == 'back_to_back' and obligations:
+            start = obligations[-1][1]
+        elif kind == 'start_edge':
+            start = shift_start - _minutes(rng, 5, 60)
+        elif kind == 'end_edge':
+            start = shift_end - _minutes(rng, 5, 60)
+        elif kind == 'exact_gap':
+            # Leaves a free block of exactly one session length before it
+            start = shift_start + timedelta(minutes=rng.choice([60, 75, 90, 120, 150, 180]))
+        elif kind == 'duplicate' and obligations:
+            start, end = obligations[-1]
+            obligations.append((start, end))
+            continue
+        elif kind == 'outside':
+            start = shift_end + _minutes(rng, 30, 120)
+        else:
+            start = shift_start + _minutes(rng, 0, 120)
+        obligations.append((start, start + duration))
+    return obligations
+
+def random_schedule(rng):
+    """Returns a random (availability_df, obligations_df) pair shaped like the parsers' output."""
+    availability_rows, obligation_rows = [], []
+    therapists = [f"t{index}" for index in range(rng.randint(1, 6))]
+    for day_offset in range(rng.randint(1, 3)):
+        day = BASE_DATE + timedelta(days=day_offset)
+        for therapist in therapists:
+            shift_start = day + timedelta(hours=7) + _minutes(rng, 0, 360, step=15)
+            for _ in range(rng.choice([0, 1, 1, 1, 2])):
+                if rng.random() < 0.4:
+                    length = timedelta(minutes=rng.choice([60, 75, 90, 120, 150, 180, 225, 240, 300, 480]))
+                else:
+                    length = _minutes(rng, 30, 540)
+                shift_end = shift_start + length
+                availability_rows.append({'therapist': therapist, 'start_datetime': shift_start, 'end_datetime': shift_end})
+                for start, end in _shift_obligations(rng, shift_start, shift_end):
+                    obligation_rows.append({
+                        'therapist': therapist, 'start_datetime': start, 'end_datetime': end,
+                        'room_type': rng.choice(['treatment', 'treatment', 'couples']),
+                    })
+                shift_start = shift_end + _minutes(rng, 0, 120)
+    availability_df = pd.DataFrame(availability_rows, columns=['therapist', 'start_datetime', 'end_datetime'])
+    obligations_df = pd.DataFrame(obligation_rows, columns=['therapist', 'start_datetime', 'end_datetime', 'room_type'])
+    obligations_df = obligations_df.sort_values(['therapist', 'start_datetime'], kind='stable').reset_index(drop=True)
+    return availability_df.astype({'start_datetime': 'datetime64[ns]', 'end_datetime': 'datetime64[ns]'}), \
+        obligations_df.astype({'start_datetime': 'datetime64[ns]', 'end_datetime': 'datetime64[ns]'})
+
+def random_report_files(rng):
+    """Returns random (staff_schedule_bytes, schedule_at_a_glance_bytes) exports."""
+    html, rows = build_reports(
+        therapists=rng.randint(1, 24), days=rng.randint(1, 7),
+        seed=rng.randrange(2 ** 32), bookings_per_shift=rng.randint(0, 4)
+    )
+    workbook = io.BytesIO()
+    pd.DataFrame(rows, columns=['Date', 'Start time', 'End time', 'Description', 'Staff']).to_excel(workbook, index=False)
+    return html.encode('utf-8'), workbook.getvalue()
+
+
+# --- Comparison ---
+
+def _quiet(function, *args, **kwargs):
+    # The reference find_couples_slots prints a debug line per near miss, and the
+    # schedule loaders warn about free-form time parsing on every call
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        return function(*args, **kwargs)
+
+def _first_difference(expected, actual):
+    if isinstance(expected, list) and isinstance(actual, list):
+        for index, (left, right) in enumerate(zip(expected, actual)):
+            if left != right:
+                return f"item {index}: expected {left}, got {right}"
+        return f"expected {len(expected)} items, got {len(actual)}"
+    return f"expected {expected!r}, got {actual!r}"
+
+def _assert_same(label, expected, actual):
+    if expected != actual:
+        raise EquivalenceError(f"{label}: {_first_difference(expected, actual)}")
+
+def check_engine_case(engine, availability_df, obligations_df, config):
+    """Compares one engine with the reference on one schedule; raises EquivalenceError."""
+    calculate = engine.get('calculate_availability')
+    couples = engine.get('find_couples_slots')
+    for durations in DURATION_SETS:
+        reference = {
+            minutes: _quiet(reference_engine.calculate_availability, availability_df, obligations_df, minutes, 'left')
+            for minutes in durations
+        }
+        expected_couples = {
+            minutes: _quiet(reference_engine.find_couples_slots, reference[minutes][0], obligations_df,
+                            config['tolerance_minutes'], minutes, config['min_gap_hours'])
+            for minutes in durations
+        }
+        durations_arg = durations if len(durations) > 1 else durations[0]
+        label = f"{durations_arg} min"
+
+        blocks = None
+        for strategy in logic.PLACEMENT_STRATEGIES:
+            if not calculate:
+                break
+            blocks, slots = _quiet(calculate, availability_df, obligations_df, durations_arg, strategy, config['slot_alignment_minutes'])
+            if len(durations) == 1:
+                slots = {durations[0]: slots}
+            _assert_same(f"calculate_availability blocks, {label}, {strategy}", reference[min(durations)][0], blocks)
+            for minutes in durations:
+                expected_slots = reference[minutes][1] if strategy == 'left' else _quiet(
+                    reference_engine.calculate_availability, availability_df, obligations_df,
+                    minutes, strategy, config['slot_alignment_minutes']
+                )[1]
+                _assert_same(f"calculate_availability slots, {minutes} min, {strategy}", expected_slots, slots[minutes])
+
+        if couples:
+            blocks = blocks if blocks is not None else reference[min(durations)][0]
+            result = _quiet(couples, blocks, obligations_df, config['tolerance_minutes'], durations_arg, config['min_gap_hours'])
+            if len(durations) == 1:
+                result = {durations[0]: result}
+            for minutes in durations:
+                _assert_same(f"find_couples_slots, {minutes} min", expected_couples[minutes], result[minutes])
+
+def check_simulator_case(availability_df, obligations_df, config):
+    """
+    Compares the booking simulator's committed schedule, which it computes one date
+    at a time, with the report pipeline's single pass over the whole horizon, with
+    room caps set; raises EquivalenceError.
+    """
+    for room_counts in SIMULATOR_ROOM_COUNTS:
+        for strategy in logic.PLACEMENT_STRATEGIES:
+            for minutes in (75, 60):
+                label = f"{minutes} min, {strategy}, rooms {room_counts}"
+                options = dict(
+                    placement_strategy=strategy, alignment_minutes=config['slot_alignment_minutes'],
+                    tolerance_minutes=config['tolerance_minutes'], room_counts=room_counts
+                )
+                _, expected_slots, expected_couples = _quiet(
+                    logic.compute_report_slots, availability_df, obligations_df, minutes, **options
+                )
+                simulator = _quiet(
+                    BookingSimulator, availability_df, obligations_df, session_duration_minutes=minutes,
+                    min_gap_hours=1, **options
+                )
+                _assert_same(f"simulator slots, {label}", expected_slots, simulator.individual_slots())
+                _assert_same(f"simulator couples, {label}", expected_couples, simulator.couples_slots())
+
+def check_parser_case(engine, availability_bytes, schedule_bytes):
+    """Compares one engine's parsers with the reference on one export pair."""
+    if 'parse_availability' in engine:
+        expected = _quiet(reference_engine.load_and_parse_availability, io.BytesIO(availability_bytes))
+        actual = _quiet(engine['parse_availability'], io.BytesIO(availability_bytes))
+        _assert_same("parse_availability name map", expected[1], actual[1])
+        try:
+            pd.testing.assert_frame_equal(expected[0], actual[0])
+        except AssertionError as e:
+            raise EquivalenceError(f"parse_availability frame: {e}")
+    if 'parse_schedule' in engine:
+        expected = _quiet(reference_engine.load_and_clean_schedule, io.BytesIO(schedule_bytes))
+        actual = _quiet(engine['parse_schedule'], io.BytesIO(schedule_bytes))
+        _assert_same("parse_schedule elite therapists", expected[1], actual[1])
+        try:
+            pd.testing.assert_frame_equal(expected[0], actual[0])
+        except AssertionError as e:
+            raise EquivalenceError(f"parse_schedule frame: {e}")
+
+def shrink_case(availability_df, obligations_df, still_fails):
+    """
+    Greedily removes therapists, then single rows, while `still_fails(a, o)`
+    holds, and returns the smallest failing (availability_df, obligations_df).
+    """
+    for therapist in list(availability_df['therapist'].unique()):
+        smaller = (availability_df[availability_df['therapist'] != therapist].reset_index(drop=True),
+                   obligations_df[obligations_df['therapist'] != therapist].reset_index(drop=True))
+        if len(smaller[0]) and still_fails(*smaller):
+            availability_df, obligations_df = smaller
+    for frame_index in (1, 0):
+        index = 0
+        while index < len((availability_df, obligations_df)[frame_index]):
+            frames = [availability_df, obligations_df]
+            frames[frame_index] = frames[frame_index].drop(index=frames[frame_index].index[index]).reset_index(drop=True)
+            if len(frames[0]) and still_fails(*frames):
+                availability_df, obligations_df = frames
+            else:
+                index += 1
+    return availability_df, obligations_df
+
+def _shrunk_failure(label, check, availability_df, obligations_df, error):
+    def still_fails(a, o):
+        try:
+            check(a, o)
+        except EquivalenceError:
+            return True
+        return False
+    small_a, small_o = shrink_case(availability_df, obligations_df, still_fails)
+    return (
+        f"{label}: {error}\n  minimal availability:\n{small_a.to_string()}\n"
+        f"  minimal obligations:\n{small_o.to_string()}"
+    )
+
+def run_equivalence(engine_names, cases, seed, config, parser_cases=None, simulator_cases=None):
+    """Checks every named engine on `cases` random schedules; returns a list of failure reports."""
+    failures = []
+    parser_cases = cases // 10 if parser_cases is None else parser_cases
+    simulator_cases = cases // 10 if simulator_cases is None else simulator_cases
+    for name in engine_names:
+        engine = ENGINES[name]
+        for case in range(cases):
+            case_seed = f"{seed}:{case}"
+            availability_df, obligations_df = random_schedule(random.Random(case_seed))
+            try:
+                check_engine_case(engine, availability_df, obligations_df, config)
+            except EquivalenceError as e:
+                failures.append(_shrunk_failure(
+                    f"[{name}] case {case_seed}", lambda a, o: check_engine_case(engine, a, o, config),
+                    availability_df, obligations_df, e
+                ))
+        for case in range(parser_cases):
+            case_seed = f"{seed}:parser:{case}"
+            try:
+                check_parser_case(engine, *random_report_files(random.Random(case_seed)))
+            except EquivalenceError as e:
+                failures.append(f"[{name}] parser case {case_seed}: {e}")
+    for case in range(simulator_cases):
+        case_seed = f"{seed}:simulator:{case}"
+        availability_df, obligations_df = random_schedule(random.Random(case_seed))
+        try:
+            check_simulator_case(availability_df, obligations_df, config)
+        except EquivalenceError as e:
+            failures.append(_shrunk_failure(
+                f"[simulator] case {case_seed}", lambda a, o: check_simulator_case(a, o, config),
+                availability_df, obligations_df, e
+            ))
+    return failures
+
+
+# --- Performance gate ---
+
+def _best_time(function, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = _quiet(function)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def benchmark_engine(engine, repeat=3):
+    """Times every stage of `engine` on BENCHMARK_WORKLOAD; returns {stage: best seconds}."""
+    workload = BENCHMARK_WORKLOAD
+    html, rows = build_reports(therapists=workload['therapists'], days=workload['days'], seed=workload['seed'])
+    workbook = io.BytesIO()
+    pd.DataFrame(rows, columns=['Date', 'Start time', 'End time', 'Description', 'Staff']).to_excel(workbook, index=False)
+    availability_bytes = html.encode('utf-8')
+
+    # Later stages run on the reference parse so every engine gets the same input
+    availability_df, _ = _quiet(reference_engine.load_and_parse_availability, io.BytesIO(availability_bytes))
+    obligations_df, _ = _quiet(reference_engine.load_and_clean_schedule, io.BytesIO(workbook.getvalue()))
+    blocks, _ = reference_engine.calculate_availability(availability_df, obligations_df, workload['session_duration_minutes'])
+
+    calls = {
+        'parse_availability': lambda stage: stage(io.BytesIO(availability_bytes)),
+        'parse_schedule': lambda stage: stage(io.BytesIO(workbook.getvalue())),
+        'calculate_availability': lambda stage: stage(
+            availability_df, obligations_df, workload['session_duration_minutes'], workload['placement_strategy']
+        ),
+        'find_couples_slots': lambda stage: stage(blocks, obligations_df, 30, workload['session_duration_minutes']),
+    }
+    timings = {}
+    for stage_name in STAGES:
+        if stage_name in engine:
+            timings[stage_name], _ = _best_time(lambda: calls[stage_name](engine[stage_name]), repeat)
+    return timings
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+def save_baseline(path, engine_name, timings, threshold_percent):
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump({
+            'engine': engine_name,
+            'threshold_percent': threshold_percent,
+            'workload': BENCHMARK_WORKLOAD,
+            'machine': f"{platform.machine()} {platform.python_implementation()} {platform.python_version()}",
+            'stages': {stage: round(seconds, 4) for stage, seconds in timings.items()},
+        }, handle, indent=2)
+
+def compare_to_baseline(timings, baseline, threshold_percent):
+    """Returns (rows, regressed) where rows are (stage, baseline, now, change_percent, status)."""
+    rows = []
+    regressed = False
+    for stage, seconds in timings.items():
+        reference_seconds = baseline['stages'].get(stage)
+        if not reference_seconds:
+            rows.append((stage, None, seconds, None, 'NEW'))
+            continue
+        change = 100 * (seconds - reference_seconds) / reference_seconds
+        status = 'REGRESSED' if change > threshold_percent else 'OK'
+        regressed = regressed or status == 'REGRESSED'
+        rows.append((stage, reference_seconds, seconds, change, status))
+    return rows, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check engines against the frozen reference and gate performance regressions.")
+    parser.add_argument('--cases', type=int, default=100, help="Random schedules checked per engine.")
+    parser.add_argument('--parser-cases', type=int, help="Random export pairs checked per engine (default: cases / 10).")
+    parser.add_argument('--simulator-cases', type=int,
+                        help="Random schedules on which the booking simulator is checked against the report (default: cases / 10).")
+    parser.add_argument('--seed', default='0', help="Seed of the random cases; failures report '<seed>:<case>'.")
+    parser.add_argument('--engine', dest='engines', action='append',
+                        help="Engine to check; repeat for several (default: all registered).")
+    parser.add_argument('--engine-module', action='append', default=[],
+                        help="Module to import first; it registers alternative engines with register_engine().")
+    parser.add_argument('--skip-equivalence', action='store_true', help="Only run the performance gate.")
+    parser.add_argument('--skip-perf', action='store_true', help="Only run the equivalence checks.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Stored benchmark baseline (JSON).")
+    parser.add_argument('--update-baseline', action='store_true', help="Record the current timings as the new baseline.")
+    parser.add_argument('--threshold', type=float,
+                        help=f"Allowed slowdown in percent (default: the baseline's, else {DEFAULT_THRESHOLD_PERCENT}).")
+    parser.add_argument('--perf-engine', default='current', help="Engine timed by the performance gate.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timing runs per stage; the best one counts.")
+    parser.add_argument('--config', default=os.path.join(REPO_DIR, 'config.ini'), help="Path to config.ini.")
+    args = parser.parse_args(argv)
+
+    # Engine modules import this file by name; run as a script it is __main__
+    sys.modules.setdefault('equivalence_check', sys.modules[__name__])
+    for module in args.engine_module:
+        importlib.import_module(module)
+    config = settings_manager.load_app_config(args.config)
+    exit_code = 0
+
+    if not args.skip_equivalence:
+        engine_names = args.engines or list(ENGINES)
+        started = time.perf_counter()
+        failures = run_equivalence(engine_names, args.cases, args.seed, config, args.parser_cases, args.simulator_cases)
+        print(f"Equivalence: {len(engine_names)} engine(s) x {args.cases} schedules in {time.perf_counter() - started:.1f} s, "
+              f"{len(failures)} failure(s)")
+        for failure in failures:
+            print(f"FAILED {failure}")
+        if failures:
+            exit_code = 1
+
+    if not args.skip_perf:
+        timings = benchmark_engine(ENGINES[args.perf_engine], args.repeat)
+        baseline = load_baseline(args.baseline)
+        threshold = args.threshold if args.threshold is not None else (
+            baseline.get('threshold_percent', DEFAULT_THRESHOLD_PERCENT) if baseline else DEFAULT_THRESHOLD_PERCENT
+        )
+        if baseline is None or args.update_baseline:
+            save_baseline(args.baseline, args.perf_engine, timings, threshold)
+            print(f"Recorded performance baseline in {args.baseline}:")
+            for stage, seconds in timings.items():
+                print(f"  {stage:<24}{seconds:>9.4f} s")
+        else:
+            rows, regressed = compare_to_baseline(timings, baseline, threshold)
+            print(f"Performance of '{args.perf_engine}' against {args.baseline} (allowed slowdown {threshold:g}%):")
+            print(f"  {'stage':<24}{'baseline s':>12}{'now s':>10}{'change':>9}  status")
+            for stage, reference_seconds, seconds, change, status in rows:
+                reference_text = f"{reference_seconds:.4f}" if reference_seconds else "-"
+                change_text = f"{change:+.0f}%" if change is not None else "-"
+                print(f"  {stage:<24}{reference_text:>12}{seconds:>10.4f}{change_text:>9}  {status}")
+            if regressed:
+                exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
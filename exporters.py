@@ -0,0 +1,401 @@
+import csv
+import html
+import io
+import json
+import re
+import zipfile
+from datetime import datetime, timezone
+
+from fpdf.fonts import CORE_FONTS_CHARWIDTHS
+
+from logic import (
+    iter_report_sections,
+    group_slots_by_date,
+    group_day_by_therapist,
+    group_couples_by_day,
+    format_slot_time,
+    format_day_heading,
+    display_name_for,
+)
+
+# Lightweight alternatives to the PDF report. Every exporter is a generator that
+# yields text chunks in the same order AvailabilityPDF lays the report out, so
+# large horizons can be written to disk incrementally.
+
+
+def _section_label(minutes):
+    return f"{minutes}-Minute Sessions" if minutes is not None else None
+
+
+def _couples_rows(couples_slots, name_map):
+    """Yields couples opportunities in start order with their display names."""
+    for slot in sorted(couples_slots, key=lambda x: x['start']):
+        yield slot['start'], [display_name_for(name_map, t) for t in slot['therapists']]
+
+
+# --- CSV ---
+
+def iter_csv(individual_slots, couples_slots, name_map, sort_order="Alphabetical"):
+    """Yields CSV lines: one row per couples opportunity, then one per individual slot."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(['section', 'duration_minutes', 'date', 'day', 'therapist_id', 'therapist', 'start', 'end'])
+    yield flush()
+
+    for minutes, section_slots, section_couples in iter_report_sections(individual_slots, couples_slots):
+        for start, names in _couples_rows(section_couples, name_map):
+            writer.writerow(['couples', minutes or '', start.date().isoformat(), start.strftime('%A'), '', ' & '.join(names), start.isoformat(), ''])
+            yield flush()
+        for date, slots_for_day in group_slots_by_date(section_slots):
+            for therapist_key, slots in group_day_by_therapist(slots_for_day, sort_order):
+                display_name = display_name_for(name_map, therapist_key)
+                for slot in slots:
+                    writer.writerow([
+                        'individual', minutes or '', date.isoformat(), date.strftime('%A'),
+                        therapist_key, display_name, slot['start'].isoformat(), slot['end'].isoformat()
+                    ])
+                yield flush()
+
+
+# --- JSON ---
+
+def iter_json(individual_slots, couples_slots, name_map, sort_order="Alphabetical"):
+    """
+    Yields a JSON document of the form
+    {"sections": [{"duration_minutes", "couples": [...], "days": [{"date", "therapists": [...]}]}]}
+    one day at a time.
+    """
+    yield '{"sections": ['
+    for section_index, (minutes, section_slots, section_couples) in enumerate(iter_report_sections(individual_slots, couples_slots)):
+        couples = [
+            {'start': start.isoformat(), 'therapists': names}
+            for start, names in _couples_rows(section_couples, name_map)
+        ]
+        yield (', ' if section_index else '') + '{"duration_minutes": %s, "couples": %s, "days": [' % (
+            json.dumps(minutes), json.dumps(couples)
+        )
+        for day_index, (date, slots_for_day) in enumerate(group_slots_by_date(section_slots)):
+            day = {
+                'date': date.isoformat(),
+                'heading': format_day_heading(date),
+                'therapists': [
+                    {
+                        'id': therapist_key,
+                        'name': display_name_for(name_map, therapist_key),
+                        'slots': [{'start': slot['start'].isoformat(), 'end': slot['end'].isoformat()} for slot in slots]
+                    }
+                    for therapist_key, slots in group_day_by_therapist(slots_for_day, sort_order)
+                ]
+            }
+            yield (', ' if day_index else '') + json.dumps(day)
+        yield ']}'
+    yield ']}\n'
+
+
+# --- HTML ---
+
+def _css_for(style, px_per_mm=None):
+    """CSS for one PDF style; with `px_per_mm` the font size is scaled like the page (see render_preview_page)."""
+    size = style.get('font_size', 12)
+    return (
+        f"font-family:{style.get('font_family', 'Helvetica')}, Arial, sans-serif; "
+        f"font-size:{f'{size * PT_TO_MM * px_per_mm:.1f}px' if px_per_mm else f'{size}pt'}; "
+        f"color:{style.get('color_hex', '#000000')}; "
+        f"font-weight:{'bold' if style.get('bold') else 'normal'}; "
+        f"font-style:{'italic' if style.get('italic') else 'normal'};"
+    )
+
+def iter_html(individual_slots, couples_slots, name_map, sort_order="Alphabetical", settings=None, title="Therapist Availability"):
+    """Yields a self-contained HTML page styled from the PDF style settings."""
+    settings = settings or {}
+    styles = {key: _css_for(settings.get(key, {})) for key in
+              ('title', 'couples_header', 'couples_body', 'day_of_week', 'therapist', 'times')}
+    escape = html.escape
+
+    yield (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+        f"<title>{escape(title)}</title>"
+        "<style>body{text-align:center;margin:2em auto;max-width:48em;} p{margin:0.2em 0;} section{margin-bottom:1.5em;}"
+        + "".join(f" .{key}{{{css}}}" for key, css in styles.items()) +
+        "</style></head><body>\n"
+        f"<h1 class=\"title\">{escape(title)}</h1>\n"
+    )
+    for minutes, section_slots, section_couples in iter_report_sections(individual_slots, couples_slots):
+        yield "<section>\n"
+        if minutes is not None:
+            yield f"<h1 class=\"title\">{escape(_section_label(minutes))}</h1>\n"
+        yield "<h2 class=\"couples_header\">Available Times for Couple's Massages</h2>\n"
+        if not section_couples:
+            yield "<p class=\"couples_body\">No couples massage opportunities found for this period.</p>\n"
+        for day, starts in group_couples_by_day(section_couples).items():
+            times = ', '.join(format_slot_time(start) for start in starts)
+            yield f"<p class=\"couples_body\"><b>{escape(day)}:</b> {escape(times)}</p>\n"
+        for date, slots_for_day in group_slots_by_date(section_slots):
+            chunk = [f"<h3 class=\"day_of_week\">{escape(format_day_heading(date))}</h3>\n"]
+            for therapist_key, slots in group_day_by_therapist(slots_for_day, sort_order):
+                times = ', '.join(format_slot_time(slot['start']) for slot in slots)
+                chunk.append(f"<p class=\"therapist\">{escape(display_name_for(name_map, therapist_key))}</p>\n")
+                chunk.append(f"<p class=\"times\">{escape(times)}</p>\n")
+            yield "".join(chunk)
+        yield "</section>\n"
+    yield "</body></html>\n"
+
+
+# --- Paginated preview ---
+# The layout of AvailabilityPDF replayed without FPDF. Every cell the PDF writes
+# becomes a line with the same text, style and height, and lines are split into
+# pages with the auto page break generate_pdf_report sets up (A4, 10 mm top margin,
+# break 15 mm above the bottom edge), so the preview pages end where the PDF's do.
+# Pages are laid out lazily and each one is rendered to HTML on its own.
+
+PAGE_WIDTH_MM = 210
+PAGE_HEIGHT_MM = 297
+PAGE_MARGIN_MM = 10
+PAGE_BREAK_MARGIN_MM = 15
+PT_TO_MM = 25.4 / 72
+# FPDF keeps 1 mm of cell padding on each side when write() wraps at the right margin
+WRAP_PADDING_MM = 2
+PREVIEW_PX_PER_MM = 2.6
+
+def _text_width_mm(text, style, bold=False):
+    """Width of `text` in a style's font, from the core font metrics (Helvetica for custom families)."""
+    family = style.get('font_family', 'Helvetica').lower()
+    family = 'helvetica' if family == 'arial' else family
+    emphasis = 'B' if bold else ''
+    widths = CORE_FONTS_CHARWIDTHS.get(family + emphasis, CORE_FONTS_CHARWIDTHS['helvetica' + emphasis])
+    return sum(widths.get(char, 500) for char in text) * style.get('font_size', 12) * PT_TO_MM / 1000
+
+def _written_rows(segments, style):
+    """
+    Number of 8 mm rows write() needs for a centered couples row of (text, bold)
+    segments. Like FPDF, a row wider than the page starts at a negative x, which
+    FPDF counts from the right edge, and wraps word by word at the right margin.
+    """
+    total = sum(_text_width_mm(text, style, bold) for text, bold in segments)
+    x = PAGE_MARGIN_MM + (PAGE_WIDTH_MM - 2 * PAGE_MARGIN_MM - total) / 2
+    if x < 0:
+        x += PAGE_WIDTH_MM
+    right = PAGE_WIDTH_MM - PAGE_MARGIN_MM - WRAP_PADDING_MM
+    rows = 1
+    for text, bold in segments:
+        for word in re.findall(r'\S+\s*', text):
+            if x + _text_width_mm(word.rstrip(), style, bold) > right and x > PAGE_MARGIN_MM:
+                rows += 1
+                x = PAGE_MARGIN_MM
+            x += _text_width_mm(word, style, bold)
+    return rows
+
+def _line(style_key, height, text, lead=None):
+    return {'style': style_key, 'height': height, 'text': text, 'lead': lead}
+
+def _space(height):
+    return {'style': None, 'height': height, 'text': '', 'lead': None}
+
+def iter_preview_lines(individual_slots, couples_slots, name_map, sort_order="Alphabetical", settings=None, title="Therapist Availability"):
+    """
+    Yields the lines of the report in the order and with the heights (in mm) that
+    generate_pdf_report writes them. None marks a forced new page (add_page).
+    """
+    settings = settings or {}
+
+    yield _line('title', 10, title)
+    yield _space(5)
+    for index, (minutes, section_slots, section_couples) in enumerate(iter_report_sections(individual_slots, couples_slots)):
+        if minutes is not None:
+            if index > 0:
+                yield None
+            yield _line('title', 10, _section_label(minutes))
+            yield _space(2)
+
+        yield _line('couples_header', 10, "Available Times for Couple's Massages")
+        if not section_couples:
+            yield _line('couples_body', 10, "  No couples massage opportunities found for this period.")
+        for day, starts in group_couples_by_day(section_couples).items():
+            day_text = f"{day}: "
+            times = ', '.join(format_slot_time(start) for start in starts)
+            rows = _written_rows([(day_text, True), (times, False)], settings.get('couples_body', {}))
+            yield _line('couples_body', 8 * rows, times, lead=day_text)
+        yield _space(10)
+
+        for date, slots_for_day in group_slots_by_date(section_slots):
+            yield _line('day_of_week', 10, format_day_heading(date))
+            for therapist_key, slots in group_day_by_therapist(slots_for_day, sort_order):
+                yield _line('therapist', 8, display_name_for(name_map, therapist_key))
+                yield _line('times', 8, ', '.join(format_slot_time(slot['start']) for slot in slots))
+            yield _space(2)
+
+def iter_preview_pages(individual_slots, couples_slots, name_map, sort_order="Alphabetical", settings=None):
+    """
+    Yields the report one page at a time as lists of preview lines. A line that
+    does not fit above the page break starts a new page; blank space never does.
+    """
+    top = PAGE_MARGIN_MM
+    page_break = PAGE_HEIGHT_MM - PAGE_BREAK_MARGIN_MM
+    page, y = [], top
+    for line in iter_preview_lines(individual_slots, couples_slots, name_map, sort_order, settings):
+        if line is None or (line['style'] is not None and y + line['height'] > page_break and page):
+            yield page
+            page, y = [], top
+            if line is None:
+                continue
+        page.append(line)
+        y += line['height']
+    yield page
+
+def render_preview_page(page, settings=None, px_per_mm=PREVIEW_PX_PER_MM):
+    """Renders one page of iter_preview_pages() as an HTML sheet styled from the PDF style settings."""
+    settings = settings or {}
+    escape = html.escape
+    chunks = [
+        f'<div style="width:{PAGE_WIDTH_MM * px_per_mm:.0f}px; height:{PAGE_HEIGHT_MM * px_per_mm:.0f}px; '
+        f'padding:{PAGE_MARGIN_MM * px_per_mm:.0f}px; box-sizing:border-box; margin:0 auto; overflow:hidden; '
+        'background:#ffffff; border:1px solid #d0d0d0; box-shadow:0 2px 6px rgba(0,0,0,0.15); text-align:center;">'
+    ]
+    for line in page:
+        height = line['height'] * px_per_mm
+        if line['style'] is None:
+            chunks.append(f'<div style="height:{height:.1f}px;"></div>')
+            continue
+        style = settings.get(line['style'], {})
+        css = _css_for(style, px_per_mm)
+        if line['lead'] is None:
+            chunks.append(
+                f'<div style="height:{height:.1f}px; line-height:{height:.1f}px; white-space:nowrap; {css}">'
+                f'{escape(line["text"])}</div>'
+            )
+        else:
+            # Couples rows: the day in bold, the times in regular, whatever the style's emphasis
+            row_height = 8 * px_per_mm
+            chunks.append(
+                f'<div style="height:{height:.1f}px; line-height:{row_height:.1f}px; {css} font-weight:normal; font-style:normal;">'
+                f'<b>{escape(line["lead"])}</b>{escape(line["text"])}</div>'
+            )
+    chunks.append('</div>')
+    return ''.join(chunks)
+
+
+# --- iCalendar ---
+
+def _ics_text(value):
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def _ics_time(timestamp):
+    return timestamp.strftime('%Y%m%dT%H%M%S')
+
+def _ics_fold(line):
+    """
+    Folds a content line longer than 75 octets (RFC 5545 3.1): the rest continues on
+    the next line after a single space, which counts towards that line's 75 octets.
+    Folds fall between characters, never inside a multi-byte UTF-8 sequence.
+    """
+    parts = []
+    start = octets = 0
+    for index, char in enumerate(line):
+        size = len(char.encode('utf-8'))
+        if octets + size > 75:
+            parts.append(line[start:index])
+            start, octets = index, 1
+        octets += size
+    parts.append(line[start:])
+    return "\r\n ".join(parts) + "\r\n"
+
+def _ics_lines(*lines):
+    return "".join(_ics_fold(line) for line in lines)
+
+def _ics_events_by_therapist(individual_slots):
+    """Groups the slots of every report section by therapist in one pass: {therapist: [(minutes, slot), ...]}."""
+    events = {}
+    for minutes, section_slots, _ in iter_report_sections(individual_slots, {}):
+        for slot in section_slots:
+            length = minutes or int((slot['end'] - slot['start']).total_seconds() // 60)
+            events.setdefault(slot['therapist'], []).append((length, slot))
+    return events
+
+def _iter_ics_feed(events, name_map, therapist_key):
+    display_name = display_name_for(name_map, therapist_key)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    yield _ics_lines(
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Wellness Scheduler//Availability//EN",
+        f"X-WR-CALNAME:{_ics_text(display_name)} Availability",
+    )
+    for length, slot in events:
+        yield _ics_lines(
+            "BEGIN:VEVENT",
+            f"UID:{therapist_key}-{_ics_time(slot['start'])}-{length}@wellness-scheduler",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{_ics_time(slot['start'])}",
+            f"DTEND:{_ics_time(slot['end'])}",
+            f"SUMMARY:{_ics_text(f'Available: {display_name} ({length} min)')}",
+            "TRANSP:TRANSPARENT",
+            "END:VEVENT",
+        )
+    yield _ics_lines("END:VCALENDAR")
+
+def iter_ics(individual_slots, name_map, therapist_key):
+    """
+    Yields an iCalendar feed of one therapist's open slots (floating local times).
+    DTSTAMP is the time the feed was generated, in UTC, shared by all its events.
+    """
+    events = _ics_events_by_therapist(individual_slots).get(therapist_key, [])
+    yield from _iter_ics_feed(events, name_map, therapist_key)
+
+def write_ics_archive(target, individual_slots, name_map):
+    """
+    Writes one .ics feed per therapist into a zip archive (path or binary file object).
+    The slots are grouped by therapist once, so each feed only walks its own events.
+    """
+    events_by_therapist = _ics_events_by_therapist(individual_slots)
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for therapist_key in sorted(events_by_therapist):
+            with archive.open(f"{therapist_key}.ics", 'w') as feed:
+                for chunk in _iter_ics_feed(events_by_therapist[therapist_key], name_map, therapist_key):
+                    feed.write(chunk.encode('utf-8'))
+
+
+# --- Format registry ---
+
+EXPORT_FORMATS = {
+    'pdf': {'label': "PDF", 'extension': '.pdf', 'mime': 'application/pdf'},
+    'html': {'label': "HTML page", 'extension': '.html', 'mime': 'text/html', 'writer': iter_html},
+    'csv': {'label': "CSV", 'extension': '.csv', 'mime': 'text/csv', 'writer': iter_csv},
+    'json': {'label': "JSON", 'extension': '.json', 'mime': 'application/json', 'writer': iter_json},
+    'ics': {'label': "Calendar feeds (.ics per therapist, zipped)", 'extension': '.zip', 'mime': 'application/zip'},
+}
+
+def write_export(fmt, target, individual_slots, couples_slots, name_map, sort_order="Alphabetical", settings=None):
+    """
+    Streams a non-PDF export to `target`, a path or a binary file object.
+    Text formats are encoded and written chunk by chunk as they are generated.
+    """
+    if fmt == 'ics':
+        write_ics_archive(target, individual_slots, name_map)
+        return
+    writer = EXPORT_FORMATS.get(fmt, {}).get('writer')
+    if writer is None:
+        raise ValueError(f"Unsupported export format '{fmt}'.")
+
+    kwargs = {'settings': settings} if fmt == 'html' else {}
+    chunks = writer(individual_slots, couples_slots, name_map, sort_order, **kwargs)
+    if isinstance(target, (str, bytes)) or hasattr(target, '__fspath__'):
+        with open(target, 'w', encoding='utf-8', newline='') as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+    else:
+        for chunk in chunks:
+            target.write(chunk.encode('utf-8'))
+
+def export_to_buffer(fmt, individual_slots, couples_slots, name_map, sort_order="Alphabetical", settings=None):
+    """Returns a non-PDF export as an in-memory BytesIO buffer (for download buttons)."""
+    buffer = io.BytesIO()
+    write_export(fmt, buffer, individual_slots, couples_slots, name_map, sort_order, settings)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,325 @@
+import sqlite3
+from collections.abc import Mapping
+from contextlib import closing, contextmanager
+
+import numpy as np
+import pandas as pd
+
+from logic import normalize_name
+
+# Local SQLite history of every generated report. Each run stores its parsed
+# shifts and appointments, continuous free blocks, offered slots and couples
+# opportunities, written with executemany() in a single transaction. When reports
+# overlap (the same week generated again after new bookings), the newest run of
+# a date is the one the queries read; older runs stay in the file. Every table is
+# indexed on (therapist, start) and (date), so lookups over years of reports only
+# touch the rows they return.
+
+# Dates and times are stored as ISO 8601 text ('2025-01-06', '2025-01-06T09:00:00'),
+# which sorts chronologically and is formatted by NumPy in one call per column
+DATE_FORMAT = '%Y-%m-%d'
+
+# table -> columns after run_id; the interval tables also get date and minutes
+INTERVAL_TABLES = {
+    'shifts': ['therapist', 'start', 'end'],
+    'obligations': ['therapist', 'start', 'end', 'room_type'],
+    'blocks': ['therapist', 'start', 'end'],
+    'slots': ['duration_minutes', 'therapist', 'start', 'end'],
+    'couples': ['duration_minutes', 'therapist', 'start'],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    run_key TEXT UNIQUE,
+    label TEXT,
+    created_at TEXT NOT NULL,
+    first_date TEXT,
+    last_date TEXT,
+    session_durations TEXT,
+    placement_strategy TEXT
+);
+-- The newest run that covers each date
+CREATE TABLE IF NOT EXISTS day_runs (
+    date TEXT PRIMARY KEY,
+    run_id INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS shifts (
+    run_id INTEGER NOT NULL, therapist TEXT NOT NULL, start TEXT NOT NULL, "end" TEXT NOT NULL,
+    date TEXT NOT NULL, minutes REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS obligations (
+    run_id INTEGER NOT NULL, therapist TEXT NOT NULL, start TEXT NOT NULL, "end" TEXT NOT NULL,
+    room_type TEXT, date TEXT NOT NULL, minutes REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    run_id INTEGER NOT NULL, therapist TEXT NOT NULL, start TEXT NOT NULL, "end" TEXT NOT NULL,
+    date TEXT NOT NULL, minutes REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slots (
+    run_id INTEGER NOT NULL, duration_minutes INTEGER NOT NULL, therapist TEXT NOT NULL,
+    start TEXT NOT NULL, "end" TEXT NOT NULL, date TEXT NOT NULL, minutes REAL NOT NULL
+);
+-- One row per therapist of each couples opportunity; an opportunity is the rows
+-- sharing run_id, duration_minutes and start
+CREATE TABLE IF NOT EXISTS couples (
+    run_id INTEGER NOT NULL, duration_minutes INTEGER NOT NULL, therapist TEXT NOT NULL,
+    start TEXT NOT NULL, date TEXT NOT NULL
+);
+""" + "".join(
+    f"CREATE INDEX IF NOT EXISTS {table}_therapist_start ON {table} (therapist, start);\n"
+    f"CREATE INDEX IF NOT EXISTS {table}_date ON {table} (date, run_id);\n"
+    for table in INTERVAL_TABLES
+)
+
+
+# --- Row building ---
+
+def _iso(values, unit):
+    """ISO 8601 strings of datetimes, to the day ('D') or second ('s')."""
+    return np.datetime_as_string(pd.DatetimeIndex(values).to_numpy().astype(f'datetime64[{unit}]'), unit=unit).astype(object)
+
+def _interval_rows(run_id, columns, therapists, starts, ends=None, extra=None):
+    """
+    Builds the insert rows of one interval table from column arrays. Dates and
+    minutes are derived with whole-array operations before executemany().
+    """
+    starts = pd.DatetimeIndex(starts)
+    fields = [np.full(len(starts), run_id, dtype=object)]
+    for name in columns:
+        if name == 'therapist':
+            fields.append(np.asarray(therapists, dtype=object))
+        elif name == 'start':
+            fields.append(_iso(starts, 's'))
+        elif name == 'end':
+            fields.append(_iso(ends, 's'))
+        else:
+            fields.append(np.asarray(extra[name], dtype=object))
+    fields.append(_iso(starts, 'D'))
+    if ends is not None:
+        fields.append(((pd.DatetimeIndex(ends) - starts) / pd.Timedelta(minutes=1)).to_numpy(dtype=float).tolist())
+    return list(zip(*fields))
+
+def _slot_lists(slots, session_durations):
+    """{minutes: slots} for either shape calculate_availability returns."""
+    if isinstance(slots, Mapping):
+        return dict(slots)
+    return {session_durations[0]: slots}
+
+def _records(items):
+    """(therapists, starts, ends) arrays from a list of {'therapist', 'start', 'end'} dicts."""
+    return (
+        [item['therapist'] for item in items],
+        [item['start'] for item in items],
+        [item['end'] for item in items],
+    )
+
+
+class HistoryStore:
+    """
+    SQLite history of generated reports at `path`. Every call opens its own
+    connection, so one store can be shared by all sessions and threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        with closing(sqlite3.connect(self.path, timeout=30)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            yield connection
+
+    # --- Writing ---
+
+    def save_run(self, availability_df, obligations_df, continuous_blocks, individual_slots, couples_slots,
+                 session_durations, placement_strategy=None, label=None, run_key=None):
+        """
+        Stores one generated report and makes it the current run of its dates.
+        `individual_slots` and `couples_slots` are lists, or {minutes: list} mappings
+        for several session lengths. A run saved again under the same `run_key`
+        replaces the earlier copy. Returns the run id.
+        """
+        session_durations = list(session_durations)
+        slot_lists = _slot_lists(individual_slots, session_durations)
+        couples_lists = _slot_lists(couples_slots, session_durations)
+
+        dates = pd.DatetimeIndex(availability_df['start_datetime']).normalize().unique().sort_values()
+        date_strings = _iso(dates, 'D').tolist()
+        created_at = pd.Timestamp.now().isoformat(timespec='seconds')
+
+        with self._connect() as connection, connection:
+            if run_key is not None:
+                previous = connection.execute("SELECT run_id FROM runs WHERE run_key = ?", (run_key,)).fetchone()
+                if previous:
+                    self._delete_run(connection, previous[0])
+            run_id = connection.execute(
+                "INSERT INTO runs (run_key, label, created_at, first_date, last_date, session_durations, placement_strategy) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_key, label, created_at, date_strings[0] if date_strings else None,
+                 date_strings[-1] if date_strings else None,
+                 ",".join(str(minutes) for minutes in session_durations), placement_strategy)
+            ).lastrowid
+
+            rows = {
+                'shifts': _interval_rows(
+                    run_id, INTERVAL_TABLES['shifts'], availability_df['therapist'],
+                    availability_df['start_datetime'], availability_df['end_datetime']
+                ),
+                'obligations': _interval_rows(
+                    run_id, INTERVAL_TABLES['obligations'], obligations_df['therapist'],
+                    obligations_df['start_datetime'], obligations_df['end_datetime'],
+                    extra={'room_type': obligations_df['room_type'] if 'room_type' in obligations_df else [None] * len(obligations_df)}
+                ),
+                'blocks': _interval_rows(run_id, INTERVAL_TABLES['blocks'], *_records(continuous_blocks)),
+                'slots': [],
+                'couples': [],
+            }
+            for minutes, slots in slot_lists.items():
+                therapists, starts, ends = _records(slots)
+                rows['slots'] += _interval_rows(
+                    run_id, INTERVAL_TABLES['slots'], therapists, starts, ends,
+                    extra={'duration_minutes': [minutes] * len(slots)}
+                )
+            for minutes, opportunities in couples_lists.items():
+                members = [
+                    (therapist, opportunity['start'])
+                    for opportunity in opportunities
+                    for therapist in opportunity['therapists']
+                ]
+                rows['couples'] += _interval_rows(
+                    run_id, INTERVAL_TABLES['couples'], [member[0] for member in members], [member[1] for member in members],
+                    extra={'duration_minutes': [minutes] * len(members)}
+                )
+
+            for table, table_rows in rows.items():
+                columns = ['run_id'] + INTERVAL_TABLES[table] + ['date'] + (['minutes'] if table != 'couples' else [])
+                quoted = ", ".join(f'"{column}"' for column in columns)
+                placeholders = ", ".join("?" * len(columns))
+                connection.executemany(f"INSERT INTO {table} ({quoted}) VALUES ({placeholders})", table_rows)
+            connection.executemany(
+                "INSERT OR REPLACE INTO day_runs (date, run_id) VALUES (?, ?)",
+                [(date, run_id) for date in date_strings]
+            )
+        return run_id
+
+    def _delete_run(self, connection, run_id):
+        for table in INTERVAL_TABLES:
+            connection.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+        connection.execute("DELETE FROM day_runs WHERE run_id = ?", (run_id,))
+        connection.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    # --- Queries ---
+
+    def _query(self, sql, parameters=()):
+        with self._connect() as connection:
+            return pd.read_sql_query(sql, connection, params=parameters)
+
+    def _current(self, table, columns, therapist=None, start=None, end=None, duration_minutes=None):
+        """
+        Rows of `table` from the current run of each date, optionally for one
+        therapist (any spelling normalize_name accepts), dates in [start, end]
+        and one session length.
+        """
+        conditions = []
+        parameters = []
+        if therapist is not None:
+            conditions.append("t.therapist = ?")
+            parameters.append(normalize_name(therapist))
+        # The date range is given on both date and start, so SQLite can use either index
+        if start is not None:
+            first_date = pd.Timestamp(start).strftime(DATE_FORMAT)
+            conditions += ["t.date >= ?", "t.start >= ?"]
+            parameters += [first_date, first_date]
+        if end is not None:
+            conditions += ["t.date <= ?", "t.start < ?"]
+            parameters += [pd.Timestamp(end).strftime(DATE_FORMAT), (pd.Timestamp(end) + pd.Timedelta(days=1)).strftime(DATE_FORMAT)]
+        if duration_minutes is not None:
+            conditions.append("t.duration_minutes = ?")
+            parameters.append(int(duration_minutes))
+        where = " AND ".join(conditions) or "1"
+        selected = ", ".join(f't."{column}"' for column in columns)
+        return self._query(
+            f"SELECT {selected} FROM {table} t JOIN day_runs d ON d.date = t.date AND d.run_id = t.run_id "
+            f"WHERE {where} ORDER BY t.start, t.therapist",
+            parameters
+        )
+
+    def runs(self):
+        """Every stored run, newest first."""
+        return self._query("SELECT * FROM runs ORDER BY run_id DESC")
+
+    def shifts(self, therapist=None, start=None, end=None):
+        """Scheduled shifts as stored from the Staff Schedule exports."""
+        return _parse_times(self._current('shifts', ['therapist', 'start', 'end', 'date', 'minutes'], therapist, start, end))
+
+    def obligations(self, therapist=None, start=None, end=None):
+        """Booked appointments as stored from the Schedule at a Glance exports."""
+        return _parse_times(self._current(
+            'obligations', ['therapist', 'start', 'end', 'room_type', 'date', 'minutes'], therapist, start, end
+        ))
+
+    def blocks(self, therapist=None, start=None, end=None):
+        """Continuous free blocks."""
+        return _parse_times(self._current('blocks', ['therapist', 'start', 'end', 'date', 'minutes'], therapist, start, end))
+
+    def slots(self, therapist=None, start=None, end=None, duration_minutes=None):
+        """Offered individual slots."""
+        return _parse_times(self._current(
+            'slots', ['duration_minutes', 'therapist', 'start', 'end', 'date'], therapist, start, end, duration_minutes
+        ))
+
+    def couples(self, therapist=None, start=None, end=None, duration_minutes=None):
+        """Couples opportunities, one row per therapist that could take part."""
+        return _parse_times(self._current(
+            'couples', ['duration_minutes', 'therapist', 'start', 'date'], therapist, start, end, duration_minutes
+        ))
+
+    def daily_summary(self, therapist=None, start=None, end=None, duration_minutes=None, weekday=None):
+        """
+        One row per therapist and working day: scheduled, booked and free minutes
+        and the number of offered slots (of every session length unless
+        `duration_minutes` is given). 'fully_booked' marks days with a shift but no
+        slot left to offer. `weekday` ('Saturday') keeps only that day of the week.
+        """
+        shifts = self._current('shifts', ['therapist', 'date', 'minutes'], therapist, start, end)
+        if shifts.empty:
+            return pd.DataFrame(columns=['date', 'weekday', 'therapist', 'scheduled_minutes', 'booked_minutes',
+                                         'free_minutes', 'offered_slots', 'fully_booked'])
+        day = ['date', 'therapist']
+        summary = shifts.groupby(day, as_index=False)['minutes'].sum().rename(columns={'minutes': 'scheduled_minutes'})
+        for table, column in (('obligations', 'booked_minutes'), ('blocks', 'free_minutes')):
+            totals = self._current(table, ['therapist', 'date', 'minutes'], therapist, start, end)
+            totals = totals.groupby(day, as_index=False)['minutes'].sum().rename(columns={'minutes': column})
+            summary = summary.merge(totals, on=day, how='left')
+        offered = self._current('slots', ['therapist', 'date'], therapist, start, end, duration_minutes)
+        offered = offered.groupby(day).size().rename('offered_slots').reset_index()
+        summary = summary.merge(offered, on=day, how='left')
+        summary = summary.fillna({'booked_minutes': 0.0, 'free_minutes': 0.0, 'offered_slots': 0})
+        summary['offered_slots'] = summary['offered_slots'].astype(int)
+        summary['fully_booked'] = summary['offered_slots'] == 0
+        summary['date'] = pd.to_datetime(summary['date'], format=DATE_FORMAT)
+        summary.insert(1, 'weekday', summary['date'].dt.day_name())
+        if weekday is not None:
+            summary = summary[summary['weekday'].str.lower() == weekday.lower()].reset_index(drop=True)
+        return summary
+
+    def fully_booked_days(self, therapist, start=None, end=None, weekday=None, duration_minutes=None):
+        """
+        Days a therapist worked but had no slot left, e.g.
+        fully_booked_days('Jane', '2025-01-01', '2025-03-31', weekday='Saturday').
+        """
+        summary = self.daily_summary(therapist, start, end, duration_minutes, weekday)
+        return summary[summary['fully_booked']].reset_index(drop=True)
+
+
+def _parse_times(df):
+    for column in ('start', 'end'):
+        if column in df:
+            df[column] = pd.to_datetime(df[column], format='ISO8601')
+    if 'date' in df:
+        df['date'] = pd.to_datetime(df['date'], format=DATE_FORMAT)
+    return df
@@ -0,0 +1,176 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+# Admission control for report generation. Every Streamlit session runs in the
+# same server process, so concurrent "Generate Report" clicks would otherwise run
+# the availability engine and FPDF side by side. Jobs wait in one FIFO queue until
+# a concurrency slot and enough of the memory budget are free; identical jobs that
+# are already queued or running are joined instead of computed again.
+
+# Rough peak working set of one generation job, derived from its input sizes
+JOB_BASE_BYTES = 4 * 1024 * 1024
+BYTES_PER_AVAILABILITY_ROW = 16 * 1024  # per session length: blocks, slots and PDF lines
+BYTES_PER_OBLIGATION_ROW = 4 * 1024
+
+
+def estimate_job_bytes(availability_rows, obligation_rows, duration_count=1):
+    """Estimates the peak memory of one generation job from its input row counts."""
+    return (
+        JOB_BASE_BYTES
+        + availability_rows * duration_count * BYTES_PER_AVAILABILITY_ROW
+        + obligation_rows * BYTES_PER_OBLIGATION_ROW
+    )
+
+
+class _Job:
+    def __init__(self, key, estimate_bytes):
+        self.key = key
+        self.estimate_bytes = estimate_bytes
+        self.future = Future()
+        self.started_at = None
+
+
+class GenerationQueue:
+    """
+    Bounded FIFO queue that admits at most `max_concurrent` jobs at once, and only
+    while the estimated memory of the running jobs fits in `memory_budget_bytes`
+    (0 disables the memory check). A job larger than the whole budget still runs,
+    but only when nothing else is running.
+
+    Jobs run on the thread of the session that submitted them first; sessions that
+    submit an identical key meanwhile wait for and share the same result.
+    """
+
+    def __init__(self, max_concurrent=2, memory_budget_bytes=0, history=20):
+        self.max_concurrent = max(1, max_concurrent)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.running_bytes = 0
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._running = {}
+        self._in_flight = {}  # key -> _Job, queued or running
+        self._durations = deque(maxlen=history)
+
+    # --- Scheduling ---
+
+    def _admissible(self, job):
+        if not self._waiting or self._waiting[0] is not job:
+            return False
+        if len(self._running) >= self.max_concurrent:
+            return False
+        if not self._running or not self.memory_budget_bytes:
+            return True
+        return self.running_bytes + job.estimate_bytes <= self.memory_budget_bytes
+
+    def _average_duration(self):
+        return sum(self._durations) / len(self._durations) if self._durations else None
+
+    def _position(self, job):
+        """Returns (position, eta_seconds) of a job; position 0 means it is running."""
+        average = self._average_duration()
+        if job.key in self._running:
+            eta = None if average is None else max(average - (time.monotonic() - job.started_at), 0)
+            return 0, eta
+        position = list(self._waiting).index(job) + 1 if job in self._waiting else 1
+        eta = None if average is None else average * math.ceil(position / self.max_concurrent)
+        return position, eta
+
+    def _finish(self, job, succeeded):
+        with self._condition:
+            self._running.pop(job.key, None)
+            self._in_flight.pop(job.key, None)
+            self.running_bytes -= job.estimate_bytes
+            if succeeded:
+                self.completed += 1
+                self._durations.append(time.monotonic() - job.started_at)
+            else:
+                self.failed += 1
+            self._condition.notify_all()
+
+    # --- Public API ---
+
+    def run(self, key, estimate_bytes, compute, on_wait=None, poll_seconds=0.5):
+        """
+        Runs `compute()` once admitted and returns its result. While the job waits,
+        `on_wait(position, eta_seconds)` is called about every `poll_seconds` from
+        the calling thread, so it may update the UI; `eta_seconds` is None until a
+        job has completed. Exceptions raised by `compute` reach every requester.
+        """
+        with self._condition:
+            self.submitted += 1
+            job = self._in_flight.get(key)
+            owner = job is None
+            if owner:
+                job = _Job(key, estimate_bytes)
+                self._in_flight[key] = job
+                self._waiting.append(job)
+            else:
+                self.deduplicated += 1
+
+        if not owner:
+            while True:
+                try:
+                    return job.future.result(timeout=poll_seconds)
+                except FutureTimeoutError:
+                    if on_wait:
+                        with self._condition:
+                            position, eta = self._position(job)
+                        on_wait(position, eta)
+
+        try:
+            while True:
+                with self._condition:
+                    if self._admissible(job):
+                        self._waiting.popleft()
+                        self._running[key] = job
+                        self.running_bytes += job.estimate_bytes
+                        job.started_at = time.monotonic()
+                        break
+                    position, eta = self._position(job)
+                if on_wait:
+                    on_wait(position, eta)
+                with self._condition:
+                    self._condition.wait(poll_seconds)
+        except BaseException:
+            # The session stopped (rerun, disconnect) before its job was admitted
+            with self._condition:
+                if job in self._waiting:
+                    self._waiting.remove(job)
+                self._in_flight.pop(key, None)
+                self._condition.notify_all()
+            job.future.set_exception(RuntimeError("The report generation was cancelled before it started."))
+            raise
+
+        try:
+            result = compute()
+        except BaseException as e:
+            # Control-flow exceptions (a rerun of the owning session) must not leak into the others
+            job.future.set_exception(e if isinstance(e, Exception) else RuntimeError("The report generation was interrupted."))
+            self._finish(job, succeeded=False)
+            raise
+        job.future.set_result(result)
+        self._finish(job, succeeded=True)
+        return result
+
+    def stats(self):
+        """Returns a snapshot of the queue's load and counters."""
+        with self._condition:
+            average = self._average_duration()
+            return {
+                'running': len(self._running),
+                'waiting': len(self._waiting),
+                'running_mb': round(self.running_bytes / (1024 * 1024), 1),
+                'max_concurrent': self.max_concurrent,
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'completed': self.completed,
+                'failed': self.failed,
+                'average_seconds': None if average is None else round(average, 2),
+            }
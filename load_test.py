@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+
+import numpy as np
+import streamlit as st
+from streamlit import config as streamlit_config
+import streamlit.testing.v1.app_test as app_test_module
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+from streamlit.testing.v1 import AppTest
+
+from synthetic_reports import write_reports
+
+# Offline load test for app.py. Each simulated user is a headless AppTest session
+# that uploads a synthetic report pair, waits for the therapist name map, clicks
+# "Generate Report" and "Prepare PDF Download" and downloads the PDF. Sessions run
+# concurrently in one process, so they share the app's result stores and generation queue exactly as real
+# sessions on one Streamlit server do.
+#
+# Running AppTest sessions concurrently needs install_shared_runtime() to patch
+# Streamlit internals that AppTest was not written to share between threads:
+#   Runtime._instance         - AppTest installs a mock runtime around every run and
+#                               removes it afterwards, so one session's teardown pulled
+#                               the runtime (media files, caches) from under the others.
+#                               One mock runtime is installed for the whole process.
+#   app_test_module.Runtime   - replaced by a placeholder class, so AppTest's per-run
+#                               install and teardown write to it instead of the shared one.
+#   st.file_uploader          - AppTest cannot upload files, so each session's
+#                               uploaders return its synthetic report pair instead.
+#   global.appTest option     - set once; AppTest toggles it per run, which races.
+#   runner.magicEnabled       - off; magic's ast.parse can fail in CPython 3.11 when
+#                               several threads parse at once, and app.py does not use it.
+# These are private and change between releases, so the load test only runs on the
+# Streamlit minor version pinned in requirements.txt (SUPPORTED_STREAMLIT_VERSION)
+# and refuses to start on any other.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(REPO_DIR, 'app.py')
+STAGES = ('upload', 'generate', 'download')
+SUPPORTED_STREAMLIT_VERSION = (1, 49)
+
+_file_bytes = {}
+_file_lock = threading.Lock()
+
+
+class LoadTestError(Exception):
+    """A simulated session did not reach the expected state."""
+    pass
+
+
+# --- Headless session plumbing ---
+
+def _read_upload(path):
+    with _file_lock:
+        if path not in _file_bytes:
+            with open(path, 'rb') as handle:
+                _file_bytes[path] = handle.read()
+        return _file_bytes[path]
+
+def _fake_file_uploader(label, *args, key=None, **kwargs):
+    """Stands in for st.file_uploader: returns the session's synthetic file for each uploader."""
+    availability_path, schedule_path = st.session_state['load_test_files']
+    path = availability_path if 'avail' in (key or '') else schedule_path
+    return UploadedFile(
+        UploadedFileRec(path, os.path.basename(path), 'application/octet-stream', _read_upload(path)), None
+    )
+
+class _RetainingMediaStorage(MemoryMediaFileStorage):
+    """
+    Keeps every served file. All AppTest sessions share one session id, so the
+    media manager's per-session cleanup would delete files other sessions are about
+    to download. The retained PDFs are small and are counted in the peak RSS.
+    """
+
+    def delete_file(self, file_id):
+        pass
+
+def check_streamlit_version():
+    """Raises LoadTestError unless the installed Streamlit is the version the runtime patches were written for."""
+    installed = tuple(int(part) for part in st.__version__.split('.')[:2])
+    if installed != SUPPORTED_STREAMLIT_VERSION:
+        supported = '.'.join(map(str, SUPPORTED_STREAMLIT_VERSION))
+        raise LoadTestError(
+            f"The load test patches Streamlit internals and supports Streamlit {supported}.x only "
+            f"(installed: {st.__version__}). Install the version pinned in requirements.txt."
+        )
+
+def install_shared_runtime():
+    """
+    Prepares Streamlit for concurrent AppTest sessions and returns the shared media storage.
+    See the module header for why each patch is needed.
+    """
+    check_streamlit_version()
+    storage = _RetainingMediaStorage("/mock/media")
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(storage)
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    app_test_module.Runtime = type('AppTestRuntimePlaceholder', (), {'_instance': None})
+    st.file_uploader = _fake_file_uploader
+    streamlit_config.set_option('global.appTest', True)
+    streamlit_config.set_option('runner.magicEnabled', False)
+    return storage
+
+def _check(at, stage):
+    if at.exception:
+        raise LoadTestError(f"{stage}: {at.exception[0].message}")
+    if at.error:
+        raise LoadTestError(f"{stage}: {at.error[0].value}")
+
+def run_session(files, media_storage, timeout):
+    """Runs one user's upload -> generate -> download flow; returns {stage: seconds}."""
+    timings = {}
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state['load_test_files'] = files
+
+    started = time.perf_counter()
+    at.run()
+    _check(at, 'upload')
+    if not at.session_state['editable_editor_map']:
+        raise LoadTestError("upload: the therapist name map was not built.")
+    timings['upload'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    [button for button in at.button if button.label == "Generate Report"][0].click()
+    at.run()
+    _check(at, 'generate')
+    if not at.session_state['report_generated']:
+        raise LoadTestError("generate: no report was generated.")
+    timings['generate'] = time.perf_counter() - started
+
+    # The PDF is laid out on request: "Prepare PDF Download" renders it, then the
+    # download button serves it (clicking it reruns the app before the browser fetches the file)
+    started = time.perf_counter()
+    prepare_buttons = [button for button in at.button if button.label == "Prepare PDF Download"]
+    if prepare_buttons:
+        prepare_buttons[0].click()
+    at.run()
+    _check(at, 'download')
+    download_buttons = [element for element in at.get('download_button') if element.proto.label == "Download PDF Report"]
+    if not download_buttons:
+        raise LoadTestError("download: the PDF download button is missing.")
+    pdf_bytes = media_storage.get_file(os.path.basename(download_buttons[0].proto.url)).content
+    if not pdf_bytes.startswith(b'%PDF'):
+        raise LoadTestError("download: the served file is not a PDF.")
+    timings['download'] = time.perf_counter() - started
+    return timings
+
+
+# --- Load driver ---
+
+def _current_rss_mb():
+    with open('/proc/self/statm') as handle:
+        resident_pages = int(handle.read().split()[1])
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+def run_load(sessions, iterations, file_sets, timeout):
+    """
+    Runs `sessions` concurrent users, each completing `iterations` flows one after
+    another. User i uploads file_sets[i % len(file_sets)]. Returns the raw results.
+    """
+    media_storage = install_shared_runtime()
+    latencies = {stage: [] for stage in STAGES}
+    failures = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(sessions)
+
+    def user(index):
+        files = file_sets[index % len(file_sets)]
+        barrier.wait()
+        for _ in range(iterations):
+            try:
+                timings = run_session(files, media_storage, timeout)
+            except Exception as e:
+                with lock:
+                    failures.append(f"user {index}: {e}")
+                continue
+            with lock:
+                for stage, seconds in timings.items():
+                    latencies[stage].append(seconds)
+
+    rss_before_mb = _current_rss_mb()
+    threads = [threading.Thread(target=user, args=(index,), name=f"load-user-{index}") for index in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    return {
+        'sessions': sessions,
+        'iterations': iterations,
+        'wall_seconds': wall_seconds,
+        'latencies': latencies,
+        'failures': failures,
+        'rss_before_mb': rss_before_mb,
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def summarize(results):
+    """Reduces raw results to per-stage percentiles, throughput and memory."""
+    completed = len(results['latencies']['download'])
+    stages = {}
+    for stage in STAGES:
+        values = np.array(results['latencies'][stage])
+        if not len(values):
+            continue
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        stages[stage] = {
+            'count': len(values), 'p50': round(p50, 3), 'p95': round(p95, 3),
+            'p99': round(p99, 3), 'max': round(values.max(), 3),
+        }
+    return {
+        'sessions': results['sessions'],
+        'iterations': results['iterations'],
+        'completed_flows': completed,
+        'failed_flows': len(results['failures']),
+        'wall_seconds': round(results['wall_seconds'], 2),
+        'flows_per_minute': round(60 * completed / results['wall_seconds'], 1) if results['wall_seconds'] else 0.0,
+        'stages': stages,
+        'rss_before_mb': round(results['rss_before_mb'], 1),
+        'peak_rss_mb': round(results['peak_rss_mb'], 1),
+        'failures': results['failures'][:20],
+    }
+
+def print_summary(summary):
+    print(f"{summary['sessions']} concurrent sessions x {summary['iterations']} flows: "
+          f"{summary['completed_flows']} completed, {summary['failed_flows']} failed in {summary['wall_seconds']} s "
+          f"({summary['flows_per_minute']} flows/min)")
+    print(f"{'stage':<10}{'count':>7}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}{'max s':>10}")
+    for stage, row in summary['stages'].items():
+        print(f"{stage:<10}{row['count']:>7}{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}{row['max']:>10}")
+    print(f"RSS before load: {summary['rss_before_mb']} MB, peak RSS: {summary['peak_rss_mb']} MB")
+    for failure in summary['failures']:
+        print(f"FAILED {failure}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the Streamlit app with concurrent headless sessions and report latency.")
+    parser.add_argument('--sessions', type=int, default=4, help="Number of concurrent simulated users.")
+    parser.add_argument('--iterations', type=int, default=3, help="Upload -> generate -> download flows per user.")
+    parser.add_argument('--therapists', type=int, default=20, help="Therapists in each synthetic export.")
+    parser.add_argument('--days', type=int, default=7, help="Days covered by each synthetic export.")
+    parser.add_argument('--unique-files', action='store_true',
+                        help="Give every user different file contents (no shared cache hits between users).")
+    parser.add_argument('--timeout', type=float, default=120, help="Seconds allowed for one script run.")
+    parser.add_argument('--json', dest='json_path', help="Also write the summary to this JSON file.")
+    args = parser.parse_args(argv)
+    try:
+        check_streamlit_version()
+    except LoadTestError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    # The app reads config.ini and its assets relative to the repository root
+    os.chdir(REPO_DIR)
+    with tempfile.TemporaryDirectory(prefix='wellness-load-') as directory:
+        file_sets = [
+            write_reports(os.path.join(directory, f"user-{index}"), args.therapists, args.days, seed=index)
+            for index in range(args.sessions if args.unique_files else 1)
+        ]
+        summary = summarize(run_load(args.sessions, args.iterations, file_sets, args.timeout))
+
+    print_summary(summary)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as handle:
+            json.dump(summary, handle, indent=2)
+    return 1 if summary['failed_flows'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,20 @@
 import pandas as pd
+import numpy as np
+import os
 import re
 from datetime import datetime, timedelta
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Mapping
 from fpdf import FPDF
 from io import BytesIO
 from bs4 import BeautifulSoup
+from pdf_fonts import add_font_style, is_core_font
+from shared_store import content_key
 import platform
+import logging
+
+logger = logging.getLogger(__name__)
 
 # --- Section 0: Custom Exception Definitions ---
 class FileProcessingError(Exception):
@@ -19,6 +29,10 @@ class AvailabilityParsingError(FileProcessingError):
     """Exception for errors parsing the Trainer Availability report."""
     pass
 
+class ReportFormatError(FileProcessingError):
+    """Exception for uploads that are not a recognized report export."""
+    pass
+
 
 # --- Section 1: Data Ingestion Pipeline ---
 
@@ -66,13 +80,15 @@ def format_therapist_name(raw_name_string, elite_therapists=None):
     
     return f"{name}{elite_tag}{suffix}"
 
+# Columns the 'ScheduleAtAGlance' export must contain
+SCHEDULE_REQUIRED_COLUMNS = ['Date', 'Start time', 'End time', 'Description', 'Staff']
+
 def load_and_clean_schedule(file_path):
     """Loads and processes the 'ScheduleAtAGlance' report."""
     try:
         df = pd.read_excel(file_path, engine='openpyxl')
         
-        required_cols = ['Date', 'Start time', 'End time', 'Description', 'Staff']
-        missing_cols = [col for col in required_cols if col not in df.columns]
+        missing_cols = [col for col in SCHEDULE_REQUIRED_COLUMNS if col not in df.columns]
         if missing_cols:
             raise ScheduleParsingError(f"The 'ScheduleAtAGlance' report is missing the following required column(s): {', '.join(missing_cols)}.")
 
@@ -81,7 +97,7 @@ def load_and_clean_schedule(file_path):
         elite_df = df[df['Description'].str.contains("Elite Level", na=False)]
         elite_therapists = set(elite_df['Staff'].apply(normalize_name).dropna())
         
-        df = df[required_cols]
+        df = df[SCHEDULE_REQUIRED_COLUMNS]
         df.columns = ['date', 'start_time', 'end_time', 'description', 'therapist']
 
         df['therapist'] = df['therapist'].apply(normalize_name)
@@ -95,8 +111,15 @@ def load_and_clean_schedule(file_path):
 
         df.dropna(subset=['start_datetime', 'end_datetime'], inplace=True)
 
-        obligations_df = df[['therapist', 'start_datetime', 'end_datetime']].copy()
-        obligations_df.drop_duplicates(inplace=True)
+        # --- Tag the room type each obligation occupies ---
+        # Couples bookings use the dedicated couples rooms; everything else a treatment room.
+        df['room_type'] = np.where(
+            df['description'].astype(str).str.contains("Couple", case=False, na=False),
+            'couples', 'treatment'
+        )
+
+        obligations_df = df[['therapist', 'start_datetime', 'end_datetime', 'room_type']].copy()
+        obligations_df.drop_duplicates(subset=['therapist', 'start_datetime', 'end_datetime'], inplace=True)
 
         sorted_obligations = obligations_df.sort_values(by=['therapist', 'start_datetime']).reset_index(drop=True)
         
@@ -108,95 +131,308 @@ def load_and_clean_schedule(file_path):
         raise ScheduleParsingError(f"An unexpected error occurred while processing the 'ScheduleAtAGlance' report: {e}")
 
 
-def load_and_parse_availability(file_object):
+# Section-parallel parsing: each 'SCHEDULE FOR' section of the Staff Schedule
+# export is an independent table, so large exports can be split on the raw bytes
+# and parsed by a pool of worker processes. Smaller exports, and hosts with a single
+# CPU, parse serially: there the pool only adds pickling and process hand-offs.
+PARALLEL_MIN_SECTIONS = 16
+_SECTION_HEADER = re.compile(rb'<strong[^>]*>\s*schedule\s+for', re.IGNORECASE)
+_TABLE_OPEN = re.compile(rb'<table[\s>]', re.IGNORECASE)
+_section_pools = {}
+
+# Row extraction patterns, compiled once. Times keep their meridiem separately so a
+# single vectorized to_datetime call with AVAILABILITY_DATETIME_FORMAT converts them.
+_DATE_HEADER = re.compile(r'\b(Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday),\s(January|February|March|April|May|June|July|August|September|October|November|December)\s\d{1,2},\s\d{4}')
+_TIME_RANGE = re.compile(r'(\d{1,2}:\d{2})\s*(am|pm)\s*-\s*(\d{1,2}:\d{2})\s*(am|pm)', re.IGNORECASE)
+AVAILABILITY_DATETIME_FORMAT = '%A, %B %d, %Y %I:%M %p'
+
+def _parse_schedule_sections(soup):
+    """
+    Yields (therapist, display_name, dates, starts, ends) for every 'SCHEDULE FOR'
+    section of the Trainer Availability report in document order. The last three
+    are parallel lists of raw strings ('Monday, January 6, 2025', '9:00 am', ...),
+    converted in bulk by _build_availability_frame.
+    """
+    # Find all <strong> tags, which contain the staff names
+    schedule_headers = soup.find_all('strong')
+
+    for header in schedule_headers:
+        header_text = header.get_text(strip=True).upper()
+        
+        if header_text.startswith('SCHEDULE FOR'):
+            # Extract the therapist's name
+            name_part = header_text.replace('SCHEDULE FOR', '').strip()
+            current_therapist = normalize_name(name_part)
+            if not current_therapist:
+                continue # Skip entries like '*WAITLIST*' or '*LATE CANCEL*'
+
+            dates, starts, ends = [], [], []
+            # Find the parent table of the header, then find the schedule table within it
+            parent_table = header.find_parent('table')
+            schedule_table = parent_table.find('table', id='staffScheduleReport') if parent_table else None
+
+            if not schedule_table:
+                # This therapist has no schedule table (e.g., Heidi, MBO)
+                yield current_therapist, name_part.title(), dates, starts, ends
+                continue
+
+            current_date = None
+            # Process the rows within this specific therapist's schedule table
+            for row in schedule_table.find_all('tr'):
+                cells = row.find_all('td')
+                
+                # A row with a single, bolded cell is a date header
+                if len(cells) == 1 and cells[0].find('strong'):
+                    date_match = _DATE_HEADER.search(cells[0].get_text(strip=True))
+                    if date_match:
+                        current_date = date_match.group(0)
+                    continue
+
+                # A row with multiple cells is a time entry
+                if current_date and len(cells) > 2:
+                    time_text = cells[1].get_text(strip=True)
+                    description_text = cells[2].get_text(strip=True)
+                    
+                    # Only process rows marked as "Appointments"
+                    if 'Appointments' in description_text:
+                        time_match = _TIME_RANGE.search(time_text)
+                        if time_match:
+                            start_time, start_meridiem, end_time, end_meridiem = time_match.groups()
+                            dates.append(current_date)
+                            starts.append(f"{start_time} {start_meridiem}")
+                            ends.append(f"{end_time} {end_meridiem}")
+            yield current_therapist, name_part.title(), dates, starts, ends
+
+def split_schedule_sections(content):
+    """
+    Splits the raw report bytes into chunks that each start at the table enclosing a
+    'SCHEDULE FOR' header, in one pass over the bytes. The first chunk also holds
+    anything before the first section, so no header is ever dropped; a header the
+    byte scan misses simply stays in the previous chunk.
+    """
+    boundaries = []
+    for match in _SECTION_HEADER.finditer(content):
+        table_starts = [m.start() for m in _TABLE_OPEN.finditer(content, boundaries[-1] if boundaries else 0, match.start())]
+        boundary = table_starts[-1] if table_starts else match.start()
+        if not boundaries or boundary > boundaries[-1]:
+            boundaries.append(boundary)
+    if not boundaries:
+        return [content]
+    boundaries[0] = 0
+    return [content[start:end] for start, end in zip(boundaries, boundaries[1:] + [len(content)])]
+
+def _build_availability_frame(therapists, counts, dates, starts, ends):
+    """
+    Builds the availability frame from the columnar strings collected per section:
+    therapists[i] owns the next counts[i] rows. All times are converted in one
+    vectorized to_datetime call per column.
+    """
+    dates = pd.Series(dates, dtype=object) + ' '
+    return pd.DataFrame({
+        'therapist': np.repeat(np.array(therapists, dtype=object), counts),
+        'start_datetime': pd.to_datetime(dates + pd.Series(starts, dtype=object), format=AVAILABILITY_DATETIME_FORMAT).to_numpy(),
+        'end_datetime': pd.to_datetime(dates + pd.Series(ends, dtype=object), format=AVAILABILITY_DATETIME_FORMAT).to_numpy(),
+    })
+
+def _parse_section_chunk(chunk):
+    """Process-pool worker: parses one chunk of the report into section tuples."""
+    return list(_parse_schedule_sections(BeautifulSoup(chunk, 'lxml')))
+
+def _usable_cpus():
+    """CPUs this process may run on: its affinity mask where the OS has one, else os.cpu_count()."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _section_pool(workers):
+    # Pools are kept for the life of the process so repeat parses skip the worker start-up
+    if workers not in _section_pools:
+        _section_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return _section_pools[workers]
+
+def load_and_parse_availability(file_object, workers=0):
     """
     Loads and parses the 'Trainer Availability' report by navigating its
     specific HTML structure using BeautifulSoup.
+
+    With `workers` > 1 and at least PARALLEL_MIN_SECTIONS staff sections, the
+    sections are parsed by a pool of that many processes, capped at the CPUs
+    available; the result is the same. On a single CPU the pool is never used.
     """
     try:
         file_object.seek(0)
         content = file_object.read()
-        soup = BeautifulSoup(content, 'lxml')
 
-        availability_data = []
         display_name_map = {}
+        # Columnar row builder: raw strings per column, converted in bulk at the end
+        therapists, counts, dates, starts, ends = [], [], [], [], []
+
+        chunks = None
+        workers = min(workers or 0, _usable_cpus())
+        if workers > 1:
+            raw = content.encode('utf-8') if isinstance(content, str) else content
+            chunks = split_schedule_sections(raw)
+        if chunks and len(chunks) >= PARALLEL_MIN_SECTIONS:
+            sections = (
+                section
+                for chunk_sections in _section_pool(workers).map(
+                    _parse_section_chunk, chunks, chunksize=max(1, len(chunks) // (workers * 4))
+                )
+                for section in chunk_sections
+            )
+        else:
+            sections = _parse_schedule_sections(BeautifulSoup(content, 'lxml'))
+
+        for current_therapist, display_name, section_dates, section_starts, section_ends in sections:
+            # Populate the name map for later display formatting
+            if current_therapist not in display_name_map:
+                display_name_map[current_therapist] = display_name
+            therapists.append(current_therapist)
+            counts.append(len(section_dates))
+            dates.extend(section_dates)
+            starts.extend(section_starts)
+            ends.extend(section_ends)
         
-        # Find all <strong> tags, which contain the staff names
-        schedule_headers = soup.find_all('strong')
-
-        for header in schedule_headers:
-            header_text = header.get_text(strip=True).upper()
-            
-            if header_text.startswith('SCHEDULE FOR'):
-                # Extract the therapist's name
-                name_part = header_text.replace('SCHEDULE FOR', '').strip()
-                current_therapist = normalize_name(name_part)
-                if not current_therapist:
-                    continue # Skip entries like '*WAITLIST*' or '*LATE CANCEL*'
-
-                # Populate the name map for later display formatting
-                if current_therapist not in display_name_map:
-                    display_name_map[current_therapist] = name_part.title()
-
-                # Find the parent table of the header, then find the schedule table within it
-                parent_table = header.find_parent('table')
-                schedule_table = parent_table.find('table', id='staffScheduleReport')
-
-                if not schedule_table:
-                    continue # This therapist has no schedule table (e.g., Heidi, MBO)
-
-                current_date = None
-                # Process the rows within this specific therapist's schedule table
-                for row in schedule_table.find_all('tr'):
-                    cells = row.find_all('td')
-                    
-                    # A row with a single, bolded cell is a date header
-                    if len(cells) == 1 and cells[0].find('strong'):
-                        date_text = cells[0].get_text(strip=True)
-                        date_match = re.search(r'\b(Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday),\s(January|February|March|April|May|June|July|August|September|October|November|December)\s\d{1,2},\s\d{4}', date_text)
-                        if date_match:
-                            current_date = pd.to_datetime(date_match.group(0)).date()
-                        continue
-
-                    # A row with multiple cells is a time entry
-                    if current_date and len(cells) > 2:
-                        time_text = cells[1].get_text(strip=True)
-                        description_text = cells[2].get_text(strip=True)
-                        
-                        # Only process rows marked as "Appointments"
-                        if 'Appointments' in description_text:
-                            time_match = re.search(r'(\d{1,2}:\d{2}\s*(?:am|pm))\s*-\s*(\d{1,2}:\d{2}\s*(?:am|pm))', time_text, re.IGNORECASE)
-                            if time_match:
-                                start_str, end_str = time_match.groups()
-                                start_dt = datetime.combine(current_date, datetime.strptime(start_str.strip(), '%I:%M %p').time())
-                                end_dt = datetime.combine(current_date, datetime.strptime(end_str.strip(), '%I:%M %p').time())
-
-                                availability_data.append({
-                                    'therapist': current_therapist,
-                                    'start_datetime': start_dt,
-                                    'end_datetime': end_dt
-                                })
-        
-        if not availability_data:
+        if not dates:
             raise AvailabilityParsingError("Successfully read the file, but could not find any valid availability entries. Please check the file content.")
 
-        return pd.DataFrame(availability_data), display_name_map
+        return _build_availability_frame(therapists, counts, dates, starts, ends), display_name_map
     except Exception as e:
         raise AvailabilityParsingError(f"An unexpected error occurred while parsing the 'Trainer Availability' data: {e}")
 
 # --- Section 2: Availability Calculation Engine ---
 
-def calculate_availability(availability_df, obligations_df, session_duration_minutes=75):
+# --- Slot Placement Strategies ---
+# Each strategy receives one continuous free block and the shift it belongs to,
+# and returns the start times of the discrete sessions offered inside it.
+
+def place_left(block_start, block_end, shift_start, shift_end, session_duration):
+    """Packs sessions flush against the start of the block."""
+    num_sessions = (block_end - block_start) // session_duration
+    return [block_start + i * session_duration for i in range(num_sessions)]
+
+def place_right(block_start, block_end, shift_start, shift_end, session_duration):
+    """Packs sessions flush against the end of the block."""
+    num_sessions = (block_end - block_start) // session_duration
+    first_start = block_end - num_sessions * session_duration
+    return [first_start + i * session_duration for i in range(num_sessions)]
+
+def place_adjacent(block_start, block_end, shift_start, shift_end, session_duration):
+    """
+    Packs sessions against the neighbouring appointment so the leftover time
+    sits at the shift edge instead of as an unpaid gap between appointments.
+    A block bounded by the shift start and an appointment is flushed right.
+    """
+    if block_start == shift_start and block_end < shift_end:
+        return place_right(block_start, block_end, shift_start, shift_end, session_duration)
+    return place_left(block_start, block_end, shift_start, shift_end, session_duration)
+
+PLACEMENT_STRATEGIES = {
+    'left': place_left,
+    'right': place_right,
+    'adjacent': place_adjacent,
+    # 'optimized' places every block with place_left first, then optimize_slot_placement
+    # re-places the whole day across therapists.
+    'optimized': place_left,
+}
+
+def shift_free_time(day_start, day_end, day_obs):
+    """
+    Returns the continuous free blocks ({'start', 'end'} dicts) of one shift.
+
+    `day_obs` is a list of obligation dicts (with 'start_datetime' and
+    'end_datetime') overlapping the shift, sorted by start time.
+    """
+    # Merge overlapping or back-to-back obligations
+    if not day_obs:
+        merged_obs = []
+    else:
+        merged_obs = [dict(day_obs[0])]
+        for current in day_obs[1:]:
+            last = merged_obs[-1]
+            if current['start_datetime'] <= last['end_datetime']:
+                last['end_datetime'] = max(last['end_datetime'], current['end_datetime'])
+            else:
+                merged_obs.append(dict(current))
+
+    # Determine the continuous free time blocks between obligations
+    free_time = []
+    current_start = day_start
+    for obs in merged_obs:
+        if current_start < obs['start_datetime']:
+            free_time.append({'start': current_start, 'end': obs['start_datetime']})
+        current_start = obs['end_datetime']
+    if current_start < day_end:
+        free_time.append({'start': current_start, 'end': day_end})
+    return free_time
+
+def _slots_from_free_time(therapist, free_time, day_start, day_end, session_duration, place_sessions):
+    """Generates discrete slots for individual appointments from a shift's free blocks."""
+    slots = []
+    for free_block in free_time:
+        block_start = free_block['start']
+        block_end = free_block['end']
+        # Session start times come from the configured placement strategy (left by default)
+        if block_end - block_start >= session_duration:
+            for start_point in place_sessions(block_start, block_end, day_start, day_end, session_duration):
+                slots.append({
+                    'therapist': therapist,
+                    'start': start_point,
+                    'end': start_point + session_duration
+                })
+    return slots
+
+def calculate_shift_availability(therapist, day_start, day_end, day_obs, session_duration, placement_strategy='left'):
+    """
+    Computes the continuous free blocks and discrete slots for a single shift.
+
+    `day_obs` is a list of obligation dicts (with 'start_datetime' and
+    'end_datetime') overlapping the shift, sorted by start time.
+    `placement_strategy` names an entry in PLACEMENT_STRATEGIES.
+    Returns a (continuous_blocks, slots) tuple for this shift only.
+    """
+    free_time = shift_free_time(day_start, day_end, day_obs)
+
+    # First, save the entire continuous blocks for couples analysis
+    continuous_blocks = [
+        {'therapist': therapist, 'start': block['start'], 'end': block['end']}
+        for block in free_time
+        if block['end'] - block['start'] >= session_duration
+    ]
+
+    # Second, generate discrete slots for individual appointments from these blocks
+    slots = _slots_from_free_time(
+        therapist, free_time, day_start, day_end, session_duration, PLACEMENT_STRATEGIES[placement_strategy]
+    )
+    return continuous_blocks, slots
+
+def calculate_availability(availability_df, obligations_df, session_duration_minutes=75, placement_strategy='left', alignment_minutes=15):
     """
     Calculates all available slots and continuous free blocks for all therapists.
     This function serves as the core availability engine, producing two outputs:
     1. A list of continuous free time blocks for all therapists.
     2. A list of discrete, bookable slots for individual appointments.
+
+    `session_duration_minutes` may also be a list of durations (e.g. [60, 90]).
+    The free blocks are then computed once and the slots are returned as a
+    dict of {duration_minutes: slots}, derived from the same blocks in one pass.
+    `placement_strategy` selects how sessions are positioned inside each free
+    block ('left', 'right', 'adjacent' or 'optimized').
     """
-    all_slots = []
+    if placement_strategy not in PLACEMENT_STRATEGIES:
+        raise ValueError(f"Unknown slot placement strategy '{placement_strategy}'. Choose one of: {', '.join(PLACEMENT_STRATEGIES)}.")
+
+    multiple_durations = isinstance(session_duration_minutes, (list, tuple))
+    durations = list(session_duration_minutes) if multiple_durations else [session_duration_minutes]
+    if not durations:
+        raise ValueError("At least one session duration is required.")
+    session_durations = {minutes: timedelta(minutes=minutes) for minutes in durations}
+    shortest_duration = min(session_durations.values())
+    place_sessions = PLACEMENT_STRATEGIES[placement_strategy]
+
+    slots_by_duration = {minutes: [] for minutes in durations}
     all_continuous_blocks = []
     therapists = availability_df['therapist'].unique()
-    session_duration = timedelta(minutes=session_duration_minutes)
 
     for therapist in therapists:
         therapist_avail = availability_df[availability_df['therapist'] == therapist]
@@ -211,83 +447,177 @@ def calculate_availability(availability_df, obligations_df, session_duration_min
                 (therapist_obs['end_datetime'] > day_start)  # Obligation must end after the shift starts
             ].sort_values('start_datetime').to_dict('records')
 
-            # Merge overlapping or back-to-back obligations
-            if not day_obs:
-                merged_obs = []
-            else:
-                merged_obs = [day_obs[0]]
-                for current in day_obs[1:]:
-                    last = merged_obs[-1]
-                    if current['start_datetime'] <= last['end_datetime']:
-                        last['end_datetime'] = max(last['end_datetime'], current['end_datetime'])
-                    else:
-                        merged_obs.append(current)
-
-            # Determine the continuous free time blocks between obligations
-            free_time = []
-            current_start = day_start
-            for obs in merged_obs:
-                if current_start < obs['start_datetime']:
-                    free_time.append({'start': current_start, 'end': obs['start_datetime']})
-                current_start = obs['end_datetime']
-            if current_start < day_end:
-                free_time.append({'start': current_start, 'end': day_end})
-
-            # Process each continuous free block
-            for free_block in free_time:
-                block_start = free_block['start']
-                block_end = free_block['end']
-                
-                # First, save the entire continuous block for couples analysis
-                if block_end - block_start >= session_duration:
-                    all_continuous_blocks.append({
-                        'therapist': therapist,
-                        'start': block_start,
-                        'end': block_end
-                    })
-
-                # Second, generate discrete slots for individual appointments from this block
-                is_first_gap_of_day = (block_start == day_start)
-                day_has_appointments = bool(merged_obs)
-                #I used to use the stuff behind the first gap, but pattie wanted it to not flush right ever. 
-                use_flush_right_strategy = False#is_first_gap_of_day and day_has_appointments
-
-                total_free_duration = block_end - block_start
-                if total_free_duration >= session_duration:
-                    num_sessions = total_free_duration // session_duration
-                    
-                    start_point = block_start
-                    if use_flush_right_strategy:
-                        total_sessions_duration = num_sessions * session_duration
-                        start_point = block_end - total_sessions_duration
-
-                    for _ in range(num_sessions):
-                        all_slots.append({
-                            'therapist': therapist,
-                            'start': start_point,
-                            'end': start_point + session_duration
-                        })
-                        start_point += session_duration
-    
+            free_time = shift_free_time(day_start, day_end, day_obs)
+
+            # Save every block long enough for the shortest session for couples analysis
+            all_continuous_blocks.extend(
+                {'therapist': therapist, 'start': block['start'], 'end': block['end']}
+                for block in free_time
+                if block['end'] - block['start'] >= shortest_duration
+            )
+            for minutes, session_duration in session_durations.items():
+                slots_by_duration[minutes].extend(
+                    _slots_from_free_time(therapist, free_time, day_start, day_end, session_duration, place_sessions)
+                )
+
+    if placement_strategy == 'optimized':
+        shifts = list(availability_df[['therapist', 'start_datetime', 'end_datetime']].itertuples(index=False, name=None))
+        for minutes in durations:
+            slots_by_duration[minutes] = optimize_slot_placement(all_continuous_blocks, shifts, minutes, alignment_minutes)
+
+    for minutes in durations:
+        slots_by_duration[minutes] = sorted(slots_by_duration[minutes], key=lambda x: (x['therapist'], x['start']))
+
     # Return both the continuous blocks and the sorted individual slots
-    return all_continuous_blocks, sorted(all_slots, key=lambda x: (x['therapist'], x['start']))
+    if multiple_durations:
+        return all_continuous_blocks, slots_by_duration
+    return all_continuous_blocks, slots_by_duration[durations[0]]
 
 
-def find_couples_slots(continuous_blocks, obligations_df, tolerance_minutes=30, session_duration_minutes=75, min_gap_hours=1):
+def _best_session_chain(candidates, block_start, block_end, shift_start, shift_end, session_duration, partner_starts):
     """
-    Identifies overlapping slots for couples massages using a hybrid approach.
+    Weighted interval scheduling over the sorted candidate session starts of one block.
 
-    This function prioritizes "perfect matches" where therapists have discrete
-    slots starting at the exact same time. It then finds "near miss"
-    opportunities by calculating the actual intersection of two therapists'
-    continuous availability blocks.
+    Scores are compared as (sessions, couples_matches, adjacency) tuples, so the
+    number of bookable sessions is maximized first, then the number of other
+    therapists starting at the same time, then how many sessions sit flush
+    against an appointment or the previous session. Ties keep the earliest start.
     """
-    if not continuous_blocks:
-        return []
+    n = len(candidates)
+    nxt = [bisect_left(candidates, start + session_duration) for start in candidates]
+    flush_starts = {block_start} if block_start > shift_start else set()
+    if block_end < shift_end:
+        flush_starts.add(block_end - session_duration)
+
+    best = [(0, 0, 0)] * (n + 1)      # best[i]: best score using candidates[i:]
+    best_first = [None] * (n + 1)     # first chosen candidate index behind best[i]
+    take = [(0, 0, 0)] * n            # take[i]: best score with a session starting at candidates[i]
+    follow = [None] * n               # next chosen candidate index after i
+    for i in range(n - 1, -1, -1):
+        j = nxt[i]
+        rest, follow[i] = best[j], best_first[j]
+        if j < n and candidates[j] == candidates[i] + session_duration:
+            contiguous = (take[j][0], take[j][1], take[j][2] + 1)
+            if contiguous > rest:
+                rest, follow[i] = contiguous, j
+        start = candidates[i]
+        take[i] = (
+            rest[0] + 1,
+            rest[1] + partner_starts.get(start, 0),
+            rest[2] + (start in flush_starts)
+        )
+        if take[i] >= best[i + 1]:
+            best[i], best_first[i] = take[i], i
+        else:
+            best[i], best_first[i] = best[i + 1], best_first[i + 1]
 
-    final_opportunities = {}
+    chosen = []
+    i = best_first[0]
+    while i is not None:
+        chosen.append(candidates[i])
+        i = follow[i]
+    return chosen
+
+def optimize_slot_placement(continuous_blocks, shifts, session_duration_minutes=75, alignment_minutes=15):
+    """
+    Chooses where sessions sit inside every free block to maximize bookable
+    sessions and couples alignment across therapists.
+
+    Each block is solved with a dynamic program over candidate start times
+    (left/right-flush chains, the alignment grid and other therapists' starts).
+    Blocks on the same day are revisited in a couple of passes so therapists
+    converge on shared start times. Returns slots sorted like calculate_availability.
+    """
     session_duration = timedelta(minutes=session_duration_minutes)
-    conflict_gap = timedelta(hours=min_gap_hours)
+    grid = timedelta(minutes=alignment_minutes) if alignment_minutes else None
+
+    shifts_by_therapist = {}
+    for therapist, shift_start, shift_end in shifts:
+        shifts_by_therapist.setdefault(therapist, []).append((shift_start, shift_end))
+
+    # Attach each block to the shift it was carved from, grouped by calendar day
+    blocks_by_day = {}
+    for block in continuous_blocks:
+        shift_start, shift_end = next(
+            (s, e) for s, e in shifts_by_therapist.get(block['therapist'], [])
+            if s <= block['start'] and block['end'] <= e
+        )
+        blocks_by_day.setdefault(block['start'].date(), []).append(
+            (block['therapist'], block['start'], block['end'], shift_start, shift_end)
+        )
+
+    all_slots = []
+    for day_blocks in blocks_by_day.values():
+        placements = [
+            place_left(block_start, block_end, shift_start, shift_end, session_duration)
+            for _, block_start, block_end, shift_start, shift_end in day_blocks
+        ]
+        start_counts = {}
+        for (therapist, *_), starts in zip(day_blocks, placements):
+            for start in starts:
+                start_counts.setdefault(start, set()).add(therapist)
+
+        for _ in range(2):
+            for index, (therapist, block_start, block_end, shift_start, shift_end) in enumerate(day_blocks):
+                for start in placements[index]:
+                    start_counts[start].discard(therapist)
+                latest_start = block_end - session_duration
+                candidates = set(place_left(block_start, block_end, shift_start, shift_end, session_duration))
+                candidates.update(place_right(block_start, block_end, shift_start, shift_end, session_duration))
+                if grid:
+                    first = block_start + (-(block_start - datetime.combine(block_start.date(), datetime.min.time()))) % grid
+                    candidates.update(first + i * grid for i in range(int((latest_start - first) // grid) + 1))
+                candidates.update(t for t, owners in start_counts.items() if owners and block_start <= t <= latest_start)
+                partner_starts = {t: len(owners - {therapist}) for t, owners in start_counts.items() if owners}
+                placements[index] = _best_session_chain(
+                    sorted(candidates), block_start, block_end, shift_start, shift_end, session_duration, partner_starts
+                )
+                for start in placements[index]:
+                    start_counts.setdefault(start, set()).add(therapist)
+
+        for (therapist, *_), starts in zip(day_blocks, placements):
+            all_slots.extend(
+                {'therapist': therapist, 'start': start, 'end': start + session_duration} for start in starts
+            )
+
+    return sorted(all_slots, key=lambda x: (x['therapist'], x['start']))
+
+
+def _shared_windows(continuous_blocks, min_duration):
+    """
+    Intersects every pair of therapists' continuous blocks once, returning the
+    (therapist_1, therapist_2, overlap_start, overlap_end) windows that are at
+    least `min_duration` long.
+    """
+    therapist_blocks = {}
+    for block in continuous_blocks:
+        therapist = block['therapist']
+        if therapist not in therapist_blocks:
+            therapist_blocks[therapist] = []
+        therapist_blocks[therapist].append({'start': block['start'], 'end': block['end']})
+
+    therapists = list(therapist_blocks.keys())
+    windows = []
+    
+    for i in range(len(therapists)):
+        for j in range(i + 1, len(therapists)):
+            t1_name, t2_name = therapists[i], therapists[j]
+            blocks1, blocks2 = therapist_blocks[t1_name], therapist_blocks[t2_name]
+
+            for b1 in blocks1:
+                for b2 in blocks2:
+                    # Find the latest start time and earliest end time to get the shared availability window
+                    overlap_start = max(b1['start'], b2['start'])
+                    overlap_end = min(b1['end'], b2['end'])
+
+                    # Check if the shared window is long enough for at least one session
+                    if overlap_end - overlap_start >= min_duration:
+                        windows.append((t1_name, t2_name, overlap_start, overlap_end))
+    return windows
+
+def _couples_for_duration(continuous_blocks, shared_windows, session_duration, conflict_gap):
+    """Runs the perfect-match and near-miss phases for a single session duration."""
+    final_opportunities = {}
 
     # --- Preparation: Generate discrete slots from continuous blocks to find perfect matches ---
     individual_slots = []
@@ -316,50 +646,29 @@ def find_couples_slots(continuous_blocks, obligations_df, tolerance_minutes=30,
     
     perfect_match_times = set(final_opportunities.keys())
 
-    # --- Phase 2: Find "Near Miss" candidates using a true interval intersection ---
-    therapist_blocks = {}
-    for block in continuous_blocks:
-        therapist = block['therapist']
-        if therapist not in therapist_blocks:
-            therapist_blocks[therapist] = []
-        therapist_blocks[therapist].append({'start': block['start'], 'end': block['end']})
-
-    therapists = list(therapist_blocks.keys())
-    
-    for i in range(len(therapists)):
-        for j in range(i + 1, len(therapists)):
-            t1_name, t2_name = therapists[i], therapists[j]
-            blocks1, blocks2 = therapist_blocks[t1_name], therapist_blocks[t2_name]
-
-            for b1 in blocks1:
-                for b2 in blocks2:
-                    # Find the latest start time and earliest end time to get the shared availability window
-                    overlap_start = max(b1['start'], b2['start'])
-                    overlap_end = min(b1['end'], b2['end'])
-
-                    # Check if the shared window is long enough for at least one session
-                    if overlap_end - overlap_start >= session_duration:
-                        # Generate all possible slots within this shared window
-                        potential_start = overlap_start
-                        while potential_start + session_duration <= overlap_end:
-                            # This is a valid potential slot. Now, filter it.
-                            is_perfect_match = potential_start in perfect_match_times
-                            is_too_close = False
-                            if not is_perfect_match:
-                                for perfect_time in perfect_match_times:
-                                    if abs(potential_start - perfect_time) < conflict_gap:
-                                        is_too_close = True
-                                        break
-                            
-                            if not is_perfect_match and not is_too_close:
-                                print(f"DEBUG: Near Miss ADDED! Therapists: {t1_name.title()}, {t2_name.title()}. Aligned Start: {potential_start.strftime('%Y-%m-%d %I:%M %p')}")
-                                if potential_start not in final_opportunities:
-                                    final_opportunities[potential_start] = set()
-                                final_opportunities[potential_start].add(t1_name)
-                                final_opportunities[potential_start].add(t2_name)
-                            
-                            # Move to the next potential start time
-                            potential_start += session_duration
+    # --- Phase 2: Find "Near Miss" candidates within the shared availability windows ---
+    for t1_name, t2_name, overlap_start, overlap_end in shared_windows:
+        # Generate all possible slots within this shared window
+        potential_start = overlap_start
+        while potential_start + session_duration <= overlap_end:
+            # This is a valid potential slot. Now, filter it.
+            is_perfect_match = potential_start in perfect_match_times
+            is_too_close = False
+            if not is_perfect_match:
+                for perfect_time in perfect_match_times:
+                    if abs(potential_start - perfect_time) < conflict_gap:
+                        is_too_close = True
+                        break
+            
+            if not is_perfect_match and not is_too_close:
+                logger.debug("Near miss added: %s, %s at %s", t1_name.title(), t2_name.title(), potential_start.strftime('%Y-%m-%d %I:%M %p'))
+                if potential_start not in final_opportunities:
+                    final_opportunities[potential_start] = set()
+                final_opportunities[potential_start].add(t1_name)
+                final_opportunities[potential_start].add(t2_name)
+            
+            # Move to the next potential start time
+            potential_start += session_duration
 
     # --- Phase 4: Format final results ---
     final_list = []
@@ -371,14 +680,331 @@ def find_couples_slots(continuous_blocks, obligations_df, tolerance_minutes=30,
             })
 
     return sorted(final_list, key=lambda x: x['start'])
+
+def find_couples_slots(continuous_blocks, obligations_df, tolerance_minutes=30, session_duration_minutes=75, min_gap_hours=1):
+    """
+    Identifies overlapping slots for couples massages using a hybrid approach.
+
+    This function prioritizes "perfect matches" where therapists have discrete
+    slots starting at the exact same time. It then finds "near miss"
+    opportunities by calculating the actual intersection of two therapists'
+    continuous availability blocks.
+
+    `session_duration_minutes` may also be a list of durations, in which case the
+    block intersections are computed once and a dict of {duration_minutes:
+    couples_slots} is returned.
+    """
+    multiple_durations = isinstance(session_duration_minutes, (list, tuple))
+    durations = list(session_duration_minutes) if multiple_durations else [session_duration_minutes]
+
+    if not continuous_blocks:
+        return {minutes: [] for minutes in durations} if multiple_durations else []
+
+    conflict_gap = timedelta(hours=min_gap_hours)
+    shared_windows = _shared_windows(continuous_blocks, timedelta(minutes=min(durations)))
+
+    couples_by_duration = {
+        minutes: _couples_for_duration(continuous_blocks, shared_windows, timedelta(minutes=minutes), conflict_gap)
+        for minutes in durations
+    }
+    if multiple_durations:
+        return couples_by_duration
+    return couples_by_duration[durations[0]]
+
+
+# --- Room & Resource Capacity ---
+
+def _to_minutes(values):
+    """Converts a sequence of datetimes to an int64 array of epoch minutes."""
+    return pd.to_datetime(pd.Series(values, dtype=object)).values.astype('datetime64[m]').astype(np.int64)
+
+def build_room_occupancy(obligations_df):
+    """
+    Derives room usage over time from the ScheduleAtAGlance obligations.
+
+    Returns a dict of {room_type: (starts, ends)} with epoch-minute arrays, one
+    entry per occupied room. Couples obligations booked by two therapists for
+    the same time window share a single couples room.
+    """
+    if obligations_df is None or obligations_df.empty:
+        return {}
+
+    obs = obligations_df
+    if 'room_type' not in obs.columns:
+        obs = obs.assign(room_type='treatment')
+
+    occupancy = {}
+    for room_type, group in obs.groupby('room_type', sort=False):
+        starts = _to_minutes(group['start_datetime'])
+        ends = _to_minutes(group['end_datetime'])
+        if room_type == 'couples':
+            # Two therapists per room: count distinct windows, rounding odd counts up.
+            windows, counts = np.unique(np.stack([starts, ends], axis=1), axis=0, return_counts=True)
+            rooms_needed = (counts + 1) // 2
+            starts = np.repeat(windows[:, 0], rooms_needed)
+            ends = np.repeat(windows[:, 1], rooms_needed)
+        occupancy[room_type] = (starts, ends)
+    return occupancy
+
+def _accept_within_capacity(starts, ends, occupied, room_count, owners=None):
+    """
+    Greedy sweep that accepts candidate intervals (in the given order) while a
+    room of this type remains free for their whole duration.
+
+    With `owners` (one therapist per candidate, candidates sorted by start),
+    candidates starting at the same time are taken fairly instead of in the given
+    order: the owner with the fewest candidates accepted so far that day goes
+    first, and owners still tied take turns, their order (by name) rotating by one
+    place each day. Both depend only on the candidates of that day, so capping a
+    horizon in one call gives the same result as capping it one date at a time.
+
+    Time is split into elementary intervals at every start/end point; occupied
+    and accepted rooms are tracked as per-interval counters, so each candidate
+    only touches the intervals it covers.
+    """
+    occ_starts, occ_ends = occupied
+    grid = np.unique(np.concatenate([starts, ends, occ_starts, occ_ends]))
+
+    # Occupancy per elementary interval via a difference array and cumulative sum
+    diff = np.zeros(len(grid) + 1, dtype=np.int64)
+    np.add.at(diff, np.searchsorted(grid, occ_starts), 1)
+    np.add.at(diff, np.searchsorted(grid, occ_ends), -1)
+    free = room_count - np.cumsum(diff)[:-1]
+
+    first = np.searchsorted(grid, starts)
+    last = np.searchsorted(grid, ends)
+    accepted = np.zeros(len(starts), dtype=bool)
+
+    def take(i):
+        window = free[first[i]:last[i]]
+        if window.size and window.min() > 0:
+            window -= 1
+            accepted[i] = True
+
+    if owners is None:
+        for i in range(len(starts)):
+            take(i)
+        return accepted
+
+    owner_codes, owner_names = pd.factorize(pd.Series(owners), sort=True)
+    accepted_count = np.zeros(len(owner_names), dtype=np.int64)
+    current_day = None
+    group_starts = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+    for group_start, group_end in zip(group_starts, np.r_[group_starts[1:], len(starts)]):
+        day = starts[group_start] // 1440
+        if day != current_day:
+            accepted_count[:] = 0
+            current_day = day
+        codes = owner_codes[group_start:group_end]
+        rank = np.argsort(np.argsort(codes, kind='stable'), kind='stable')
+        rotation = (rank - day) % len(codes)
+        for i in group_start + np.lexsort((rotation, accepted_count[codes])):
+            take(i)
+            accepted_count[owner_codes[i]] += accepted[i]
+    return accepted
+
+def apply_room_capacity(individual_slots, couples_slots, obligations_df, room_counts, session_duration_minutes=75):
+    """
+    Caps offered individual and couples slots by the free room capacity at each time.
+
+    `room_counts` maps a room type ('treatment', 'couples') to the number of rooms
+    of that type on site; a missing or zero count leaves that type unconstrained.
+    Every obligation not tagged as a couples booking holds a treatment room for its
+    whole length, breaks and other non-client entries included, since the
+    ScheduleAtAGlance export does not say which of them use a room.
+
+    Slots are accepted earliest first, so every offer returned can be booked
+    alongside all the others without exceeding the rooms available. When more
+    slots start together than rooms are free, the therapist (or couples pair)
+    with the fewest slots accepted so far that day is offered first, and ties
+    rotate by day (see _accept_within_capacity), so the cut is spread evenly
+    instead of always falling on the same names. The tie-break looks at one day
+    at a time, so the booking simulator, which caps each date separately, offers
+    the same slots as the report.
+    """
+    room_counts = room_counts or {}
+    occupancy = build_room_occupancy(obligations_df)
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    session_minutes = np.int64(session_duration_minutes)
+
+    def cap(slots, room_type, owner):
+        rooms = room_counts.get(room_type, 0)
+        if not rooms or not slots:
+            return slots
+        ordered = sorted(slots, key=lambda x: x['start'])
+        starts = _to_minutes([slot['start'] for slot in ordered])
+        if all('end' in slot for slot in ordered):
+            ends = _to_minutes([slot['end'] for slot in ordered])
+        else:
+            ends = starts + session_minutes
+        owners = [owner(slot) for slot in ordered]
+        accepted = _accept_within_capacity(starts, ends, occupancy.get(room_type, empty), rooms, owners)
+        return [slot for slot, keep in zip(ordered, accepted) if keep]
+
+    capped_individual = cap(individual_slots, 'treatment', lambda x: x['therapist'])
+    capped_couples = cap(couples_slots, 'couples', lambda x: ', '.join(x['therapists']))
+
+    return (
+        sorted(capped_individual, key=lambda x: (x['therapist'], x['start'])),
+        sorted(capped_couples, key=lambda x: x['start'])
+    )
+
+# --- Report Pipeline ---
+
+def compute_report_slots(availability_df, obligations_df, session_durations, placement_strategy='left', alignment_minutes=15,
+                         tolerance_minutes=30, room_counts=None, room_obligations_df=None):
+    """
+    Runs the availability, couples and room-capacity engines for one report.
+
+    `session_durations` is one session length or a list of them; a list of several
+    shares one pass and returns {minutes: slots} mappings. Rooms are capped by the
+    appointments in `room_obligations_df`, which defaults to `obligations_df`.
+    Returns (continuous_blocks, individual_slots, couples_slots).
+    """
+    durations = list(session_durations) if isinstance(session_durations, (list, tuple)) else [session_durations]
+    durations_arg = durations if len(durations) > 1 else durations[0]
+    if room_obligations_df is None:
+        room_obligations_df = obligations_df
+
+    continuous_blocks, individual_slots = calculate_availability(
+        availability_df,
+        obligations_df,
+        session_duration_minutes=durations_arg,
+        placement_strategy=placement_strategy,
+        alignment_minutes=alignment_minutes
+    )
+    couples_slots = find_couples_slots(
+        continuous_blocks,
+        obligations_df,
+        tolerance_minutes=tolerance_minutes,
+        session_duration_minutes=durations_arg
+    )
+
+    # Cap offered slots by the rooms actually free at each time
+    if isinstance(individual_slots, dict):
+        for minutes in durations:
+            individual_slots[minutes], couples_slots[minutes] = apply_room_capacity(
+                individual_slots[minutes], couples_slots[minutes], room_obligations_df,
+                room_counts, session_duration_minutes=minutes
+            )
+    else:
+        individual_slots, couples_slots = apply_room_capacity(
+            individual_slots, couples_slots, room_obligations_df,
+            room_counts, session_duration_minutes=durations_arg
+        )
+    return continuous_blocks, individual_slots, couples_slots
+
+def report_run_key(availability_bytes, schedule_bytes, session_durations, placement_strategy, data_fixes, config):
+    """
+    Content key of a computed report: both uploaded files plus every option that
+    changes the slots. The app's shared store and the history database both use it,
+    so a week generated in the app and by the batch CLI is recognised as the same run.
+    """
+    return content_key(
+        'report_slots',
+        availability_bytes,
+        schedule_bytes,
+        tuple(session_durations),
+        placement_strategy,
+        data_fixes,
+        config['tolerance_minutes'],
+        config['slot_alignment_minutes'],
+        sorted(config['room_counts'].items())
+    )
+
+
 # --- Section 3: PDF Report Generation Module ---
 
+# --- Shared Report Layout Helpers ---
+# Used by AvailabilityPDF and the exporters so every output groups, sorts and
+# names therapists the same way.
+
+def format_slot_time(timestamp):
+    """Formats a slot start as it appears on the report (e.g. '2:00 pm')."""
+    return timestamp.strftime('%I:%M %p').lstrip('0').lower()
+
+def format_day_heading(date):
+    """Formats a date as a report day heading (e.g. 'Monday, January 6')."""
+    if platform.system() == 'Windows':
+        return date.strftime('%A, %B %#d')
+    return date.strftime('%A, %B %-d')
+
+def display_name_for(name_map, therapist_key):
+    return name_map.get(therapist_key, therapist_key.title())
+
+def iter_report_sections(individual_slots, couples_slots):
+    """
+    Yields (duration_minutes, individual_slots, couples_slots) per report section.
+    Single-duration input yields one section with a duration of None.
+    """
+    if isinstance(individual_slots, Mapping):
+        for minutes in individual_slots:
+            yield minutes, individual_slots[minutes], couples_slots.get(minutes, [])
+    else:
+        yield None, individual_slots, couples_slots
+
+def group_slots_by_date(individual_slots):
+    """Returns [(date, slots_for_day), ...] in date order."""
+    slots_by_date = {}
+    for slot in individual_slots:
+        date = slot['start'].date()
+        if date not in slots_by_date:
+            slots_by_date[date] = []
+        slots_by_date[date].append(slot)
+    return [(date, slots_by_date[date]) for date in sorted(slots_by_date.keys())]
+
+def group_day_by_therapist(slots_for_day, sort_order="Alphabetical"):
+    """
+    Groups one day's slots by therapist, ordered per `sort_order`.
+    Returns [(therapist_key, slots sorted by time of day), ...].
+    """
+    therapist_slots = {}
+    for slot in slots_for_day:
+        therapist_key = slot['therapist']
+        if therapist_key not in therapist_slots:
+            therapist_slots[therapist_key] = []
+        therapist_slots[therapist_key].append(slot)
+
+    for therapist_key in therapist_slots:
+        therapist_slots[therapist_key].sort(key=lambda slot: slot['start'].time())
+
+    # --- Sorting Logic Implementation ---
+    therapist_items = therapist_slots.items()
+    if sort_order == "By First Availability":
+        return sorted(therapist_items, key=lambda item: item[1][0]['start'].time())
+    # Default to Alphabetical
+    return sorted(therapist_items, key=lambda item: item[0])
+
+def group_couples_by_day(couples_slots):
+    """
+    Groups couples opportunities by weekday name, keeping each time once.
+    Returns {day_name: [start, ...]} with starts sorted by time of day.
+    """
+    slots_by_day = {}
+    for slot in couples_slots:
+        day_str = slot['start'].strftime('%A')
+        if day_str not in slots_by_day:
+            slots_by_day[day_str] = {}
+        time_str = format_slot_time(slot['start'])
+        if time_str not in slots_by_day[day_str]:
+            slots_by_day[day_str][time_str] = slot['start']
+    return {
+        day: sorted(starts.values(), key=lambda start: start.time())
+        for day, starts in slots_by_day.items()
+    }
+
 class AvailabilityPDF(FPDF):
     def __init__(self, settings, name_map):
         super().__init__()
         self.settings = settings
         self.name_map = name_map
 
+    def set_font(self, family=None, style='', size=0):
+        """FPDF.set_font() that registers custom font families on first use."""
+        if family and not is_core_font(family):
+            add_font_style(self, family, style)
+        super().set_font(family, style, size)
+
     def _apply_style(self, style_key):
         """Helper function to apply font, style, size, and color from settings."""
         style = self.settings.get(style_key, {})
@@ -389,7 +1015,10 @@ class AvailabilityPDF(FPDF):
         font_family = style.get('font_family', 'Helvetica')
 
         # The set_font() method handles core PDF fonts (like Helvetica, Times, Courier)
-        # automatically. The previous, problematic call to add_font() has been removed.
+        # automatically. Custom families come from the fonts directory through the
+        # process-wide parsed-font cache; a family without font files falls back to Helvetica.
+        if not is_core_font(font_family) and not add_font_style(self, font_family, font_style):
+            font_family = 'Helvetica'
         self.set_font(font_family, style=font_style, size=style.get('font_size', 12))
         
         hex_color = style.get('color_hex', '#000000').lstrip('#')
@@ -404,6 +1033,11 @@ class AvailabilityPDF(FPDF):
     def footer(self):
         pass
 
+    def add_duration_heading(self, minutes):
+        self._apply_style('title')
+        self.cell(0, 10, f"{minutes}-Minute Sessions", 0, 1, 'C')
+        self.ln(2)
+
     def add_couples_section(self, couples_slots):
         self._apply_style('couples_header')
         self.cell(0, 10, "Available Times for Couple's Massages", 0, 1, 'C')
@@ -412,14 +1046,7 @@ class AvailabilityPDF(FPDF):
             self._apply_style('couples_body')
             self.cell(0, 10, "  No couples massage opportunities found for this period.", 0, 1, 'C')
         else:
-            slots_by_day = {}
-            for slot in couples_slots:
-                day_str = slot['start'].strftime('%A')
-                if day_str not in slots_by_day:
-                    slots_by_day[day_str] = []
-                time_str = slot['start'].strftime('%I:%M %p').lstrip('0').lower()
-                if time_str not in slots_by_day[day_str]:
-                    slots_by_day[day_str].append(time_str)
+            slots_by_day = group_couples_by_day(couples_slots)
 
             for day, times in slots_by_day.items():
                 # Apply base style once
@@ -431,8 +1058,7 @@ class AvailabilityPDF(FPDF):
 
                 # Prepare text parts
                 day_text = f"{day}: "
-                sorted_times = sorted(times, key=lambda x: datetime.strptime(x, '%I:%M %p'))
-                times_str = ', '.join(sorted_times)
+                times_str = ', '.join(format_slot_time(start) for start in times)
 
                 # Calculate widths of bold and regular parts
                 self.set_font(family, 'B', size)
@@ -464,10 +1090,7 @@ class AvailabilityPDF(FPDF):
 
     def add_daily_availability(self, date, slots_for_day, sort_order="Alphabetical"):
         self._apply_style('day_of_week')
-        if platform.system() == 'Windows':
-            day_str = date.strftime('%A, %B %#d')
-        else:
-            day_str = date.strftime('%A, %B %-d')
+        day_str = format_day_heading(date)
         self.cell(0, 10, day_str, 0, 1, 'C')
 
         if not slots_for_day:
@@ -476,27 +1099,10 @@ class AvailabilityPDF(FPDF):
             self.cell(0, 8, "  No availability.", 0, 1, 'C')
             return
 
-        therapist_slots = {}
-        for slot in slots_for_day:
-            therapist_key = slot['therapist']
-            if therapist_key not in therapist_slots:
-                therapist_slots[therapist_key] = []
-            time_str = slot['start'].strftime('%I:%M %p').lstrip('0').lower()
-            therapist_slots[therapist_key].append(time_str)
-
-        # --- Sorting Logic Implementation ---
-        therapist_items = therapist_slots.items()
-        if sort_order == "By First Availability":
-            sorted_items = sorted(therapist_items, key=lambda item: datetime.strptime(
-                sorted(item[1], key=lambda t: datetime.strptime(t, '%I:%M %p'))[0], '%I:%M %p'
-            ))
-        else:  # Default to Alphabetical
-            sorted_items = sorted(therapist_items)
-        
-        for therapist_key, times in sorted_items:
-            times_str = ', '.join(sorted(times, key=lambda x: datetime.strptime(x, '%I:%M %p')))
+        for therapist_key, slots in group_day_by_therapist(slots_for_day, sort_order):
+            times_str = ', '.join(format_slot_time(slot['start']) for slot in slots)
             
-            display_name = self.name_map.get(therapist_key, therapist_key.title())
+            display_name = display_name_for(self.name_map, therapist_key)
             
             self._apply_style('therapist')
             self.cell(0, 8, f"{display_name}", 0, 1, 'C')
@@ -505,8 +1111,20 @@ class AvailabilityPDF(FPDF):
             self.cell(0, 8, times_str, 0, 1, 'C')
         self.ln(2)
 
+def _add_report_body(pdf, individual_slots, couples_slots, sort_order):
+    """Writes the couples section followed by each day's availability."""
+    pdf.add_couples_section(couples_slots)
+
+    for date, slots_for_day in group_slots_by_date(individual_slots):
+        pdf.add_daily_availability(date, slots_for_day, sort_order)
+
 def generate_pdf_report(individual_slots, couples_slots, name_map, settings, sort_order):
-    """Generates the final PDF report in memory."""
+    """
+    Generates the final PDF report in memory.
+
+    When the slots are dicts of {duration_minutes: slots} (see calculate_availability),
+    the report contains one section per session length.
+    """
     pdf = AvailabilityPDF(settings, name_map)
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
@@ -515,18 +1133,13 @@ def generate_pdf_report(individual_slots, couples_slots, name_map, settings, sor
     pdf.cell(0, 10, 'Therapist Availability', 0, 1, 'C') 
     pdf.ln(5)
 
-    pdf.add_couples_section(couples_slots)
-
-    slots_by_date = {}
-    for slot in individual_slots:
-        date = slot['start'].date()
-        if date not in slots_by_date:
-            slots_by_date[date] = []
-        slots_by_date[date].append(slot)
-
-    sorted_dates = sorted(slots_by_date.keys())
-    for date in sorted_dates:
-        pdf.add_daily_availability(date, slots_by_date[date], sort_order)
+    sections = iter_report_sections(individual_slots, couples_slots)
+    for index, (minutes, section_slots, section_couples) in enumerate(sections):
+        if minutes is not None:
+            if index > 0:
+                pdf.add_page()
+            pdf.add_duration_heading(minutes)
+        _add_report_body(pdf, section_slots, section_couples, sort_order)
 
     # Output to a bytes buffer
     pdf_buffer = BytesIO(pdf.output())
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+from logic import compute_report_slots
+
+# Multi-location reports. Every site exports its own report pair, but a therapist
+# who works at several sites can only be booked at one of them at a time. All
+# sites' appointments are merged into one per-therapist index of busy intervals
+# (a single sort over every row, then a running-max merge), and each site's
+# shifts are run through the engines against that shared index, so time booked
+# at one site is never offered at another. Room capacity stays per site.
+
+# conflict -> description
+CONFLICTS = {
+    'shift_overlap': "Scheduled at two sites at the same time",
+    'double_booked': "Booked at two sites at the same time",
+}
+
+CONFLICT_COLUMNS = ['conflict', 'therapist', 'site', 'start', 'end', 'other_site', 'other_start', 'other_end']
+
+
+def combine_sites(sites):
+    """
+    Stacks the frames of every site into one frame per kind with a 'site' column.
+    `sites` maps a site name to its (availability_df, obligations_df).
+    Returns (shifts, obligations).
+    """
+    shifts = [availability_df.assign(site=site) for site, (availability_df, _) in sites.items()]
+    obligations = [obligations_df.assign(site=site) for site, (_, obligations_df) in sites.items()]
+    return pd.concat(shifts, ignore_index=True), pd.concat(obligations, ignore_index=True)
+
+def _merge_runs(intervals, keys):
+    """
+    Collapses overlapping or back-to-back intervals sharing `keys` into their union.
+    Rows are sorted once by keys and start; a row starts a new run when it begins
+    after every earlier interval of its group has ended.
+    """
+    ordered = intervals.sort_values(keys + ['start_datetime'], kind='stable')
+    previous_end = ordered.groupby(keys, sort=False)['end_datetime'].cummax()
+    previous_end = previous_end.groupby([ordered[key] for key in keys], sort=False).shift()
+    run = np.cumsum(~(ordered['start_datetime'] <= previous_end).to_numpy())
+    aggregations = {key: (key, 'first') for key in keys}
+    return ordered.groupby(run, sort=False).agg(
+        **aggregations,
+        start_datetime=('start_datetime', 'min'),
+        end_datetime=('end_datetime', 'max'),
+    ).reset_index(drop=True)
+
+def merged_busy_index(obligations):
+    """
+    The busy intervals of every therapist across all sites, as disjoint
+    (therapist, start_datetime, end_datetime) rows sorted by therapist and start.
+    """
+    return _merge_runs(obligations[['therapist', 'start_datetime', 'end_datetime']], ['therapist'])
+
+def _cross_site_overlaps(intervals, conflict):
+    """
+    Flags intervals that overlap an interval of the same therapist at another site.
+
+    Each site's intervals are first merged per therapist, so overlaps left after
+    sorting all sites together are between sites. A row overlaps an earlier one
+    when it starts before the running maximum end of its therapist's earlier
+    rows; the row holding that maximum is reported as the other side.
+    """
+    merged = _merge_runs(intervals[['therapist', 'site', 'start_datetime', 'end_datetime']], ['therapist', 'site'])
+    merged = merged.sort_values(['therapist', 'start_datetime'], kind='stable', ignore_index=True)
+    by_therapist = merged.groupby('therapist', sort=False)
+
+    running_end = by_therapist['end_datetime'].cummax()
+    holds_max = merged['end_datetime'] >= running_end
+    # Site and bounds of the row holding the running maximum, carried forward
+    holder = merged[['site', 'start_datetime', 'end_datetime']].where(holds_max).groupby(merged['therapist'], sort=False).ffill()
+    previous = holder.groupby(merged['therapist'], sort=False).shift()
+
+    overlapping = (merged['start_datetime'] < previous['end_datetime']) & (merged['site'] != previous['site'])
+    flagged = merged.loc[overlapping]
+    other = previous.loc[overlapping]
+    return pd.DataFrame({
+        'conflict': conflict,
+        'therapist': flagged['therapist'].to_numpy(),
+        'site': flagged['site'].to_numpy(),
+        'start': flagged['start_datetime'].to_numpy(),
+        'end': flagged['end_datetime'].to_numpy(),
+        'other_site': other['site'].to_numpy(),
+        'other_start': other['start_datetime'].to_numpy(),
+        'other_end': other['end_datetime'].to_numpy(),
+    }, columns=CONFLICT_COLUMNS)
+
+def find_cross_site_conflicts(shifts, obligations):
+    """
+    Therapists scheduled or booked at two sites at once, from the combined frames
+    of combine_sites(). Returns one row per conflict with CONFLICT_COLUMNS; the
+    'conflict' column keys into CONFLICTS.
+    """
+    return pd.concat([
+        _cross_site_overlaps(shifts, 'shift_overlap'),
+        _cross_site_overlaps(obligations, 'double_booked'),
+    ], ignore_index=True)
+
+def calculate_site_availability(sites, session_duration_minutes=75, placement_strategy='left', alignment_minutes=15,
+                                tolerance_minutes=30, room_counts=None):
+    """
+    Runs the availability, couples and room-capacity engines for every site against
+    the merged busy index of all sites.
+
+    `sites` maps a site name to its cleaned (availability_df, obligations_df).
+    Returns ({site: {'continuous_blocks', 'individual_slots', 'couples_slots'}}, conflicts),
+    where the slots have the shapes compute_report_slots returns for
+    `session_duration_minutes`. Rooms are capped by each site's own
+    appointments, with the same `room_counts` at every site.
+    """
+    shifts, obligations = combine_sites(sites)
+    busy = merged_busy_index(obligations)
+
+    results = {}
+    for site, (availability_df, obligations_df) in sites.items():
+        site_busy = busy.loc[busy['therapist'].isin(availability_df['therapist'].unique())]
+        continuous_blocks, individual_slots, couples_slots = compute_report_slots(
+            availability_df,
+            site_busy,
+            session_duration_minutes,
+            placement_strategy=placement_strategy,
+            alignment_minutes=alignment_minutes,
+            tolerance_minutes=tolerance_minutes,
+            room_counts=room_counts,
+            room_obligations_df=obligations_df
+        )
+        results[site] = {
+            'continuous_blocks': continuous_blocks,
+            'individual_slots': individual_slots,
+            'couples_slots': couples_slots,
+        }
+    return results, find_cross_site_conflicts(shifts, obligations)
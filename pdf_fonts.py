@@ -0,0 +1,134 @@
+import copy
+import os
+import threading
+from io import BytesIO
+from types import SimpleNamespace
+
+from fontTools import ttLib
+from fpdf.enums import TextEmphasis
+from fpdf.fonts import CORE_FONTS, SubsetMap, TTFFont
+
+# Custom TrueType/OpenType fonts for the PDF report. Font files are read from
+# FONTS_DIR and parsed once per process: the parsed metrics (character widths,
+# glyph ids, descriptor) are kept in a process-wide cache and shared by every
+# document, which only gets its own lazily opened copy of the font file for
+# subsetting (fpdf2 subsets a document's font object in place when it writes the
+# PDF). Threads share the cache; each worker process fills its own on first use.
+#
+# A family is named after its files: 'Lato-Regular.ttf', 'Lato-Bold.ttf',
+# 'Lato-Italic.ttf' and 'Lato-BoldItalic.ttf' make the family 'Lato'. A file
+# without a style suffix ('Brand.ttf') is a family of its own. Styles a family
+# has no file for fall back to its bold or regular file. Names are matched
+# without regard to case.
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
+FONT_EXTENSIONS = ('.ttf', '.otf')
+
+# Built-in PDF fonts offered next to the custom families
+CORE_FAMILIES = ['Helvetica', 'Times', 'Courier']
+
+STYLE_SUFFIXES = {
+    'regular': '',
+    'bold': 'B',
+    'italic': 'I',
+    'oblique': 'I',
+    'regularitalic': 'I',
+    'bolditalic': 'BI',
+    'boldoblique': 'BI',
+}
+
+# Parsed attributes every document can share; they are only read while rendering.
+# The font descriptor is a PDF object numbered on output, so each font copies it.
+_SHARED_ATTRIBUTES = ('type', 'ttffile', 'scale', 'cw', 'cmap', 'glyph_ids', 'name', 'up', 'ut', 'sp', 'ss')
+
+_parsed_fonts = {}  # (path, mtime_ns, size) -> (TTFFont, font file bytes)
+_parsed_fonts_lock = threading.Lock()
+
+
+def is_core_font(family):
+    """True for the fonts built into every PDF reader (Helvetica, Times, Courier, ...)."""
+    family = (family or '').lower()
+    return family in CORE_FONTS or family == 'arial'
+
+def find_font_families(fonts_dir=FONTS_DIR):
+    """
+    Scans `fonts_dir` for font files.
+    Returns {family: {style: path}} with styles '', 'B', 'I' and 'BI'.
+    """
+    if not os.path.isdir(fonts_dir):
+        return {}
+    families = {}
+    for file_name in sorted(os.listdir(fonts_dir)):
+        stem, extension = os.path.splitext(file_name)
+        if extension.lower() not in FONT_EXTENSIONS:
+            continue
+        family, _, suffix = stem.rpartition('-')
+        style = STYLE_SUFFIXES.get(suffix.lower()) if family else None
+        if style is None:
+            family, style = stem, ''
+        families.setdefault(family, {})[style] = os.path.join(fonts_dir, file_name)
+    return families
+
+def available_font_families(fonts_dir=FONTS_DIR):
+    """Font family names for the style settings: the core fonts, then the custom families."""
+    return CORE_FAMILIES + [family for family in find_font_families(fonts_dir) if not is_core_font(family)]
+
+def parsed_font(path):
+    """
+    Returns (TTFFont, font file bytes) for a font file, parsing it only the first
+    time in this process (or after the file changed).
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _parsed_fonts_lock:
+        cached = _parsed_fonts.get(key)
+        if cached is None:
+            with open(path, 'rb') as handle:
+                data = handle.read()
+            # TTFFont only reads the document's font count, for its index. It is
+            # parsed from memory so no file handle stays open.
+            font = TTFFont(SimpleNamespace(fonts={}), BytesIO(data), os.path.basename(path), '')
+            font.ttffile = path
+            font.close()
+            cached = _parsed_fonts[key] = (font, data)
+    return cached
+
+def clear_font_cache():
+    """Forgets every parsed font."""
+    with _parsed_fonts_lock:
+        _parsed_fonts.clear()
+
+def _document_font(pdf, path, fontkey, style):
+    """A TTFFont for one document, sharing the cached parse of `path`."""
+    parsed, data = parsed_font(path)
+    font = TTFFont.__new__(TTFFont)
+    for attribute in _SHARED_ATTRIBUTES:
+        setattr(font, attribute, getattr(parsed, attribute))
+    font.i = len(pdf.fonts) + 1
+    font.fontkey = fontkey
+    font.desc = copy.copy(parsed.desc)
+    font.emphasis = TextEmphasis.coerce(style)
+    font.ttfont = ttLib.TTFont(BytesIO(data), recalcTimestamp=False, fontNumber=0, lazy=True)
+    font.missing_glyphs = []
+    font.subset = SubsetMap(font)
+    return font
+
+def add_font_style(pdf, family, style='', fonts_dir=FONTS_DIR):
+    """
+    Makes one style of a custom family from `fonts_dir` available to pdf.set_font().
+    Only styles a document actually uses are registered, as fpdf2 embeds every
+    registered font. Returns False, without changing the document, when the family
+    has no font files.
+    """
+    # Underline and strike-through are drawn by fpdf2; only bold and italic need a file
+    style = ''.join(letter for letter in 'BI' if letter in TextEmphasis.coerce(style).style)
+    fontkey = f"{family.lower()}{style}"
+    if fontkey in pdf.fonts:
+        return True
+    families = {name.lower(): styles for name, styles in find_font_families(fonts_dir).items()}
+    styles = families.get(family.lower())
+    if not styles:
+        return False
+    path = styles.get(style) or styles.get(style[:1]) or styles.get('') or next(iter(styles.values()))
+    pdf.fonts[fontkey] = _document_font(pdf, path, fontkey, style)
+    return True
@@ -0,0 +1,269 @@
+import codecs
+import posixpath
+import zipfile
+from xml.etree.ElementTree import ParseError, iterparse
+
+from logic import (
+    load_and_clean_schedule,
+    load_and_parse_availability,
+    ReportFormatError,
+    SCHEDULE_REQUIRED_COLUMNS,
+)
+
+# Preflight check of uploaded exports. Each file is classified from its first few
+# KB (and, for workbooks, the sheet's header row) before any full parse, so a
+# wrong, swapped or re-saved file is reported in milliseconds instead of after a
+# slow BeautifulSoup or pandas read. Every known export version is an adapter in
+# REPORT_ADAPTERS; a new version from the booking vendor is supported by
+# registering an adapter that recognizes it and loads it into the usual frames.
+
+HEAD_BYTES = 64 * 1024
+REPORT_KINDS = {
+    'availability': "Staff Schedule (Trainer Availability)",
+    'schedule': "Schedule at a Glance",
+}
+
+ZIP_MAGIC = b'PK\x03\x04'
+# Files people upload by mistake, recognized by their first bytes
+KNOWN_SIGNATURES = (
+    (b'%PDF', "a PDF document"),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', "a binary Excel workbook (was the export opened and re-saved in Excel?)"),
+    (b'\x89PNG', "a PNG image"),
+    (b'\xff\xd8\xff', "a JPEG image"),
+)
+
+
+class ReportAdapter:
+    """
+    One recognizable export format. `sniff(head, file_object)` returns None when
+    the file is not in this format, otherwise a list of problems (empty when the
+    file is usable). `load(file_object, **options)` returns what the matching
+    logic loader returns for its `kind`.
+    """
+
+    def __init__(self, name, kind, description, sniff, load):
+        if kind not in REPORT_KINDS:
+            raise ValueError(f"Unknown report kind '{kind}'.")
+        self.name = name
+        self.kind = kind
+        self.description = description
+        self.sniff = sniff
+        self.load = load
+
+    def __repr__(self):
+        return f"ReportAdapter({self.name!r}, {self.kind!r})"
+
+
+REPORT_ADAPTERS = []
+
+def register_adapter(adapter):
+    """
+    Adds an export format. Adapters registered later are tried first, so a new
+    vendor version can take over files an older adapter would also accept.
+    """
+    REPORT_ADAPTERS.insert(0, adapter)
+    return adapter
+
+
+# --- Sniffing helpers ---
+
+def read_head(file_object, size=HEAD_BYTES):
+    """Returns the first `size` bytes of a file object and rewinds it."""
+    file_object.seek(0)
+    head = file_object.read(size)
+    file_object.seek(0)
+    return head.encode('utf-8') if isinstance(head, str) else head
+
+def _text_head(head):
+    """Lower-cased bytes of a text file's head, decoding UTF-16 exports to UTF-8."""
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        head = head.decode('utf-16', errors='ignore').encode('utf-8')
+    return head.lstrip(codecs.BOM_UTF8).lstrip().lower()
+
+def _local(tag):
+    """Tag name without its namespace (transitional and strict OOXML use different ones)."""
+    return tag.rsplit('}', 1)[-1]
+
+def _first_sheet_path(archive):
+    """Zip path of the workbook's first sheet (the one pandas reads), via workbook.xml and its rels."""
+    try:
+        with archive.open('xl/workbook.xml') as handle:
+            relation = next(
+                (element.get(key) for _, element in iterparse(handle) if _local(element.tag) == 'sheet'
+                 for key in element.keys() if _local(key) == 'id'),
+                None
+            )
+        with archive.open('xl/_rels/workbook.xml.rels') as handle:
+            target = next(
+                element.get('Target') for _, element in iterparse(handle)
+                if _local(element.tag) == 'Relationship' and element.get('Id') == relation
+            )
+    except (KeyError, StopIteration):
+        return 'xl/worksheets/sheet1.xml'
+    return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+
+def _text_of(element):
+    """Text of a shared or inline string: its <t>, or its rich-text runs (phonetic hints left out)."""
+    parts = []
+    for child in element:
+        name = _local(child.tag)
+        if name == 't':
+            parts.append(child.text or '')
+        elif name == 'r':
+            parts.extend(t.text or '' for t in child if _local(t.tag) == 't')
+    return ''.join(parts)
+
+def _shared_strings(archive, indices):
+    """Resolves only the shared-string `indices`, reading sharedStrings.xml no further than the last one."""
+    found = {}
+    if not indices:
+        return found
+    last = max(indices)
+    try:
+        handle = archive.open('xl/sharedStrings.xml')
+    except KeyError:
+        return found
+    with handle:
+        position = 0
+        for _, element in iterparse(handle):
+            if _local(element.tag) != 'si':
+                continue
+            if position in indices:
+                found[position] = _text_of(element)
+            element.clear()
+            if position == last:
+                break
+            position += 1
+    return found
+
+def read_header_row(file_object):
+    """
+    Returns the first row of the workbook's first sheet as stripped strings.
+    The sheet XML is streamed straight from the zip and parsing stops after its
+    first <row>; of the shared strings only the ones that row uses are resolved.
+    """
+    file_object.seek(0)
+    try:
+        with zipfile.ZipFile(file_object) as archive:
+            cells = []
+            with archive.open(_first_sheet_path(archive)) as handle:
+                for _, element in iterparse(handle):
+                    name = _local(element.tag)
+                    if name == 'c':
+                        kind = element.get('t')
+                        if kind == 'inlineStr':
+                            value = next((_text_of(child) for child in element if _local(child.tag) == 'is'), None)
+                        else:
+                            value = next((child.text for child in element if _local(child.tag) == 'v'), None)
+                        cells.append((kind, value))
+                    elif name == 'row':
+                        break
+            shared = _shared_strings(archive, {int(value) for kind, value in cells if kind == 's' and value is not None})
+    finally:
+        file_object.seek(0)
+    values = [
+        shared.get(int(value)) if kind == 's' and value is not None
+        else str(value == '1') if kind == 'b' and value is not None
+        else value
+        for kind, value in cells
+    ]
+    return [str(value).strip() for value in values if value is not None]
+
+
+# --- Built-in adapters ---
+
+def _sniff_staff_schedule_html(head, file_object):
+    text = _text_head(head)
+    if not text.startswith((b'<html', b'<!doctype', b'<table', b'<?xml', b'<meta', b'<head', b'<body')):
+        return None
+    if b'staffschedulereport' in text or b'schedule for' in text:
+        return []
+    return None
+
+def _load_staff_schedule_html(file_object, workers=0, **options):
+    return load_and_parse_availability(file_object, workers=workers)
+
+def _sniff_schedule_at_a_glance_xlsx(head, file_object):
+    if not head.startswith(ZIP_MAGIC):
+        return None
+    try:
+        header = read_header_row(file_object)
+    except (zipfile.BadZipFile, KeyError, OSError, ValueError, ParseError):
+        return None
+    missing = [column for column in SCHEDULE_REQUIRED_COLUMNS if column not in header]
+    if len(missing) == len(SCHEDULE_REQUIRED_COLUMNS):
+        return None
+    if missing:
+        return [f"The header row is missing the required column(s): {', '.join(missing)}."]
+    return []
+
+def _load_schedule_at_a_glance_xlsx(file_object, **options):
+    return load_and_clean_schedule(file_object)
+
+register_adapter(ReportAdapter(
+    'staff_schedule_html', 'availability', "Staff Schedule HTML export (.xls)",
+    _sniff_staff_schedule_html, _load_staff_schedule_html
+))
+register_adapter(ReportAdapter(
+    'schedule_at_a_glance_xlsx', 'schedule', "Schedule at a Glance workbook (.xlsx)",
+    _sniff_schedule_at_a_glance_xlsx, _load_schedule_at_a_glance_xlsx
+))
+
+
+# --- Classification ---
+
+def _describe_unknown(head):
+    if not head.strip():
+        return "an empty file"
+    for signature, description in KNOWN_SIGNATURES:
+        if head.startswith(signature):
+            return description
+    if head.startswith(ZIP_MAGIC):
+        return "a workbook or archive without the Schedule at a Glance columns"
+    if _text_head(head).startswith((b'<html', b'<!doctype', b'<table')):
+        return "a web page without any 'Schedule for' staff sections"
+    return "a file in an unrecognized format"
+
+def classify_report(file_object):
+    """
+    Classifies one uploaded file from its head.
+    Returns {'kind', 'adapter', 'problems', 'description'}; 'kind' and 'adapter'
+    are None when no registered adapter recognizes the file.
+    """
+    head = read_head(file_object)
+    for adapter in REPORT_ADAPTERS:
+        problems = adapter.sniff(head, file_object)
+        if problems is not None:
+            return {'kind': adapter.kind, 'adapter': adapter, 'problems': problems, 'description': adapter.description}
+    return {'kind': None, 'adapter': None, 'problems': [], 'description': _describe_unknown(head)}
+
+def _check(classification, kind, label):
+    if classification['kind'] != kind:
+        found = f"a {REPORT_KINDS[classification['kind']]} export" if classification['kind'] else classification['description']
+        raise ReportFormatError(f"The {label} upload is {found}, not a {REPORT_KINDS[kind]} export.")
+    if classification['problems']:
+        raise ReportFormatError(f"The {REPORT_KINDS[kind]} upload cannot be used. " + " ".join(classification['problems']))
+
+def preflight_reports(availability_file, schedule_file):
+    """
+    Checks an upload pair before parsing. Files uploaded into each other's slots
+    are swapped back. Returns {'availability_file', 'schedule_file',
+    'availability_adapter', 'schedule_adapter', 'swapped'}; raises
+    ReportFormatError when either file is not a usable export.
+    """
+    availability = classify_report(availability_file)
+    schedule = classify_report(schedule_file)
+    swapped = availability['kind'] == 'schedule' and schedule['kind'] == 'availability'
+    if swapped:
+        availability_file, schedule_file = schedule_file, availability_file
+        availability, schedule = schedule, availability
+
+    _check(availability, 'availability', "Trainer Availability")
+    _check(schedule, 'schedule', "ScheduleAtAGlance")
+    return {
+        'availability_file': availability_file,
+        'schedule_file': schedule_file,
+        'availability_adapter': availability['adapter'],
+        'schedule_adapter': schedule['adapter'],
+        'swapped': swapped,
+    }
@@ -0,0 +1,168 @@
+import cProfile
+import contextlib
+import io
+import marshal
+import os
+import pickle
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import Counter
+
+# Opt-in profiling of one end-to-end report generation. A ProfileSession runs the
+# generation under cProfile (deterministic, for pstats), samples the generating
+# thread's stack (for collapsed-stack flamegraphs) and takes a tracemalloc
+# snapshot after every stage. Callers pass `profiler=None` when profiling is off
+# and wrap stages with profile_stage(), which is then a plain null context, so a
+# normal generation pays nothing.
+
+SAMPLE_INTERVAL_SECONDS = 0.005
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 40
+
+# tracemalloc is process-wide, so only one session captures at a time
+_capture_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    """Another profile is already being captured in this process."""
+    pass
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class ProfileSession:
+    """
+    Collects the profile of one generation. Use capture() around the whole run
+    and stage(name) around its parse, engine and PDF parts, then artifact() for
+    a zip with the pstats file, collapsed stacks, allocation snapshots and a
+    readable summary.
+    """
+
+    def __init__(self, label='report', sample_interval=SAMPLE_INTERVAL_SECONDS):
+        self.label = label
+        self.sample_interval = sample_interval
+        self.stages = []  # (name, seconds, peak_bytes, snapshot, previous_snapshot)
+        self.wall_seconds = None
+        self._profile = cProfile.Profile()
+        self._sampler = None
+        self._last_snapshot = None
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Profiles the enclosed block on the calling thread."""
+        if not _capture_lock.acquire(blocking=False):
+            raise ProfilerBusyError("Another profile is already being captured. Please try again when it has finished.")
+        started_tracing = not tracemalloc.is_tracing()
+        try:
+            if started_tracing:
+                tracemalloc.start()
+            self._last_snapshot = self._snapshot()
+            self._sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+            self._sampler.start()
+            started = time.perf_counter()
+            self._profile.enable()
+            try:
+                yield self
+            finally:
+                self._profile.disable()
+                self.wall_seconds = time.perf_counter() - started
+                self._sampler.stop()
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            _capture_lock.release()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Times the enclosed stage and snapshots the memory it allocated."""
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            snapshot = self._snapshot()
+            self.stages.append((name, seconds, peak_bytes, snapshot, self._last_snapshot))
+            self._last_snapshot = snapshot
+
+    # --- Artifacts ---
+
+    def pstats_bytes(self):
+        """The cProfile result in the binary format pstats.Stats() and snakeviz read."""
+        self._profile.create_stats()
+        return marshal.dumps(self._profile.stats)
+
+    def collapsed_stacks(self):
+        """Sampled stacks as 'frame;frame;frame count' lines for flamegraph.pl or speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self._sampler.stacks.most_common())
+
+    def summary(self):
+        """Readable report: stage times and peaks, top allocations per stage, top functions."""
+        lines = [f"Profile of {self.label}: {self.wall_seconds:.3f} s wall, "
+                 f"{sum(self._sampler.stacks.values())} stack samples every {self.sample_interval * 1000:g} ms", ""]
+        lines.append(f"{'stage':<24}{'seconds':>10}{'peak MB':>10}")
+        for name, seconds, peak_bytes, _, _ in self.stages:
+            lines.append(f"{name:<24}{seconds:>10.3f}{peak_bytes / (1024 * 1024):>10.1f}")
+        for name, _, _, snapshot, previous in self.stages:
+            lines.append("")
+            lines.append(f"Top allocations during {name} (net change by line):")
+            for stat in snapshot.compare_to(previous, 'lineno')[:TOP_ALLOCATIONS]:
+                lines.append(f"  {stat}")
+        lines.append("")
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        lines.append(stream.getvalue())
+        return "\n".join(lines)
+
+    def artifact(self):
+        """Returns the zip archive (bytes) with every artifact of this profile."""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('summary.txt', self.summary())
+            archive.writestr('profile.pstats', self.pstats_bytes())
+            archive.writestr('stacks.collapsed', self.collapsed_stacks())
+            for index, (name, _, _, snapshot, _) in enumerate(self.stages, start=1):
+                # Readable with tracemalloc.Snapshot.load()
+                archive.writestr(f"allocations/{index:02d}_{name}.tracemalloc", pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL))
+        return buffer.getvalue()
+
+
+def profile_stage(profiler, name):
+    """profiler.stage(name), or a null context when profiling is off."""
+    return profiler.stage(name) if profiler is not None else contextlib.nullcontext()
@@ -0,0 +1,462 @@
+import re
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from logic import (
+    AvailabilityParsingError,
+    FileProcessingError,
+    ScheduleParsingError,
+)
+
+# Frozen reference implementations of the report parsers and availability
+# engines, kept in their plain row-by-row form. equivalence_check.py compares
+# logic.py and any registered alternative engine against them, so this file is
+# deliberately NOT optimized or refactored along with logic.py. Change it only
+# when the intended behaviour of the app changes.
+
+
+# --- Parsers ---
+
+REQUIRED_SCHEDULE_COLUMNS = ['Date', 'Start time', 'End time', 'Description', 'Staff']
+
+def normalize_name(name):
+    """Standardizes therapist names for consistent matching."""
+    if not isinstance(name, str):
+        return None
+    match = re.search(r'^\s*([a-zA-Z]+)', name)
+    return match.group(1).lower().strip() if match else None
+
+def load_and_clean_schedule(file_path):
+    """Loads and processes the 'ScheduleAtAGlance' report."""
+    try:
+        df = pd.read_excel(file_path, engine='openpyxl')
+        
+        missing_cols = [col for col in REQUIRED_SCHEDULE_COLUMNS if col not in df.columns]
+        if missing_cols:
+            raise ScheduleParsingError(f"The 'ScheduleAtAGlance' report is missing the following required column(s): {', '.join(missing_cols)}.")
+
+        # --- Identify Elite Therapists ---
+        # This is done before columns are renamed/dropped for efficiency.
+        elite_df = df[df['Description'].str.contains("Elite Level", na=False)]
+        elite_therapists = set(elite_df['Staff'].apply(normalize_name).dropna())
+        
+        df = df[REQUIRED_SCHEDULE_COLUMNS]
+        df.columns = ['date', 'start_time', 'end_time', 'description', 'therapist']
+
+        df['therapist'] = df['therapist'].apply(normalize_name)
+        df.dropna(subset=['therapist', 'date', 'start_time', 'end_time'], inplace=True)
+
+        df['start_datetime'] = pd.to_datetime(df['date'].astype(str) + ' ' + df['start_time'].astype(str), errors='coerce')
+        df['end_datetime'] = pd.to_datetime(df['date'].astype(str) + ' ' + df['end_time'].astype(str), errors='coerce')
+
+        if df['start_datetime'].isnull().any() or df['end_datetime'].isnull().any():
+            raise ScheduleParsingError("Could not parse some dates or times in the 'ScheduleAtAGlance' report. Please ensure they are in a standard format (e.g., 'HH:MM AM/PM').")
+
+        df.dropna(subset=['start_datetime', 'end_datetime'], inplace=True)
+
+        # --- Tag the room type each obligation occupies ---
+        # Couples bookings use the dedicated couples rooms; everything else a treatment room.
+        df['room_type'] = np.where(
+            df['description'].astype(str).str.contains("Couple", case=False, na=False),
+            'couples', 'treatment'
+        )
+
+        obligations_df = df[['therapist', 'start_datetime', 'end_datetime', 'room_type']].copy()
+        obligations_df.drop_duplicates(subset=['therapist', 'start_datetime', 'end_datetime'], inplace=True)
+
+        sorted_obligations = obligations_df.sort_values(by=['therapist', 'start_datetime']).reset_index(drop=True)
+        
+        return sorted_obligations, elite_therapists
+    except FileProcessingError as e:
+        raise e
+    except Exception as e:
+        raise ScheduleParsingError(f"An unexpected error occurred while processing the 'ScheduleAtAGlance' report: {e}")
+
+def load_and_parse_availability(file_object):
+    """
+    Loads and parses the 'Trainer Availability' report by navigating its
+    specific HTML structure using BeautifulSoup, one row at a time.
+    """
+    try:
+        file_object.seek(0)
+        content = file_object.read()
+        soup = BeautifulSoup(content, 'lxml')
+
+        availability_data = []
+        display_name_map = {}
+        
+        # Find all <strong> tags, which contain the staff names
+        schedule_headers = soup.find_all('strong')
+
+        for header in schedule_headers:
+            header_text = header.get_text(strip=True).upper()
+            
+            if header_text.startswith('SCHEDULE FOR'):
+                # Extract the therapist's name
+                name_part = header_text.replace('SCHEDULE FOR', '').strip()
+                current_therapist = normalize_name(name_part)
+                if not current_therapist:
+                    continue # Skip entries like '*WAITLIST*' or '*LATE CANCEL*'
+
+                # Populate the name map for later display formatting
+                if current_therapist not in display_name_map:
+                    display_name_map[current_therapist] = name_part.title()
+
+                # Find the parent table of the header, then find the schedule table within it
+                parent_table = header.find_parent('table')
+                schedule_table = parent_table.find('table', id='staffScheduleReport')
+
+                if not schedule_table:
+                    continue # This therapist has no schedule table (e.g., Heidi, MBO)
+
+                current_date = None
+                # Process the rows within this specific therapist's schedule table
+                for row in schedule_table.find_all('tr'):
+                    cells = row.find_all('td')
+                    
+                    # A row with a single, bolded cell is a date header
+                    if len(cells) == 1 and cells[0].find('strong'):
+                        date_text = cells[0].get_text(strip=True)
+                        date_match = re.search(r'\b(Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday),\s(January|February|March|April|May|June|July|August|September|October|November|December)\s\d{1,2},\s\d{4}', date_text)
+                        if date_match:
+                            current_date = pd.to_datetime(date_match.group(0)).date()
+                        continue
+
+                    # A row with multiple cells is a time entry
+                    if current_date and len(cells) > 2:
+                        time_text = cells[1].get_text(strip=True)
+                        description_text = cells[2].get_text(strip=True)
+                        
+                        # Only process rows marked as "Appointments"
+                        if 'Appointments' in description_text:
+                            time_match = re.search(r'(\d{1,2}:\d{2}\s*(?:am|pm))\s*-\s*(\d{1,2}:\d{2}\s*(?:am|pm))', time_text, re.IGNORECASE)
+                            if time_match:
+                                start_str, end_str = time_match.groups()
+                                start_dt = datetime.combine(current_date, datetime.strptime(start_str.strip(), '%I:%M %p').time())
+                                end_dt = datetime.combine(current_date, datetime.strptime(end_str.strip(), '%I:%M %p').time())
+
+                                availability_data.append({
+                                    'therapist': current_therapist,
+                                    'start_datetime': start_dt,
+                                    'end_datetime': end_dt
+                                })
+        
+        if not availability_data:
+            raise AvailabilityParsingError("Successfully read the file, but could not find any valid availability entries. Please check the file content.")
+
+        return pd.DataFrame(availability_data), display_name_map
+    except Exception as e:
+        raise AvailabilityParsingError(f"An unexpected error occurred while parsing the 'Trainer Availability' data: {e}")
+
+
+# --- Availability engine ---
+
+def place_left(block_start, block_end, shift_start, shift_end, session_duration):
+    """Packs sessions flush against the start of the block."""
+    num_sessions = (block_end - block_start) // session_duration
+    return [block_start + i * session_duration for i in range(num_sessions)]
+
+def place_right(block_start, block_end, shift_start, shift_end, session_duration):
+    """Packs sessions flush against the end of the block."""
+    num_sessions = (block_end - block_start) // session_duration
+    first_start = block_end - num_sessions * session_duration
+    return [first_start + i * session_duration for i in range(num_sessions)]
+
+def place_adjacent(block_start, block_end, shift_start, shift_end, session_duration):
+    """
+    Packs sessions against the neighbouring appointment so the leftover time
+    sits at the shift edge instead of as an unpaid gap between appointments.
+    A block bounded by the shift start and an appointment is flushed right.
+    """
+    if block_start == shift_start and block_end < shift_end:
+        return place_right(block_start, block_end, shift_start, shift_end, session_duration)
+    return place_left(block_start, block_end, shift_start, shift_end, session_duration)
+
+PLACEMENT_STRATEGIES = {
+    'left': place_left,
+    'right': place_right,
+    'adjacent': place_adjacent,
+    'optimized': place_left,
+}
+
+def shift_free_time(day_start, day_end, day_obs):
+    """
+    Returns the continuous free blocks ({'start', 'end'} dicts) of one shift.
+
+    `day_obs` is a list of obligation dicts (with 'start_datetime' and
+    'end_datetime') overlapping the shift, sorted by start time.
+    """
+    # Merge overlapping or back-to-back obligations
+    if not day_obs:
+        merged_obs = []
+    else:
+        merged_obs = [dict(day_obs[0])]
+        for current in day_obs[1:]:
+            last = merged_obs[-1]
+            if current['start_datetime'] <= last['end_datetime']:
+                last['end_datetime'] = max(last['end_datetime'], current['end_datetime'])
+            else:
+                merged_obs.append(dict(current))
+
+    # Determine the continuous free time blocks between obligations
+    free_time = []
+    current_start = day_start
+    for obs in merged_obs:
+        if current_start < obs['start_datetime']:
+            free_time.append({'start': current_start, 'end': obs['start_datetime']})
+        current_start = obs['end_datetime']
+    if current_start < day_end:
+        free_time.append({'start': current_start, 'end': day_end})
+    return free_time
+
+def calculate_availability(availability_df, obligations_df, session_duration_minutes=75, placement_strategy='left', alignment_minutes=15):
+    """
+    Calculates the continuous free blocks and discrete slots of all therapists
+    for a single session duration, one shift at a time.
+    Returns (continuous_blocks, slots sorted by therapist and start).
+    """
+    session_duration = timedelta(minutes=session_duration_minutes)
+    place_sessions = PLACEMENT_STRATEGIES[placement_strategy]
+    all_slots = []
+    all_continuous_blocks = []
+
+    for therapist in availability_df['therapist'].unique():
+        therapist_avail = availability_df[availability_df['therapist'] == therapist]
+        therapist_obs = obligations_df[obligations_df['therapist'] == therapist]
+
+        for _, avail_row in therapist_avail.iterrows():
+            day_start = avail_row['start_datetime']
+            day_end = avail_row['end_datetime']
+
+            day_obs = therapist_obs[
+                (therapist_obs['start_datetime'] < day_end) &
+                (therapist_obs['end_datetime'] > day_start)
+            ].sort_values('start_datetime').to_dict('records')
+
+            for free_block in shift_free_time(day_start, day_end, day_obs):
+                block_start = free_block['start']
+                block_end = free_block['end']
+                if block_end - block_start >= session_duration:
+                    all_continuous_blocks.append({'therapist': therapist, 'start': block_start, 'end': block_end})
+                    for start_point in place_sessions(block_start, block_end, day_start, day_end, session_duration):
+                        all_slots.append({'therapist': therapist, 'start': start_point, 'end': start_point + session_duration})
+
+    if placement_strategy == 'optimized':
+        shifts = list(availability_df[['therapist', 'start_datetime', 'end_datetime']].itertuples(index=False, name=None))
+        all_slots = optimize_slot_placement(all_continuous_blocks, shifts, session_duration_minutes, alignment_minutes)
+
+    return all_continuous_blocks, sorted(all_slots, key=lambda x: (x['therapist'], x['start']))
+
+def _best_session_chain(candidates, block_start, block_end, shift_start, shift_end, session_duration, partner_starts):
+    """
+    Weighted interval scheduling over the sorted candidate session starts of one block.
+
+    Scores are compared as (sessions, couples_matches, adjacency) tuples, so the
+    number of bookable sessions is maximized first, then the number of other
+    therapists starting at the same time, then how many sessions sit flush
+    against an appointment or the previous session. Ties keep the earliest start.
+    """
+    n = len(candidates)
+    nxt = [bisect_left(candidates, start + session_duration) for start in candidates]
+    flush_starts = {block_start} if block_start > shift_start else set()
+    if block_end < shift_end:
+        flush_starts.add(block_end - session_duration)
+
+    best = [(0, 0, 0)] * (n + 1)      # best[i]: best score using candidates[i:]
+    best_first = [None] * (n + 1)     # first chosen candidate index behind best[i]
+    take = [(0, 0, 0)] * n            # take[i]: best score with a session starting at candidates[i]
+    follow = [None] * n               # next chosen candidate index after i
+    for i in range(n - 1, -1, -1):
+        j = nxt[i]
+        rest, follow[i] = best[j], best_first[j]
+        if j < n and candidates[j] == candidates[i] + session_duration:
+            contiguous = (take[j][0], take[j][1], take[j][2] + 1)
+            if contiguous > rest:
+                rest, follow[i] = contiguous, j
+        start = candidates[i]
+        take[i] = (
+            rest[0] + 1,
+            rest[1] + partner_starts.get(start, 0),
+            rest[2] + (start in flush_starts)
+        )
+        if take[i] >= best[i + 1]:
+            best[i], best_first[i] = take[i], i
+        else:
+            best[i], best_first[i] = best[i + 1], best_first[i + 1]
+
+    chosen = []
+    i = best_first[0]
+    while i is not None:
+        chosen.append(candidates[i])
+        i = follow[i]
+    return chosen
+
+def optimize_slot_placement(continuous_blocks, shifts, session_duration_minutes=75, alignment_minutes=15):
+    """
+    Chooses where sessions sit inside every free block to maximize bookable
+    sessions and couples alignment across therapists.
+
+    Each block is solved with a dynamic program over candidate start times
+    (left/right-flush chains, the alignment grid and other therapists' starts).
+    Blocks on the same day are revisited in a couple of passes so therapists
+    converge on shared start times. Returns slots sorted like calculate_availability.
+    """
+    session_duration = timedelta(minutes=session_duration_minutes)
+    grid = timedelta(minutes=alignment_minutes) if alignment_minutes else None
+
+    shifts_by_therapist = {}
+    for therapist, shift_start, shift_end in shifts:
+        shifts_by_therapist.setdefault(therapist, []).append((shift_start, shift_end))
+
+    # Attach each block to the shift it was carved from, grouped by calendar day
+    blocks_by_day = {}
+    for block in continuous_blocks:
+        shift_start, shift_end = next(
+            (s, e) for s, e in shifts_by_therapist.get(block['therapist'], [])
+            if s <= block['start'] and block['end'] <= e
+        )
+        blocks_by_day.setdefault(block['start'].date(), []).append(
+            (block['therapist'], block['start'], block['end'], shift_start, shift_end)
+        )
+
+    all_slots = []
+    for day_blocks in blocks_by_day.values():
+        placements = [
+            place_left(block_start, block_end, shift_start, shift_end, session_duration)
+            for _, block_start, block_end, shift_start, shift_end in day_blocks
+        ]
+        start_counts = {}
+        for (therapist, *_), starts in zip(day_blocks, placements):
+            for start in starts:
+                start_counts.setdefault(start, set()).add(therapist)
+
+        for _ in range(2):
+            for index, (therapist, block_start, block_end, shift_start, shift_end) in enumerate(day_blocks):
+                for start in placements[index]:
+                    start_counts[start].discard(therapist)
+                latest_start = block_end - session_duration
+                candidates = set(place_left(block_start, block_end, shift_start, shift_end, session_duration))
+                candidates.update(place_right(block_start, block_end, shift_start, shift_end, session_duration))
+                if grid:
+                    first = block_start + (-(block_start - datetime.combine(block_start.date(), datetime.min.time()))) % grid
+                    candidates.update(first + i * grid for i in range(int((latest_start - first) // grid) + 1))
+                candidates.update(t for t, owners in start_counts.items() if owners and block_start <= t <= latest_start)
+                partner_starts = {t: len(owners - {therapist}) for t, owners in start_counts.items() if owners}
+                placements[index] = _best_session_chain(
+                    sorted(candidates), block_start, block_end, shift_start, shift_end, session_duration, partner_starts
+                )
+                for start in placements[index]:
+                    start_counts.setdefault(start, set()).add(therapist)
+
+        for (therapist, *_), starts in zip(day_blocks, placements):
+            all_slots.extend(
+                {'therapist': therapist, 'start': start, 'end': start + session_duration} for start in starts
+            )
+
+    return sorted(all_slots, key=lambda x: (x['therapist'], x['start']))
+
+
+# --- Couples engine ---
+
+def find_couples_slots(continuous_blocks, obligations_df, tolerance_minutes=30, session_duration_minutes=75, min_gap_hours=1):
+    """
+    Identifies overlapping slots for couples massages using a hybrid approach.
+
+    This function prioritizes "perfect matches" where therapists have discrete
+    slots starting at the exact same time. It then finds "near miss"
+    opportunities by calculating the actual intersection of two therapists'
+    continuous availability blocks. Single session duration only; the debug
+    print of the original is left out.
+    """
+    if not continuous_blocks:
+        return []
+
+    final_opportunities = {}
+    session_duration = timedelta(minutes=session_duration_minutes)
+    conflict_gap = timedelta(hours=min_gap_hours)
+
+    # --- Preparation: Generate discrete slots from continuous blocks to find perfect matches ---
+    individual_slots = []
+    for block in continuous_blocks:
+        num_sessions = (block['end'] - block['start']) // session_duration
+        start_point = block['start']
+        for _ in range(num_sessions):
+            individual_slots.append({
+                'therapist': block['therapist'],
+                'start': start_point,
+                'end': start_point + session_duration
+            })
+            start_point += session_duration
+
+    # --- Phase 1: Find and store all "Perfect Matches" ---
+    slots_by_exact_time = {}
+    for slot in individual_slots:
+        start_time = slot['start']
+        if start_time not in slots_by_exact_time:
+            slots_by_exact_time[start_time] = set()
+        slots_by_exact_time[start_time].add(slot['therapist'])
+
+    for start_time, therapists in slots_by_exact_time.items():
+        if len(therapists) >= 2:
+            final_opportunities[start_time] = therapists
+    
+    perfect_match_times = set(final_opportunities.keys())
+
+    # --- Phase 2: Find "Near Miss" candidates using a true interval intersection ---
+    therapist_blocks = {}
+    for block in continuous_blocks:
+        therapist = block['therapist']
+        if therapist not in therapist_blocks:
+            therapist_blocks[therapist] = []
+        therapist_blocks[therapist].append({'start': block['start'], 'end': block['end']})
+
+    therapists = list(therapist_blocks.keys())
+    
+    for i in range(len(therapists)):
+        for j in range(i + 1, len(therapists)):
+            t1_name, t2_name = therapists[i], therapists[j]
+            blocks1, blocks2 = therapist_blocks[t1_name], therapist_blocks[t2_name]
+
+            for b1 in blocks1:
+                for b2 in blocks2:
+                    # Find the latest start time and earliest end time to get the shared availability window
+                    overlap_start = max(b1['start'], b2['start'])
+                    overlap_end = min(b1['end'], b2['end'])
+
+                    # Check if the shared window is long enough for at least one session
+                    if overlap_end - overlap_start >= session_duration:
+                        # Generate all possible slots within this shared window
+                        potential_start = overlap_start
+                        while potential_start + session_duration <= overlap_end:
+                            # This is a valid potential slot. Now, filter it.
+                            is_perfect_match = potential_start in perfect_match_times
+                            is_too_close = False
+                            if not is_perfect_match:
+                                for perfect_time in perfect_match_times:
+                                    if abs(potential_start - perfect_time) < conflict_gap:
+                                        is_too_close = True
+                                        break
+                            
+                            if not is_perfect_match and not is_too_close:
+                                if potential_start not in final_opportunities:
+                                    final_opportunities[potential_start] = set()
+                                final_opportunities[potential_start].add(t1_name)
+                                final_opportunities[potential_start].add(t2_name)
+                            
+                            # Move to the next potential start time
+                            potential_start += session_duration
+
+    # --- Phase 4: Format final results ---
+    final_list = []
+    for start_time, therapists_set in final_opportunities.items():
+        if len(therapists_set) >= 2:
+            final_list.append({
+                'start': start_time,
+                'therapists': sorted(list(therapists_set))
+            })
+
+    return sorted(final_list, key=lambda x: x['start'])
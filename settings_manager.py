@@ -1,10 +1,63 @@
-# This file is now simplified to only provide the default settings.
+# This file is now simplified to only provide the default settings and the
+# operational configuration.
 # All file I/O and platformdirs logic has been removed as it is
 # incompatible with Streamlit Community Cloud's ephemeral filesystem.
 # User-customized settings will be stored in st.session_state per-session.
+# Operational settings (durations, tolerances, rooms, cache and queue limits, history) are read from config.ini.
+
+import configparser
+
+# Default (max_entries, ttl_minutes, budget_mb) of each shared result store
+CACHE_DEFAULTS = {
+    'parsed': (32, 720, 128),
+    'slots': (64, 720, 128),
+    'pdf': (64, 120, 64),
+}
+
+# History database written after every report (config.ini [history]); '' keeps no history
+HISTORY_DATABASE = 'availability_history.sqlite3'
+
+def _cache_limits(config, name, max_entries, ttl_minutes, budget_mb):
+    """Reads the [cache] limits of one result store as SharedResultStore keyword arguments."""
+    return {
+        'max_entries': config.getint('cache', f'{name}_max_entries', fallback=max_entries),
+        'ttl_seconds': config.getint('cache', f'{name}_ttl_minutes', fallback=ttl_minutes) * 60,
+        'budget_bytes': config.getint('cache', f'{name}_budget_mb', fallback=budget_mb) * 1024 * 1024,
+    }
+
+def load_app_config(path='config.ini'):
+    """Loads operational application settings (tolerances, durations) from config.ini."""
+    config = configparser.ConfigParser()
+    # Use a simple relative path, Streamlit runs from the repo root
+    config.read(path)
+    settings = config['settings']
+    rooms = config['rooms'] if config.has_section('rooms') else {}
+    session_durations = [int(minutes) for minutes in settings.get('session_duration_minutes', '75').split(',') if minutes.strip()]
+    return {
+        'session_duration_minutes': session_durations[0],
+        'session_durations': session_durations,
+        'tolerance_minutes': settings.getint('tolerance_minutes', 30),
+        'min_gap_hours': settings.getint('min_gap_hours', 1),
+        'placement_strategy': settings.get('placement_strategy', 'left'),
+        'slot_alignment_minutes': settings.getint('slot_alignment_minutes', 15),
+        'parse_workers': settings.getint('parse_workers', 0),
+        'data_fixes': settings.get('data_fixes', 'repair'),
+        'history_database': config.get('history', 'database', fallback=HISTORY_DATABASE),
+        'room_counts': {room_type: int(count) for room_type, count in rooms.items()},
+        'caches': {name: _cache_limits(config, name, *defaults) for name, defaults in CACHE_DEFAULTS.items()},
+        'admin_panel': config.getboolean('cache', 'admin_panel', fallback=False),
+        'queue': {
+            'max_concurrent': config.getint('queue', 'max_concurrent_jobs', fallback=2),
+            'memory_budget_bytes': config.getint('queue', 'memory_budget_mb', fallback=512) * 1024 * 1024,
+        }
+    }
 
 def get_default_settings():
-    """Returns a dictionary with the default PDF styling settings."""
+    """
+    Returns a dictionary with the default PDF styling settings. A 'font_family' is
+    either a core PDF font (Helvetica, Times, Courier) or a custom family whose
+    .ttf/.otf files are in the fonts folder (see pdf_fonts.py).
+    """
     return {
         'title': {
             'font_family': 'Helvetica', 'font_size': 16, 'bold': True, 'italic': False,
@@ -0,0 +1,209 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+# Process-wide store for parsed and computed results. Every Streamlit session on
+# the server runs in the same process, so results are frozen once (read-only
+# NumPy buffers, tuples and mapping proxies) and the same objects are handed to
+# every caller instead of a fresh deserialized copy per cache hit. Each store is
+# bounded by entry count, age and estimated bytes, and counts its hits, misses
+# and evictions for the admin panel and metrics export.
+
+
+def content_key(kind, *parts):
+    """
+    Returns a stable key for `kind` from the given parts. Bytes (file contents)
+    are hashed as-is; anything else by its repr.
+    """
+    digest = hashlib.sha256(kind.encode('utf-8'))
+    for part in parts:
+        digest.update(b'\0')
+        digest.update(part if isinstance(part, bytes) else repr(part).encode('utf-8'))
+    return f"{kind}:{digest.hexdigest()}"
+
+def file_content_key(kind, file_object):
+    """Returns the content key of an uploaded file (or any object with getvalue())."""
+    return content_key(kind, file_object.getvalue())
+
+
+# --- Freezing ---
+
+def freeze_frame(df):
+    """
+    Returns a DataFrame whose column buffers are read-only NumPy arrays.
+    Writes through .loc/.iloc raise ValueError instead of changing the shared data.
+    """
+    columns = {}
+    for name in df.columns:
+        values = df[name].to_numpy(copy=True)
+        values.flags.writeable = False
+        columns[name] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+def freeze(value):
+    """Recursively converts a result into its immutable, shareable form."""
+    if isinstance(value, pd.DataFrame):
+        return freeze_frame(value)
+    if isinstance(value, np.ndarray):
+        frozen = value.copy()
+        frozen.flags.writeable = False
+        return frozen
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+def estimate_nbytes(value):
+    """Approximate in-memory size of a result, used against the store budget."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (dict, MappingProxyType)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(key) + estimate_nbytes(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class SharedResultStore:
+    """
+    Immutable results keyed by content hash, shared by every session in the process.
+
+    Values are frozen on insertion and returned by reference, so a hit costs a
+    dictionary lookup rather than a copy. The store is bounded three ways:
+    `max_entries`, `ttl_seconds` since insertion, and `budget_bytes` of estimated
+    size. Least recently used entries are evicted first; sessions still holding
+    an evicted value keep it alive until they drop it. A limit of 0 disables it.
+    """
+
+    def __init__(self, budget_bytes, max_entries=0, ttl_seconds=0, name='shared'):
+        self.name = name
+        self.budget_bytes = budget_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes, stored_at)
+        self._lock = threading.Lock()  # sessions run on separate script threads
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries and not self._expired(self._entries[key], time.monotonic())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expired(self, entry, now):
+        return self.ttl_seconds > 0 and now - entry[2] > self.ttl_seconds
+
+    def _drop(self, key):
+        self.bytes_used -= self._entries.pop(key)[1]
+
+    def _expire(self, now):
+        # Entries are kept in recency order, not age order, so every entry is checked
+        for key in [key for key, entry in self._entries.items() if self._expired(entry, now)]:
+            self._drop(key)
+            self.expirations += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, time.monotonic()):
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        """Freezes and stores `value`, returning the frozen object callers should use."""
+        nbytes = estimate_nbytes(value)
+        frozen = freeze(value)
+        if self.budget_bytes and nbytes > self.budget_bytes:
+            # Larger than the whole budget: hand it back without displacing everything else
+            return frozen
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (frozen, nbytes, now)
+            self.bytes_used += nbytes
+            while len(self._entries) > 1 and (
+                (self.budget_bytes and self.bytes_used > self.budget_bytes)
+                or (self.max_entries and len(self._entries) > self.max_entries)
+            ):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return frozen
+
+    def get_or_compute(self, key, compute):
+        """Returns the stored value for `key`, computing and storing it on a miss."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes_used = 0
+
+    def stats(self):
+        """Returns a snapshot of the store's counters and limits."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'cache': self.name,
+                'entries': len(self._entries),
+                'bytes': self.bytes_used,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'budget_bytes': self.budget_bytes,
+            }
+
+
+# --- Metrics export ---
+
+METRICS = (
+    ('entries', 'gauge', "Results currently held."),
+    ('bytes', 'gauge', "Estimated size of the results currently held."),
+    ('hits', 'counter', "Lookups answered from the cache."),
+    ('misses', 'counter', "Lookups that had to compute the result."),
+    ('evictions', 'counter', "Results dropped to stay within the entry or byte limit."),
+    ('expirations', 'counter', "Results dropped after their time to live."),
+)
+
+def metrics_text(stores):
+    """Renders the counters of several stores in the Prometheus text exposition format."""
+    snapshots = [store.stats() for store in stores]
+    lines = []
+    for field, metric_type, description in METRICS:
+        metric = f"wellness_cache_{field}" + ('_total' if metric_type == 'counter' else '')
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+        for snapshot in snapshots:
+            lines.append(f'{metric}{{cache="{snapshot["cache"]}"}} {snapshot[field]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,98 @@
+import itertools
+import os
+import random
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+
+# Generators for realistic-looking pairs of exported reports ("Staff Schedule"
+# HTML .xls and "Schedule at a Glance" .xlsx) of any size, for load and
+# performance testing without real client data.
+
+FIRST_SYLLABLES = ['ja', 'je', 'ma', 'an', 'li', 'ro', 'sa', 'ke', 'da', 'mi', 'te', 'lu', 'ca', 'no', 'bri', 'el']
+LAST_SYLLABLES = ['ne', 'ni', 'rk', 'na', 'sa', 'by', 'ra', 'ly', 'ven', 'chel', 'ssa', 'ton', 'ria', 'dy', 'lle', 'x']
+PRESSURE_TAGS = ['(3)', '(4)', '3+', '(3) HSS', '(4) Elite']
+SERVICES = ['Swedish Massage', 'Deep Tissue Massage', 'Hot Stone Massage', "Couple's Massage"]
+
+
+def therapist_names(count):
+    """Returns `count` distinct raw staff names such as 'JANE (3) HSS'."""
+    first_names = (a + b for a, b in itertools.product(FIRST_SYLLABLES, LAST_SYLLABLES))
+    names = []
+    for index, first_name in enumerate(itertools.islice(first_names, count)):
+        names.append(f"{first_name.upper()} {PRESSURE_TAGS[index % len(PRESSURE_TAGS)]}")
+    if len(names) < count:
+        raise ValueError(f"At most {len(FIRST_SYLLABLES) * len(LAST_SYLLABLES)} synthetic therapists are available.")
+    return names
+
+def _time_text(value):
+    return value.strftime('%I:%M %p').lstrip('0').lower()
+
+def _shifts(rng, day):
+    """One or two 'Appointments' shifts for a therapist on `day`, or none on a day off."""
+    if rng.random() < 0.2:
+        return []
+    start_hour = rng.choice([8, 9, 10, 11, 12])
+    length = rng.choice([4, 6, 8])
+    start = datetime.combine(day, time(start_hour))
+    if rng.random() < 0.3:
+        middle = start + timedelta(hours=length // 2)
+        return [(start, middle), (middle + timedelta(minutes=30), start + timedelta(hours=length, minutes=30))]
+    return [(start, start + timedelta(hours=length))]
+
+def build_reports(therapists=20, days=7, start_date=date(2025, 1, 6), seed=0, bookings_per_shift=3):
+    """
+    Builds the contents of one synthetic report pair.
+    Returns (staff_schedule_html, schedule_rows) where schedule_rows are the
+    "Schedule at a Glance" rows as dicts.
+    """
+    rng = random.Random(seed)
+    dates = [start_date + timedelta(days=offset) for offset in range(days)]
+    html = ["<html><body>"]
+    rows = []
+    for name in therapist_names(therapists) + ['*WAITLIST*']:
+        html.append(
+            f"<table><tr><td><strong>Schedule for {name}</strong></td></tr>"
+            "<tr><td><table id='staffScheduleReport'>"
+        )
+        for day in dates:
+            html.append(f"<tr><td><strong>{day.strftime('%A, %B')} {day.day}, {day.year}</strong></td></tr>")
+            for shift_start, shift_end in _shifts(rng, day):
+                html.append(f"<tr><td></td><td>{_time_text(shift_start)} - {_time_text(shift_end)}</td><td>Appointments</td></tr>")
+                if name.startswith('*'):
+                    continue
+                # Bookings on the quarter hour inside the shift, possibly overlapping
+                quarter_hours = int((shift_end - shift_start).total_seconds() // 900)
+                for _ in range(rng.randint(0, bookings_per_shift)):
+                    booking_start = shift_start + timedelta(minutes=15 * rng.randrange(max(quarter_hours - 4, 1)))
+                    booking_end = booking_start + timedelta(minutes=rng.choice([60, 75, 90]))
+                    rows.append({
+                        'Date': day.strftime('%m/%d/%Y'),
+                        'Start time': booking_start.strftime('%I:%M %p'),
+                        'End time': booking_end.strftime('%I:%M %p'),
+                        'Description': 'Elite Level Massage' if 'Elite' in name else rng.choice(SERVICES),
+                        'Staff': name.title(),
+                    })
+            html.append("<tr><td></td><td>6:00 pm - 7:00 pm</td><td>Unavailable</td></tr>")
+        html.append("</table></td></tr></table>")
+    html.append("</body></html>")
+    return "\n".join(html), rows
+
+def report_filenames(start_date=date(2025, 1, 6), days=7):
+    """Returns the export filenames the app expects, with matching date ranges."""
+    end_date = start_date + timedelta(days=days - 1)
+    date_range = f"{start_date.month}-{start_date.day}-{start_date.year} to {end_date.month}-{end_date.day}-{end_date.year}"
+    return f"Staff Schedule {date_range}.xls", f"ScheduleAtAGlance {date_range}.xlsx"
+
+def write_reports(directory, therapists=20, days=7, start_date=date(2025, 1, 6), seed=0, bookings_per_shift=3):
+    """Writes one synthetic report pair into `directory`; returns (availability_path, schedule_path)."""
+    os.makedirs(directory, exist_ok=True)
+    availability_name, schedule_name = report_filenames(start_date, days)
+    availability_path = os.path.join(directory, availability_name)
+    schedule_path = os.path.join(directory, schedule_name)
+
+    html, rows = build_reports(therapists, days, start_date, seed, bookings_per_shift)
+    with open(availability_path, 'w', encoding='utf-8') as handle:
+        handle.write(html)
+    pd.DataFrame(rows, columns=['Date', 'Start time', 'End time', 'Description', 'Staff']).to_excel(schedule_path, index=False)
+    return availability_path, schedule_path